@@ -0,0 +1,30 @@
+# coding=utf-8
+# 用公式引擎一次计算全部 Alpha101 因子，每个因子存入 factor_writedb 文件夹
+# 新增因子只需在 formulas 中加一条公式，所有公式共用中间结果，整个因子集只扫一遍数据
+# 结果按论文公式计算，部分因子与 factors.Alphas 的同名因子不同(见 formula.alpha101_divergence)，文件名以 _formula 区分
+
+import sys
+sys.path.append('..')
+from lib.myfun import *
+from lib import formula
+import copy
+
+formulas = dict(formula.alpha101)
+
+
+if __name__ == '__main__':
+
+    exchange = 'BIAN'
+    symbols = ['btcusdt']
+
+    engine = formula.Engine(formulas)
+    print(engine.describe())
+    for symbol in symbols:
+        dataf = read_data(exchange, symbol, '4h', "2017-01-01", "2018-10-01")
+        factors = engine.compute(dataf)
+        for factor_name in factors.columns:
+            df_m = copy.deepcopy(dataf)
+            df_m[factor_name] = factors[factor_name]
+            fname = '../factor_writedb/' + symbol + '_' + factor_name + '_formula.csv'
+            write_db(df_m, fname, False)
+            print('write' + fname + '...')
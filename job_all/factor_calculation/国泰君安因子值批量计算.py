@@ -49,11 +49,12 @@ if __name__ == '__main__':
     #param_grid = {'corr_window': [10, 25, 50]}
     #param_lst = list(ParameterGrid(param_grid))
     for symbol in symbols:
+        # 同一币对的全部因子用同一个 Alphas 实例计算，共用中间结果(delay、sma、ts_sum 等)的缓存
+        dataf = read_data(exchange, symbol, '4h', "2017-01-01", "2018-10-01")
+        Alpha = Alphas(dataf)
         for factor in alpha_test:
             #col_name = build_col_name(factor_name, param)
             try:
-                dataf = read_data(exchange, symbol, '4h', "2017-01-01", "2018-10-01")
-                Alpha = Alphas(dataf)
                 col_name=factor
                 df_m=copy.deepcopy(dataf)
                 df_m[col_name] = eval(factor)()
@@ -63,6 +64,4 @@ if __name__ == '__main__':
                 print('write' + fname + '...')
             except AttributeError:
                 print(factor)
-
-
-
+        print(Alpha.memo.report())
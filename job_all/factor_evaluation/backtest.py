@@ -1,12 +1,16 @@
 # coding=utf-8
 
 import os
+import sys
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import ParameterGrid
 import talib
 import time
 
+sys.path.append('..')
+from lib import bar_synth
+
 
 
 def mkfpath(folder, fname):
@@ -160,11 +164,8 @@ def alpha_beta(date_time, base, net):
 
 
 def resample(df, rule):
-    return df.resample(rule, on='date_time').apply({'open': 'first',
-                                                    'high': 'max',
-                                                    'low': 'min',
-                                                    'close': 'last',
-                                                    'volume': 'sum'})
+    # 数组运算合成K线，见 lib.bar_synth；只输出有K线的区间，不支持月、周周期(rule_to_seconds 报错)
+    return bar_synth.resample_frame(df[['date_time', 'open', 'high', 'low', 'close', 'volume']], rule)
 
 
 def order_pct_to(pct, capital, price, fee):
@@ -0,0 +1,90 @@
+# coding=utf-8
+# 因子计算耗时测试: 在随机生成的 1m K线上逐个计算 Alphas 的全部因子，打印每个因子的耗时
+# 指定 baseline 时同时计算旧版本的因子库(如 git show <旧版本>:job_all/lib/factors_gtja.py > /tmp/factors_gtja_old.py)，
+# 打印加速倍数并检查两边结果是否一致
+# 用法: python benchmark_alphas.py [行数] [旧版本因子库文件]
+
+import sys
+sys.path.append('..')
+import importlib.util
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from lib import factors_gtja
+
+warnings.filterwarnings("ignore")
+
+rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+baseline = sys.argv[2] if len(sys.argv) > 2 else None
+# 旧版本单个因子超过该秒数后不再计算其余因子的旧版本，避免整体运行数小时
+baseline_limit = 600
+
+
+def make_kline(n, seed=0):
+    # 随机游走生成 1m K线，价格保留一位小数以产生相等值
+    rng = np.random.RandomState(seed)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.1, n)), 1)
+    open = np.round(close + rng.normal(0, 0.05, n), 1)
+    high = np.maximum(open, close) + np.round(rng.rand(n) * 0.1, 1)
+    low = np.minimum(open, close) - np.round(rng.rand(n) * 0.1, 1)
+    volume = rng.randint(1, 1000, n).astype(float)
+    amount = volume * close
+    return pd.DataFrame({'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume, 'amount': amount})
+
+
+def load_baseline(path):
+    # 旧版本文件与 lib 中的模块同样按 lib 目录导入其依赖(kernels 等)
+    spec = importlib.util.spec_from_file_location('factors_baseline', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_alpha(module, data, name):
+    t = time.time()
+    try:
+        value = getattr(module.Alphas(data.copy()), name)()
+    except Exception as e:
+        return time.time() - t, e
+    return time.time() - t, value
+
+
+def same(a, b):
+    a = np.asarray(a, dtype=float).ravel()
+    b = np.asarray(b, dtype=float).ravel()
+    return a.shape == b.shape and np.allclose(a, b, equal_nan=True)
+
+
+data = make_kline(rows)
+old = load_baseline(baseline) if baseline else None
+names = sorted(name for name in dir(factors_gtja.Alphas) if name.startswith('alpha'))
+# 首次调用时编译 numba 内核，不计入耗时
+for name in names:
+    run_alpha(factors_gtja, data.head(300), name)
+
+total_new = 0.0
+total_old = 0.0
+skip_old = False
+print('%-10s %10s %10s %8s %s' % ('alpha', 'new(s)', 'old(s)', 'speedup', 'same'))
+for name in names:
+    t_new, v_new = run_alpha(factors_gtja, data, name)
+    total_new += t_new
+    if old is None or skip_old or not hasattr(old.Alphas, name):
+        print('%-10s %10.4f' % (name, t_new))
+        continue
+    t_old, v_old = run_alpha(old, data, name)
+    total_old += t_old
+    if t_old > baseline_limit:
+        skip_old = True
+    if isinstance(v_new, Exception) or isinstance(v_old, Exception):
+        flag = 'error'
+    else:
+        flag = same(v_new, v_old)
+    print('%-10s %10.4f %10.4f %8.1f %s' % (name, t_new, t_old, t_old / max(t_new, 1e-9), flag))
+
+print('rows: %d  alphas: %d  new total: %.2fs' % (rows, len(names), total_new))
+if old is not None:
+    print('old total: %.2fs' % total_old)
@@ -7,6 +7,7 @@ import numpy as np
 import talib as ta
 import time
 from numba import jit
+from lib import kernels
 np.set_printoptions(threshold=np.inf)
 np.set_printoptions(suppress=True)
 # 显示所有列
@@ -30,7 +31,7 @@ def ts_min(df ,window=10):
 
 
 def ts_lowday(df, window=10):
-    return (window-1)-df.rolling(window).apply(np.argmin)
+    return kernels.ts_lowday(df, window)
 
 
 # 数据准备，导入币安各个币对
@@ -3,6 +3,7 @@ sys.path.append('..')
 
 import pandas as pd
 from lib.myfun import *
+from lib import bar_synth
 import numpy as np
 import time
 from datetime import datetime
@@ -13,13 +14,12 @@ symbol = "btcusdt"
 
 exchange = 'BITFINEX'
 
-dataf = read_data(exchange, symbol, '1h', "2017-01-01", "2018-12-21")
+# 缺失的1h K线在读取时按完整时间网格补齐，不再手工插入
+dataf = read_data(exchange, symbol, '1h', "2017-01-01", "2018-12-21", fill=True)
 print(dataf.head())
 print(dataf.tail())
 dataf["date_time"] = pd.to_datetime(dataf["date"])
-df = dataf.resample(rule="4h", on='date_time',label="left").apply(
-                {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
-                 'volume': 'sum', "amount": "sum"})
+df = bar_synth.resample_frame(dataf, "4h", on='date_time')
 df["date"] = df.index
 df.index = range(len(df))
 print(df.head())
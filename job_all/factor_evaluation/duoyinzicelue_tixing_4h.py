@@ -44,12 +44,9 @@ def get_rank(now_time, m=30, alpha=alpha_test):
     time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
     symbol_upper = [symbol.upper() for symbol in symbols]
     starttime = datetime.datetime.now()
-    df_all = get_realtime_data('BIAN', '4h', symbol_upper, start_time=time_str, end_time=None)
+    df_all = get_realtime_data('BIAN', '4h', symbol_upper, start_time=time_str, end_time=None, output='frame')
     endtime = datetime.datetime.now()
     print((endtime - starttime).seconds)
-    df_all = pd.DataFrame(df_all, columns=cols)
-    df_all[["open", "close", "high", "low", "volume", "amount"]] = df_all[
-        ["open", "close", "high", "low", "volume", "amount"]].astype("float")
     results = []
     for i in range(len(alpha)):
         print(alpha[i])
@@ -81,9 +78,7 @@ def get_rank(now_time, m=30, alpha=alpha_test):
 def get_now_price(now_time, coin):
     tepm_k_tickid = now_time
     time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(tepm_k_tickid))
-    values_list = get_realtime_data('BIAN', '1m', coin.upper(), start_time=time_str, end_time=None)
-    df_temp = pd.DataFrame(values_list, columns=cols)
-    df_temp[["open", "close", "high", "low", "volume", "amount"]] = df_temp[["open", "close", "high", "low", "volume", "amount"]].astype("float")
+    df_temp = get_realtime_data('BIAN', '1m', coin.upper(), start_time=time_str, end_time=None, output='frame')
     df_temp = df_temp[df_temp["tickid"] == tepm_k_tickid]
     return df_temp["open"].values[0]
 
@@ -92,10 +87,7 @@ def get_now_price(now_time, coin):
 def get_now_ma25(now_time, coin, ma=25):
     start_time = (now_time - now_time % 14400) - ma * 14400
     time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
-    values_list = get_realtime_data('BIAN', '4h', coin.upper(), start_time=time_str, end_time=None)
-    df_temp = pd.DataFrame(values_list, columns=cols)
-    df_temp[["open", "close", "high", "low", "volume", "amount"]] = df_temp[
-        ["open", "close", "high", "low", "volume", "amount"]].astype("float")
+    df_temp = get_realtime_data('BIAN', '4h', coin.upper(), start_time=time_str, end_time=None, output='frame')
     df_temp = df_temp.head(25)
     ma = df_temp["close"].mean()
     return ma
@@ -7,6 +7,7 @@ import numpy as np
 from lib.factors_gtja import *
 from lib.realtime_kline_api_all import *
 from lib.notifyapi import *
+from lib import bar_cache
 import time
 from multiprocessing.dummy import Pool as ThreadPool
 
@@ -29,15 +30,11 @@ alpha_test = ["Alpha.alpha003", "Alpha.alpha014", "Alpha.alpha050", "Alpha.alpha
 # 获取上一根K线各个币对因子的排名
 def get_rank(parameter):
     now_time, m, alpha = parameter
-    start_time = (now_time-now_time % 14400)-m*14400
-    time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
-    # print(time_str)
+    bar_start = now_time - now_time % 14400
     result_dict = {}
     for symbol in symbols:
-        values_list = get_realtime_data('BIAN', '4h', symbol.upper(), start_time=time_str, end_time=None)
-        df_temp = pd.DataFrame(values_list, columns=cols)
-        df_temp[["open", "close", "high", "low", "volume", "amount"]] = df_temp[["open", "close", "high", "low", "volume", "amount"]].astype("float")
-        df_temp = df_temp.head(m)
+        # 已走完的最近 m 根K线，各因子线程共用 bar_cache 中同一份数据
+        df_temp = bar_cache.get_bars('BIAN', symbol, '4h', m, end=bar_start)
         if len(df_temp) == 0:
             pass
         else:
@@ -51,6 +48,8 @@ def get_rank(parameter):
 
 
 def get_max_coin(now_time, m=31, alpha_list=alpha_test):
+    # 所有币对一次性刷新，之后各因子线程只读缓存
+    bar_cache.default_cache.refresh('BIAN', symbols, '4h', end=now_time - now_time % 14400)
     pool = ThreadPool(16)
     alpha_list = [(now_time, m, x) for x in alpha_list]
     # Open the urls in their own threads
@@ -75,23 +74,14 @@ def get_max_coin(now_time, m=31, alpha_list=alpha_test):
 # 获取币对当前的价格
 def get_now_price(now_time, coin):
     tepm_k_tickid = now_time
-    time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(tepm_k_tickid))
-    values_list = get_realtime_data('BIAN', '1m', coin.upper(), start_time=time_str, end_time=None)
-    df_temp = pd.DataFrame(values_list, columns=cols)
-    df_temp[["open", "close", "high", "low", "volume", "amount"]] = df_temp[["open", "close", "high", "low", "volume", "amount"]].astype("float")
+    df_temp = bar_cache.get_bars('BIAN', coin, '1m', end=tepm_k_tickid + 60)
     df_temp = df_temp[df_temp["tickid"] == tepm_k_tickid]
     return df_temp["open"].values[0]
 
 
 # 获取币对当前25日均价
 def get_now_ma25(now_time, coin, ma=25):
-    start_time = (now_time - now_time % 14400) - ma * 14400
-    time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
-    values_list = get_realtime_data('BIAN', '4h', coin.upper(), start_time=time_str, end_time=None)
-    df_temp = pd.DataFrame(values_list, columns=cols)
-    df_temp[["open", "close", "high", "low", "volume", "amount"]] = df_temp[
-        ["open", "close", "high", "low", "volume", "amount"]].astype("float")
-    df_temp = df_temp.head(25)
+    df_temp = bar_cache.get_bars('BIAN', coin, '4h', ma, end=now_time - now_time % 14400)
     ma = df_temp["close"].mean()
     return ma
 
@@ -0,0 +1,44 @@
+# coding=utf-8
+# 用 factors_gtja_panel 一次计算全部币对的全部国泰君安因子(RANK 为截面排名)，
+# 再把每个因子按币对与行情数据放在一起存到本地
+
+import sys
+sys.path.append('..')
+import pandas as pd
+from lib.myfun import *
+from lib import kline_store
+from lib.factors_gtja_panel import Alphas, fields
+from lib.kline_store import tickid_to_datetime
+import warnings
+warnings.filterwarnings("ignore")
+
+exchange = 'BIAN'
+
+symbols = ["xrpbtc", "ethbtc", "mdabtc", "eosbtc", "xlmbtc", "tusdbtc", "ltcbtc",
+           "stratbtc", "trxbtc", "adabtc", "iotabtc", "xmrbtc", "bnbbtc", "dashbtc",
+           "xembtc", "etcbtc", "neobtc", "ontbtc", "zecbtc", "wavesbtc", "btgbtc",
+           "vetbtc", "qtumbtc", "omgbtc", "zrxbtc", "gvtbtc", "bchabcbtc", "bchsvbtc"]
+
+
+if __name__ == '__main__':
+    panel = kline_store.read_panel(exchange, symbols, '4h', "2018-01-01", "2019-02-14")
+    panel_date = tickid_to_datetime(panel["tickid"]).strftime("%Y-%m-%d %H:%M:%S")
+
+    Alpha = Alphas(panel)
+    # 一次得到每个因子 时间×币对 的因子值
+    factors = Alpha.compute()
+    print(Alpha.memo.report())
+
+    for j, symbol in enumerate(symbols):
+        # 只保留该币对有K线的时刻
+        keep = ~panel["mask"][:, j]
+        dataf = pd.DataFrame(dict((field, panel[field][keep, j]) for field in fields))
+        dataf.insert(0, "tickid", panel["tickid"][keep])
+        dataf.insert(1, "date", panel_date[keep])
+        for name, values in factors.items():
+            df_m = dataf.copy()
+            df_m[name] = values[keep, j]
+            factor_name = name + "_" + "gtja4h_panel"
+            fname = '../factor_writedb/BIAN_' + symbol + "_" + factor_name + '.csv'
+            write_db(df_m, fname, False)
+            print('write' + fname + '...')
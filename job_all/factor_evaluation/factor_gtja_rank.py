@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 from scipy.stats import rankdata
 from lib.myfun import *
+from lib import dataapi
+from lib.kline_store import tickid_to_datetime
 import warnings
 import copy
 warnings.filterwarnings("ignore")
@@ -23,31 +25,28 @@ symbols = ["xrpbtc", "ethbtc", "mdabtc", "eosbtc", "xlmbtc", "tusdbtc", "ltcbtc"
            "vetbtc", "qtumbtc", "omgbtc", "zrxbtc", "gvtbtc", "bchabcbtc", "bchsvbtc"]
 
 
-for i in range(len(symbols)):
-    dataf = pd.read_csv("/Users/wuyong/alldata/original_data/BIAN_" + symbols[i] + "_4h_2018-01-01_2019-02-14.csv", index_col=0)
-    # print(symbols[i])
-    dataf["open_" + symbols[i]] = dataf["open"]
-    dataf["close_" + symbols[i]] = dataf["close"]
-    dataf["high_" + symbols[i]] = dataf["high"]
-    dataf["low_" + symbols[i]] = dataf["low"]
-    dataf["volume_" + symbols[i]] = dataf["volume"]
-    dataf["amount_" + symbols[i]] = dataf["amount"]
-
-    if i == 0:
-        data_open = dataf[["open_"+symbols[i], "date"]]
-        data_close = dataf[["close_" + symbols[i], "date"]]
-        data_high = dataf[["high_" + symbols[i], "date"]]
-        data_low = dataf[["low_" + symbols[i], "date"]]
-        data_volume = dataf[["volume_" + symbols[i], "date"]]
-        data_amount = dataf[["amount_" + symbols[i], "date"]]
+frames = [pd.read_csv("/Users/wuyong/alldata/original_data/BIAN_" + symbol + "_4h_2018-01-01_2019-02-14.csv", index_col=0)
+          for symbol in symbols]
+# 一次对齐所有币对，不再逐个币对逐个字段 merge
+panel = dataapi.align_kline_panel(frames)
+# 与原先以第一个币对为左表逐个 merge 一致，只保留第一个币对有K线的时刻
+panel = dict((name, values[~panel["mask"][:, 0]]) for name, values in panel.items())
+panel_date = tickid_to_datetime(panel["tickid"]).strftime("%Y-%m-%d %H:%M:%S")
 
-    else:
-        data_open = data_open.merge(dataf[["open_"+symbols[i], "date"]], how="left",on="date")
-        data_close = data_close.merge(dataf[["close_"+symbols[i], "date"]], how="left",on="date")
-        data_high = data_high.merge(dataf[["high_" + symbols[i], "date"]], how="left", on="date")
-        data_low = data_low.merge(dataf[["low_" + symbols[i], "date"]], how="left", on="date")
-        data_volume = data_volume.merge(dataf[["volume_" + symbols[i], "date"]], how="left", on="date")
-        data_amount = data_amount.merge(dataf[["amount_" + symbols[i], "date"]], how="left", on="date")
+
+def panel_frame(field):
+    # 列顺序与原先逐个 merge 的结果一致: 第一个币对, date, 其余币对
+    df = pd.DataFrame(panel[field], columns=[field + "_" + symbol for symbol in symbols])
+    df.insert(1, "date", panel_date)
+    return df
+
+
+data_open = panel_frame("open")
+data_close = panel_frame("close")
+data_high = panel_frame("high")
+data_low = panel_frame("low")
+data_volume = panel_frame("volume")
+data_amount = panel_frame("amount")
 
 
 def rolling_rank(na):
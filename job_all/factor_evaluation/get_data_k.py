@@ -1,5 +1,9 @@
+import sys
+sys.path.append('..')
 import pandas as pd
 import numpy as np
+from lib import dataapi
+from lib.kline_store import tickid_to_datetime
 
 # 显示所有列
 pd.set_option('display.max_columns', None)
@@ -9,32 +13,18 @@ pd.set_option('display.max_rows', None)
 
 coin_list = ["btcusdt", "ethusdt", "eosusdt", "etcusdt", "xrpusdt"]
 
-open_df = pd.DataFrame()
-close_df = pd.DataFrame()
-high_df = pd.DataFrame()
-low_df = pd.DataFrame()
-
-for coin in coin_list:
-    data = pd.read_csv("/Users/wuyong/alldata/original_data/bitfinex_" + coin + "_1h.csv", index_col=0)
-    data.index = data["date"].values
-    if len(open_df) == 0:
-        open_df = data[["open"]]
-        open_df.columns = ["open_"+coin]
-        close_df = data[["close"]]
-        close_df.columns = ["close_" + coin]
-        high_df = data[["high"]]
-        high_df.columns = ["high_" + coin]
-        low_df = data[["low"]]
-        low_df.columns = ["low_" + coin]
-    else:
-        open_df = open_df.merge(data[["open"]], how="left", left_index=True, right_index=True)
-        open_df.rename(columns={"open": "open_"+coin}, inplace=True)
-        close_df = close_df.merge(data[["close"]], how="left", left_index=True, right_index=True)
-        close_df.rename(columns={"close": "close_" + coin}, inplace=True)
-        high_df = high_df.merge(data[["high"]], how="left", left_index=True, right_index=True)
-        high_df.rename(columns={"high": "high_" + coin}, inplace=True)
-        low_df = low_df.merge(data[["low"]], how="left", left_index=True, right_index=True)
-        low_df.rename(columns={"low": "low_" + coin}, inplace=True)
+frames = [pd.read_csv("/Users/wuyong/alldata/original_data/bitfinex_" + coin + "_1h.csv", index_col=0)
+          for coin in coin_list]
+# 一次对齐所有币对，不再逐个币对逐个字段 merge
+panel = dataapi.align_kline_panel(frames, ["open", "high", "low", "close"])
+# 与原先以第一个币对为左表逐个 merge 一致，只保留第一个币对有K线的时刻
+panel = dict((name, values[~panel["mask"][:, 0]]) for name, values in panel.items())
+panel_date = tickid_to_datetime(panel["tickid"]).strftime("%Y-%m-%d %H:%M:%S")
+
+open_df = pd.DataFrame(panel["open"], index=panel_date, columns=["open_" + coin for coin in coin_list])
+close_df = pd.DataFrame(panel["close"], index=panel_date, columns=["close_" + coin for coin in coin_list])
+high_df = pd.DataFrame(panel["high"], index=panel_date, columns=["high_" + coin for coin in coin_list])
+low_df = pd.DataFrame(panel["low"], index=panel_date, columns=["low_" + coin for coin in coin_list])
 
 
 high_df.fillna(method="ffill", inplace=True)
@@ -276,9 +276,7 @@ now_time = int(time.mktime(time.strptime(time_str_tmp, '%Y-%m-%d %H:%M')))
 start_time = (now_time - now_time % 14400) - 100 * 14400
 time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
 symbol_upper = [symbol.upper() for symbol in symbols]
-df_all = get_realtime_data('BIAN', '4h', symbol_upper, start_time=time_str, end_time=None)
-df_all = pd.DataFrame(df_all, columns=cols)
-df_all[["open", "close", "high", "low", "volume", "amount"]] = df_all[["open", "close", "high", "low", "volume", "amount"]].astype("float")
+df_all = get_realtime_data('BIAN', '4h', symbol_upper, start_time=time_str, end_time=None, output='frame')
 print("get all data........")
 
 for i in range(50):
@@ -0,0 +1,225 @@
+# -*- coding: UTF-8 -*-
+# dataapi 请求耗时与吞吐统计
+# 默认关闭，关闭时每次调用只多一次判断。打开方式:
+#   环境变量 DATAAPI_METRICS=1            进程退出时打印汇总
+#   环境变量 DATAAPI_METRICS=/tmp/m.json  进程退出时把汇总写入该 json 文件
+#   或在代码中调用 api_metrics.enable(path)
+# 按接口函数统计: 调用次数、失败次数、单次调用耗时分布、收到的字节数/行数、每次调用的页数、重试次数、
+# 以及收到最后一页之后构造 DataFrame 的耗时和每秒行数
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+enabled = False
+# 耗时分布的桶上界(毫秒)，最后一个桶为无穷大
+latency_buckets = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_dump_path = None
+_registered = False
+
+
+class Call(object):
+    """
+    一次接口调用的统计，由 instrument 创建，_get_json 等底层请求函数通过 current() 拿到并累加
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.bytes = 0
+        self.retries = 0
+        self.net_seconds = 0.0
+        self.last_response = None
+        self.urls = set()
+        self.lock = threading.Lock()
+
+
+def current():
+    """
+    :return: 当前线程正在统计的 Call，未打开统计或不在被统计的接口内时为 None
+    """
+    return getattr(_local, 'call', None)
+
+
+class bind(object):
+    """
+    在线程池的工作线程中把请求记到发起调用的 Call 上
+        call = api_metrics.current()
+        pool.map(lambda x: api_metrics.bind(call).run(fn, x), ...)
+    """
+
+    def __init__(self, call):
+        self.call = call
+
+    def __enter__(self):
+        self.prev = current()
+        _local.call = self.call
+        return self.call
+
+    def __exit__(self, *exc):
+        _local.call = self.prev
+        return False
+
+    def run(self, fn, *args, **kwargs):
+        with self:
+            return fn(*args, **kwargs)
+
+
+def record_request(url, seconds, nbytes):
+    """
+    记录一次 http 请求，同一次调用中重复请求同一个 url 记为重试
+    """
+    call = current()
+    if call is None:
+        return
+    with call.lock:
+        call.pages += 1
+        call.bytes += nbytes
+        call.net_seconds += seconds
+        call.last_response = time.perf_counter()
+        if url in call.urls:
+            call.retries += 1
+        else:
+            call.urls.add(url)
+
+
+def _new_stat():
+    return {'calls': 0, 'errors': 0, 'seconds': 0.0, 'net_seconds': 0.0, 'build_seconds': 0.0,
+            'bytes': 0, 'rows': 0, 'pages': 0, 'max_pages': 0, 'retries': 0,
+            'latency_hist': [0] * (len(latency_buckets) + 1)}
+
+
+def _rows(result):
+    # 接口返回 errcode, errmsg, data；data 为 DataFrame、list 或 dict
+    if isinstance(result, tuple) and len(result) == 3:
+        data = result[2]
+        if data is None:
+            return 0
+        if isinstance(data, dict):
+            return len(data.get('tickid', []))
+        try:
+            return len(data)
+        except TypeError:
+            return 0
+    return 0
+
+
+def _finish(call, start, end, result, error):
+    elapsed = end - start
+    ms = elapsed * 1000
+    bucket = len(latency_buckets)
+    for i, bound in enumerate(latency_buckets):
+        if ms <= bound:
+            bucket = i
+            break
+    with _lock:
+        st = _stats.setdefault(call.name, _new_stat())
+        st['calls'] += 1
+        st['errors'] += 1 if error else 0
+        st['seconds'] += elapsed
+        st['net_seconds'] += call.net_seconds
+        if call.last_response is not None and not error:
+            st['build_seconds'] += max(end - call.last_response, 0.0)
+        st['bytes'] += call.bytes
+        st['rows'] += 0 if error else _rows(result)
+        st['pages'] += call.pages
+        st['max_pages'] = max(st['max_pages'], call.pages)
+        st['retries'] += call.retries
+        st['latency_hist'][bucket] += 1
+
+
+def instrument(fn):
+    """
+    接口函数的装饰器，未打开统计时直接调用原函数
+    嵌套调用(如 get_exsymbol_kline_panel 内部调用 get_exsymbol_kline)时内外两层分别统计
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        call = Call(fn.__name__)
+        prev = current()
+        _local.call = call
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            _finish(call, start, time.perf_counter(), None, True)
+            raise
+        finally:
+            _local.call = prev
+        _finish(call, start, time.perf_counter(), result, False)
+        return result
+
+    return wrapper
+
+
+def summary():
+    """
+    :return: dict {接口名: 统计}，另含 per_call_ms(平均耗时)、pages_per_call、rows_per_sec(构造 DataFrame 的速度)、
+             bytes_per_sec(网络吞吐) 等派生值
+    """
+    with _lock:
+        out = {}
+        for name, st in _stats.items():
+            st = dict(st, latency_hist=list(st['latency_hist']))
+            calls = max(st['calls'], 1)
+            st['per_call_ms'] = st['seconds'] * 1000 / calls
+            st['pages_per_call'] = float(st['pages']) / calls
+            st['rows_per_sec'] = st['rows'] / st['build_seconds'] if st['build_seconds'] > 0 else None
+            st['bytes_per_sec'] = st['bytes'] / st['net_seconds'] if st['net_seconds'] > 0 else None
+            st['latency_buckets_ms'] = latency_buckets + ['inf']
+            out[name] = st
+        return out
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def dump(path=None):
+    """
+    输出汇总，path 为空时打印，否则写入 json 文件
+    """
+    result = summary()
+    if not result:
+        return
+    if path is None:
+        for name, st in sorted(result.items()):
+            print('%s calls:%d errors:%d per_call_ms:%.1f pages:%d retries:%d rows:%d bytes:%d rows_per_sec:%s'
+                  % (name, st['calls'], st['errors'], st['per_call_ms'], st['pages'], st['retries'], st['rows'],
+                     st['bytes'], None if st['rows_per_sec'] is None else int(st['rows_per_sec'])))
+        return
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+
+
+def enable(path=None):
+    """
+    打开统计，并在进程退出时输出汇总
+    :param path: string 汇总写入的 json 文件，为空时打印
+    """
+    global enabled, _dump_path, _registered
+    enabled = True
+    _dump_path = path
+    if not _registered:
+        atexit.register(lambda: dump(_dump_path))
+        _registered = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+_env = os.environ.get('DATAAPI_METRICS')
+if _env:
+    enable(None if _env in ('1', 'true', 'yes') else _env)
@@ -0,0 +1,218 @@
+# -*- coding: UTF-8 -*-
+# 实盘用的最近N根K线缓存
+# 每个 (交易所, 币对, 周期) 一个环形缓冲区，只保留最近 capacity 根K线；
+# 刷新时只下载缓冲区最后一根之后的K线(最后一根重新下载，覆盖未走完时的数据)，
+# 指定 end 时只下载到 end 为止(回放历史时刻)，
+# 同一轮里多个因子、多个线程对同一币对的读取都直接从内存返回
+import functools
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import dataapi
+    from . import realtime_kline_api_all
+except:
+    import dataapi
+    import realtime_kline_api_all
+
+fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+class RingBuffer(object):
+    """
+    定长环形缓冲区，按 tickid 升序保存最近 capacity 根K线
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tickid = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(fields)), np.nan)
+        self.size = 0
+        self.head = 0
+
+    def last_tickid(self):
+        if self.size == 0:
+            return None
+        return int(self.tickid[(self.head - 1) % self.capacity])
+
+    def extend(self, tickid, values):
+        """
+        追加K线，tickid 等于最后一根的覆盖最后一根，早于最后一根的忽略
+        :param tickid: np.ndarray int64 升序
+        :param values: np.ndarray (k, len(fields))
+        """
+        last = self.last_tickid()
+        if last is not None:
+            same = np.flatnonzero(tickid == last)
+            if len(same):
+                self.values[(self.head - 1) % self.capacity] = values[same[-1]]
+            keep = tickid > last
+            tickid, values = tickid[keep], values[keep]
+        if len(tickid) > self.capacity:
+            tickid, values = tickid[-self.capacity:], values[-self.capacity:]
+        k = len(tickid)
+        if k == 0:
+            return
+        idx = (self.head + np.arange(k)) % self.capacity
+        self.tickid[idx] = tickid
+        self.values[idx] = values
+        self.head = (self.head + k) % self.capacity
+        self.size = min(self.size + k, self.capacity)
+
+    def tail(self, count=None, end=None):
+        """
+        按时间顺序返回最近的K线(复制)
+        :param count: int 根数，默认全部
+        :param end: int tickid 上限(不含)，如传入当前K线的起点则只取已走完的K线
+        :return: (tickid, values)
+        """
+        idx = (self.head - self.size + np.arange(self.size)) % self.capacity
+        tickid, values = self.tickid[idx], self.values[idx]
+        if end is not None:
+            n = int(np.searchsorted(tickid, end, side='left'))
+            tickid, values = tickid[:n], values[:n]
+        if count is not None:
+            tickid, values = tickid[-count:], values[-count:]
+        return tickid.copy(), values.copy()
+
+
+class BarCache(object):
+    """
+    进程内共享的K线缓存
+    :param capacity: int 每个缓冲区保留的K线数
+    :param ttl: int 距离上次刷新不超过 ttl 秒时直接返回缓存，不访问网络
+    :param fetch: 下载函数 fetch(exchange, periods, symbols, start_time, end_time)，end_time 为 None 时取到当前时间，
+        返回 get_realtime_data 的 list 或 arrays 格式，默认 get_realtime_data(output='arrays')
+    """
+
+    def __init__(self, capacity=64, ttl=60, fetch=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.fetch = fetch or functools.partial(realtime_kline_api_all.get_realtime_data, output='arrays')
+        self.buffers = {}
+        self.refreshed = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self.lock:
+            if key not in self.locks:
+                self.locks[key] = threading.Lock()
+                self.buffers[key] = RingBuffer(self.capacity)
+            return self.locks[key]
+
+    def _start_time(self, key, period, ref):
+        last = self.buffers[key].last_tickid()
+        if last is not None:
+            return last
+        # 缓冲区为空时从 ref 往前取满 capacity 根
+        seconds = dataapi.period_to_seconds(period)
+        return int(ref) - int(ref) % seconds - (self.capacity - 1) * seconds
+
+    def _store(self, rows):
+        # rows: get_realtime_data 的返回值，按 (exchange, period, symbol) 分组写入缓冲区
+        if isinstance(rows, dict):
+            self._store_arrays(rows)
+            return
+        groups = {}
+        for row in rows:
+            groups.setdefault((row[0], row[1], row[2]), []).append(row)
+        for (exchange, period, symbol), group in groups.items():
+            tickid = np.array([r[3] for r in group], dtype=np.int64)
+            values = np.array([[np.nan if v is None else v for v in r[4:10]] for r in group], dtype=np.float64)
+            order = np.argsort(tickid, kind='mergesort')
+            self.buffers[(exchange, symbol.lower(), period)].extend(tickid[order], values[order])
+
+    def _store_arrays(self, res):
+        # get_realtime_data(output='arrays') 的返回值
+        categories = res['categories']
+        values = np.column_stack([res[name] for name in fields])
+        for e, exchange in enumerate(categories['exchange']):
+            for p, period in enumerate(categories['period']):
+                for s, symbol in enumerate(categories['symbol']):
+                    mask = (res['exchange'] == e) & (res['period'] == p) & (res['symbol'] == s)
+                    if not mask.any():
+                        continue
+                    tickid = res['tickid'][mask]
+                    order = np.argsort(tickid, kind='mergesort')
+                    self.buffers[(exchange, symbol.lower(), period)].extend(tickid[order], values[mask][order])
+
+    def refresh(self, exchange, symbols, period, end=None, force=False):
+        """
+        刷新一组币对，只下载缓冲区最后一根之后的K线，同一次调用中的币对一起下载(并发由 get_realtime_data 负责)
+        :param symbols: list 或 string
+        :param end: int 只下载到该时间为止，缓冲区为空时以该时间为准往前取 capacity 根，默认当前时间
+        :param force: bool 忽略 ttl 强制刷新
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        now = time.time()
+        # 按固定顺序加锁，避免多个线程刷新有交集的币对组时死锁
+        keys = sorted(set((exchange, symbol.lower(), period) for symbol in symbols))
+        locks = [self._key_lock(key) for key in keys]
+        for lock in locks:
+            lock.acquire()
+        try:
+            stale = [key for key in keys if force or now - self.refreshed.get(key, 0) > self.ttl]
+            # 起始时间相同的币对一起请求
+            by_start = {}
+            for key in stale:
+                start = self._start_time(key, period, now if end is None else end)
+                # 缓冲区已经到 end 之后，end 之前的K线都已走完，不用再下载
+                if end is not None and start >= end:
+                    continue
+                by_start.setdefault(start, []).append(key[1])
+            for start, group in by_start.items():
+                if exchange == 'BIAN':
+                    group = [symbol.upper() for symbol in group]
+                self._store(self.fetch(exchange, [period], group, start, None if end is None else int(end)))
+            for key in stale:
+                self.refreshed[key] = now
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def push(self, exchange, symbol, period, tickid, values):
+        """
+        直接写入已走完的K线(如 kline_stream 推送的K线)，并视为刚刷新过
+        :param tickid: int
+        :param values: list 按 fields 顺序
+        """
+        key = (exchange, symbol.lower(), period)
+        with self._key_lock(key):
+            self.buffers[key].extend(np.array([tickid], dtype=np.int64),
+                                     np.array([values], dtype=np.float64))
+            self.refreshed[key] = time.time()
+
+    def bars(self, exchange, symbol, period, count=None, end=None, refresh=True):
+        """
+        最近 count 根K线
+        :param end: int tickid 上限(不含)
+        :param refresh: bool 缓存已超过 ttl 时先刷新
+        :return: DataFrame 列为 tickid 及 fields
+        """
+        if refresh:
+            self.refresh(exchange, [symbol], period, end)
+        key = (exchange, symbol.lower(), period)
+        with self._key_lock(key):
+            buffer = self.buffers[key]
+            tickid, values = buffer.tail(count, end)
+            # 缓冲区已满说明更早的K线被挤出，end 之前的K线不够时不能返回不完整的结果
+            if end is not None and buffer.size == buffer.capacity and len(tickid) < (count or 1):
+                raise IOError('bars before %d are no longer cached: %s' % (end, key))
+        df = pd.DataFrame(values, columns=fields)
+        df.insert(0, 'tickid', tickid)
+        return df
+
+
+default_cache = BarCache()
+
+
+def get_bars(exchange, symbol, period, count=None, end=None):
+    """
+    从进程内共享缓存读取最近 count 根K线，见 BarCache.bars
+    """
+    return default_cache.bars(exchange, symbol, period, count, end)
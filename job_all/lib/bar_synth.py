@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+# K线合成: 把小周期K线合成任意整数倍的大周期K线(如 1h -> 4h/6h/12h/1d)
+# 直接在 int64 时间戳和 float 数组上计算: 每根K线算出所属区间的编号，
+# 相邻编号不同处即为区间起点，再用 np.fmax.reduceat / np.fmin.reduceat / np.add.reduceat 一次完成聚合，
+# 不经过字符串日期和 pandas resample
+# 区间与 pandas resample 的默认 origin='start_day' 一致: 从第一根K线当天零点起每 seconds 秒一个区间，
+# 能整除一天的周期(4h、1d 等)与按整点对齐相同，7h、2D 这类周期的区间边界也与 resample 相同
+import re
+
+import numpy as np
+import pandas as pd
+
+# 单位区分大小写: 'm' 为分钟(币安写法)，'M' 为月(pandas / 币安写法)
+_rule_units = {'s': 1, 'S': 1, 'sec': 1,
+               'm': 60, 'min': 60, 'Min': 60, 'T': 60,
+               'h': 3600, 'H': 3600, 'hour': 3600,
+               'd': 86400, 'D': 86400, 'day': 86400}
+# 月的长度不固定；pandas 的周区间按周日结束(W-SUN)、左开右闭，与按固定秒数从第一天零点起划分的区间不一致，都不支持
+_unsupported_units = ['M', 'MS', 'ME', 'BM', 'mon', 'month', 'w', 'W', 'week']
+
+
+def rule_to_seconds(rule):
+    """
+    周期字符串转为秒数
+    :param rule: string 如 '4h' '4H' '240min' '60min' '15m' '4hour' '1d' '1day'，或 int 秒数；月、周的周期不支持
+    :return: int
+    """
+    if isinstance(rule, (int, np.integer)):
+        return int(rule)
+    m = re.match(r'^\s*(\d*)\s*([a-zA-Z]+(?:-[a-zA-Z]+)?)\s*$', rule)
+    unit = m.group(2) if m is not None else None
+    if unit is not None and (unit in _unsupported_units or unit.split('-')[0] in _unsupported_units):
+        raise TypeError('month and week rules are not supported: %s' % rule)
+    if unit not in _rule_units:
+        raise TypeError('unknow rule: %s' % rule)
+    return int(m.group(1) or 1) * _rule_units[unit]
+
+
+def local_seconds(tickid):
+    """
+    10位时间戳转为本地时间的秒数，使区间按本地时间的整点/零点对齐(与按本地时间 resample 一致)
+    """
+    # 只有按本地时间对齐时才用到 dataapi，resample_frame 不导入它(导入时会建立网络会话)
+    try:
+        from . import dataapi
+    except:
+        import dataapi
+    return dataapi.tickid2datetime(tickid).values.astype('datetime64[s]').astype(np.int64)
+
+
+def start_day(keys):
+    """
+    第一根K线当天零点的秒数，即 pandas resample 默认的 origin='start_day'
+    """
+    return int(keys[0]) - int(keys[0]) % 86400
+
+
+def bucket_starts(keys, seconds, origin=0):
+    """
+    :param keys: np.ndarray int64 升序的(本地)秒数
+    :param seconds: int 目标周期秒数
+    :param origin: int 区间划分的起点秒数
+    :return: (bucket, starts) bucket 为每个区间的起点秒数，starts 为每个区间第一根K线的位置
+    """
+    ids = (keys - origin) // seconds
+    starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    return ids[starts] * seconds + origin, starts
+
+
+# 各列默认的聚合方式，未列出的列求和
+default_how = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum', 'amount': 'sum'}
+
+
+def synth_arrays(keys, values, seconds, src_seconds=None, drop_partial=False, how=None):
+    """
+    按区间聚合: 默认 open 取第一根，high 取最大，low 取最小，close 取最后一根，volume/amount 求和；
+    max/min 忽略 NaN，求和时 NaN 当作0
+    :param keys: np.ndarray int64 升序的秒数，决定区间划分
+    :param values: dict {列名: 数组}
+    :param seconds: int 目标周期秒数
+    :param src_seconds: int 源周期秒数，drop_partial 时需要
+    :param drop_partial: bool True 时去掉首尾不完整的区间(首根K线不在区间起点、末根K线不是区间最后一根)
+    :param how: dict {列名: 'first'/'last'/'max'/'min'/'sum'}，覆盖 default_how
+    :return: dict {'bucket': 区间起点秒数, 'count': 每个区间的K线数, 各列聚合结果}
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    n = len(keys)
+    if n == 0:
+        out = {name: np.empty(0) for name in values}
+        out['bucket'] = np.empty(0, dtype=np.int64)
+        out['count'] = np.empty(0, dtype=np.int64)
+        return out
+    origin = start_day(keys)
+    bucket, starts = bucket_starts(keys, seconds, origin)
+    ends = np.concatenate([starts[1:], [n]])
+    out = {'bucket': bucket, 'count': ends - starts}
+    for name, arr in values.items():
+        arr = np.asarray(arr)
+        agg = (how or {}).get(name, default_how.get(name, 'sum'))
+        if agg == 'first':
+            out[name] = arr[starts]
+        elif agg == 'last':
+            out[name] = arr[ends - 1]
+        elif agg == 'max':
+            out[name] = np.fmax.reduceat(arr.astype(np.float64), starts)
+        elif agg == 'min':
+            out[name] = np.fmin.reduceat(arr.astype(np.float64), starts)
+        elif agg == 'sum':
+            out[name] = np.add.reduceat(np.nan_to_num(arr.astype(np.float64)), starts)
+        else:
+            raise TypeError('unknow aggregation: %s' % agg)
+
+    if drop_partial:
+        if src_seconds is None:
+            raise TypeError('drop_partial needs src_seconds')
+        keep = np.ones(len(bucket), dtype=bool)
+        if (keys[0] - origin) % seconds != 0:
+            keep[0] = False
+        if (keys[-1] + src_seconds - origin) % seconds != 0:
+            keep[-1] = False
+        out = {name: arr[keep] for name, arr in out.items()}
+    return out
+
+
+def synth_kline(cols, rule, src_seconds=None, drop_partial=False, local=True):
+    """
+    由 tickid 列合成大周期K线
+    :param cols: dict 或 DataFrame，含 tickid 及 open/high/low/close/volume/amount 中的若干列，tickid 升序
+    :param rule: string 或 int 目标周期，见 rule_to_seconds
+    :param src_seconds: int 源周期秒数，drop_partial 时需要
+    :param drop_partial: bool 见 synth_arrays
+    :param local: bool True 按本地时间对齐区间(与原先按本地时间字符串 resample 一致)，False 按 UTC 对齐
+    :return: dict 各列数组，tickid 为区间起点的10位时间戳，count 为区间内的K线数
+    """
+    seconds = rule_to_seconds(rule)
+    tickid = np.asarray(cols['tickid'], dtype=np.int64)
+    keys = local_seconds(tickid) if local else tickid
+    values = {name: cols[name] for name in default_how if name in cols}
+    # 区间内第一根K线的 utc 偏移，用来把本地的区间起点换回时间戳
+    values['shift'] = tickid - keys
+    out = synth_arrays(keys, values, seconds, src_seconds, drop_partial, how={'shift': 'first'})
+    out['tickid'] = out.pop('bucket') + out.pop('shift')
+    return out
+
+
+def resample_frame(df, rule, on='date_time'):
+    """
+    DataFrame 版本，替代 df.resample(rule, on=on).apply({'open': 'first', 'high': 'max', ...})
+    只输出有K线的区间(resample 会为空区间输出全 NaN 的行)
+    :param df: DataFrame，on 列为 datetime，按时间升序
+    :param rule: string 目标周期
+    :param on: string 时间列
+    :return: DataFrame，索引为区间起点(名称为 on)，列为 df 中存在的 open/high/low/close/volume/amount
+    """
+    seconds = rule_to_seconds(rule)
+    keys = pd.to_datetime(df[on]).values.astype('datetime64[s]').astype(np.int64)
+    names = [name for name in ['open', 'high', 'low', 'close', 'volume', 'amount'] if name in df.columns]
+    out = synth_arrays(keys, {name: df[name].values for name in names}, seconds)
+    index = pd.DatetimeIndex(out['bucket'].astype('datetime64[s]'), name=on)
+    return pd.DataFrame({name: out[name] for name in names}, index=index, columns=names)
@@ -4,10 +4,19 @@ from __future__ import unicode_literals
 import json
 import datetime, time
 import socket
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+import numpy as np
 import pandas as pd
 
+try:
+    from . import api_metrics
+    from . import replay
+except:
+    import api_metrics
+    import replay
+
 pd.set_option('display.max_columns', 20)
 pd.set_option('display.max_rows', 500)
 pd.set_option('display.width', 500)
@@ -22,6 +31,20 @@ else:
     common_url = 'https://ds.goupupupup.com/api/'
 
 retry_count = 3
+# 为1时打印每一页K线请求的url和耗时
+kline_debug = 0
+# 服务端每页返回的K线条数，用于并发下载时按时间切分请求区间
+kline_page_size = 1000
+# 并发下载时的最大连接数
+pool_size = 16
+# 多币对面板数据的默认字段
+panel_fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 复用 keep-alive 连接，多线程共享同一个连接池
+session = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
 
 exchange_url = common_url + 'exchanges?datatype=%d'
 exsymbol_url = common_url + 'symbols?exname=%s&datatype=%d'
@@ -45,7 +68,34 @@ position_url = common_url + 'position/bitmex?exchange=%s&symbol=%s&period=%s&tim
 trades_url = common_url + 'trades/getTrades?exname=%s&symbol=%s&starttime=%d'
 
 
-def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=None, timeStr=None):
+def _http_content(url, headers=None):
+    r = session.get(url, timeout=10, headers=headers)
+    return r.content
+
+
+def _get_json(url, headers=None):
+    """
+    发送 GET 请求并解析返回的 json，所有接口都经由这里访问服务端，
+    便于统计耗时和流量(见 api_metrics)以及录制/回放(见 replay)
+    :param url: string
+    :param headers: dict 请求头
+    :return: 解析后的 json
+    """
+    ss_time = time.perf_counter()
+    try:
+        content = replay.fetch(replay.normalize_url(url), lambda: _http_content(url, headers))
+    except Exception:
+        # 失败的请求也记录，调用方重试同一 url 时计为重试
+        if api_metrics.enabled:
+            api_metrics.record_request(url, time.perf_counter() - ss_time, 0)
+        raise
+    if api_metrics.enabled:
+        api_metrics.record_request(url, time.perf_counter() - ss_time, len(content))
+    return json.loads(content.decode('utf-8'))
+
+
+@api_metrics.instrument
+def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=None, timeStr=None, datefmt='str'):
     """
     获取链上地址转账历史数据
     :param timeStr: string yyyy-mm-dd(也可精确到时分秒) 以后的100000条数据
@@ -54,6 +104,7 @@ def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=No
     :param address: string
     :param hash: string
     :param role: int 0：发送方；1 接收方
+    :param datefmt: string date 列的格式，'str'(默认)、'datetime' 或 None(不生成)，见 add_date
     :return:
     """
     if timeStr is not None:
@@ -73,8 +124,7 @@ def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=No
     print(url)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
@@ -82,10 +132,7 @@ def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=No
             df = pd.DataFrame(l['data']['items'],
                               columns=['hash', 'blockNumber', 'address', 'timeStamp', 'role', 'symbol', 'from', 'to',
                                        'value', 'isError', 'contractAddress', 'blockHash', 'source'])
-            df['date'] = df['timeStamp'].map(timestamp2str)
-            cols = list(df)
-            cols.insert(0, cols.pop(cols.index('date')))
-            df = df.ix[:, cols]
+            df = add_date(df, 'timeStamp', datefmt)
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -93,29 +140,30 @@ def get_addrs_tx_history_data(symbol, deleflag, address=None, hash=None, role=No
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_trades_data(exchange, symbol, starttime):
     """
     获取指定条件的交易信息，starttime之后的100000条信息(降序排列)
     :param exchange: string 大写
     :param symbol:  string 小写
-    :param starttime: string '2018-08-02 16:26'
+    :param starttime: string '2018-08-02 16:26' 或 int 13位时间戳
     :return:
     """
-    timestamp = str_time_to_timestamp(starttime, 13)
+    if isinstance(starttime, int):
+        timestamp = starttime
+    else:
+        timestamp = str_time_to_timestamp(starttime, 13)
     url = trades_url % (exchange, symbol, timestamp)
     print(url)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
                 return errcode, errmsg, None
             df = pd.DataFrame(l['data']['items'],
                               columns=['exchange', 'symbol', 'dealid', 'amount', 'dealtime', 'dir', 'price'])
-            cols = list(df)
-            df = df.ix[:, cols]
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -123,21 +171,24 @@ def get_trades_data(exchange, symbol, starttime):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_position_data(exchange, symbol, period, str):
     """
     获取持仓量，获取指定条件且string值后的10000条数据
     :param exchange: string （大写）
     :param symbol: string(小写)
     :param period: string (1h)
-    :param str: string '2018-08-02 16:26'
+    :param str: string '2018-08-02 16:26' 或 int 10位时间戳(翻页时使用)
     :return:
     """
-    timestamp = str_time_to_timestamp(str, 10)
+    if isinstance(str, int):
+        timestamp = str
+    else:
+        timestamp = str_time_to_timestamp(str, 10)
     url = position_url % (exchange, symbol, period, timestamp)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
@@ -146,8 +197,6 @@ def get_position_data(exchange, symbol, period, str):
                               columns=['exchange', 'period', 'symbol', 'timestamp', 'dayturnover', 'expirydate',
                                        'fundinginterval', 'fundingrate', 'openinterest', 'predictedrate', 'totalvolume',
                                        'createtime'])
-            cols = list(df)
-            df = df.ix[:, cols]
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -155,20 +204,23 @@ def get_position_data(exchange, symbol, period, str):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_funding_data(exchange, symbol, str):
     """
     获取资金费率数据
     :param exchange:  string 交易所名称
     :param symbol:  string 币对名称
-    :param str:  string，'2018-08-02 16:26' 获取该时间以后的1000条数据
+    :param str:  string，'2018-08-02 16:26' 获取该时间以后的1000条数据 或 int 10位时间戳(翻页时使用)
     :return:
     """
-    timestamp = str_time_to_timestamp(str, 10)
+    if isinstance(str, int):
+        timestamp = str
+    else:
+        timestamp = str_time_to_timestamp(str, 10)
     url = funding_url % (exchange, symbol, timestamp)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
@@ -176,8 +228,6 @@ def get_funding_data(exchange, symbol, str):
             df = pd.DataFrame(l['data']['items'],
                               columns=['exchange', 'symbol', 'timestamp', 'fundingInterval', 'fundingRate',
                                        'fundingRateDaily'])
-            cols = list(df)
-            df = df.ix[:, cols]
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -185,6 +235,7 @@ def get_funding_data(exchange, symbol, str):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_daily_volume(exchange, symbol, start_day, end_day):
     """
 
@@ -202,8 +253,7 @@ def get_daily_volume(exchange, symbol, start_day, end_day):
     url = daily_volume_url % (exchange, symbol, start_day, end_day)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
@@ -211,15 +261,6 @@ def get_daily_volume(exchange, symbol, start_day, end_day):
             df = pd.DataFrame(l['data']['items'],
                               columns=['Exchange', 'Symbol', 'Basecoin', 'Quotecoin', 'DailyAmount', 'DailyVolume',
                                        'UpdateDay', 'StartDay', 'EndDay'])
-
-            # df['date'] = df['tickid'].map(timestamp2str)
-
-            # get a list of columns
-            cols = list(df)
-            # move the column to head of list using index, pop and insert
-            # cols.insert(0, cols.pop(cols.index('date')))
-            # use ix to reorder
-            df = df.ix[:, cols]
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -227,6 +268,7 @@ def get_daily_volume(exchange, symbol, start_day, end_day):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_spread_atr(exchange, symbol, start_day, end_day):
     """
 
@@ -244,8 +286,7 @@ def get_spread_atr(exchange, symbol, start_day, end_day):
     url = spread_atr_url % (exchange, symbol, start_day, end_day)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = (l['description'])
             if errcode != 0:
@@ -253,15 +294,6 @@ def get_spread_atr(exchange, symbol, start_day, end_day):
             df = pd.DataFrame(l['data']['items'],
                               columns=['Exchange', 'Symbol', 'Point', 'RelativeAtr', 'BaseSpread', 'UpdateDay',
                                        'StartDay', 'EndDay'])
-
-            # df['date'] = df['tickid'].map(timestamp2str)
-
-            # get a list of columns
-            cols = list(df)
-            # move the column to head of list using index, pop and insert
-            # cols.insert(0, cols.pop(cols.index('date')))
-            # use ix to reorder
-            df = df.ix[:, cols]
             return errcode, errmsg, df
         except Exception as e:
             print(e)
@@ -269,6 +301,7 @@ def get_spread_atr(exchange, symbol, start_day, end_day):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_exchange(datatype=1):
     """
         获取交易所列表
@@ -288,8 +321,7 @@ def get_exchange(datatype=1):
 
     for _ in range(retry_count):
         try:
-            r = requests.get(exchange_url % datatype, timeout=10)
-            l = r.json()
+            l = _get_json(exchange_url % datatype)
             errcode = l['result']
             errmsg = l['description']
             if errcode != 0:
@@ -301,6 +333,7 @@ def get_exchange(datatype=1):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_exsymbol(exchange, datatype=1):
     """
         获取交易所币对
@@ -323,8 +356,7 @@ def get_exsymbol(exchange, datatype=1):
     url = exsymbol_url % (exchange, datatype)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = l['description']
             if errcode != 0:
@@ -342,7 +374,43 @@ def timestamp2str(ts):
     return time.strftime("%Y-%m-%d %H:%M:%S", tmp)
 
 
-def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr):
+def tickid2datetime(tickid):
+    """
+    10位时间戳数组一次性转为本地时间 datetime64，结果与逐个调用 timestamp2str 一致
+    :param tickid: array-like int
+    :return: pd.DatetimeIndex
+    """
+    t = np.asarray(tickid, dtype=np.int64)
+    if time.daylight:
+        # 有夏令时的时区按小时取 utc 偏移，只对出现过的小时调用 localtime
+        hours, inv = np.unique(t // 3600, return_inverse=True)
+        offset = np.array([time.localtime(int(h) * 3600).tm_gmtoff for h in hours], dtype=np.int64)[inv]
+    else:
+        offset = -time.timezone
+    return pd.to_datetime(t + offset, unit='s')
+
+
+def add_date(df, col, datefmt='str'):
+    """
+    由时间戳列生成 date 列并放在第一列
+    :param df: DataFrame
+    :param col: string 10位时间戳所在的列
+    :param datefmt: string 'str': 'YYYY-MM-DD HH:MM:SS' 字符串；'datetime': datetime64；None: 不生成 date 列
+    :return: DataFrame
+    """
+    if datefmt is None:
+        return df
+    date = tickid2datetime(df[col].values)
+    if datefmt == 'str':
+        date = date.strftime("%Y-%m-%d %H:%M:%S")
+    elif datefmt != 'datetime':
+        raise TypeError('invalid datefmt: %s' % datefmt)
+    df.insert(0, 'date', date)
+    return df
+
+
+@api_metrics.instrument
+def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr, datefmt='str'):
     """
         获取交易所币对K线
         Parameters
@@ -357,6 +425,8 @@ def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr):
                       开始日期 format：YYYY-MM-DD
           endstr:string
                       结束日期 format：YYYY-MM-DD
+          datefmt:string
+                      date 列的格式，'str'(默认)、'datetime' 或 None(不生成)，见 add_date
 
         return
         -------
@@ -379,8 +449,7 @@ def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr):
     url = exkline_url % (exchange, symbol, period, start, end)
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = l['description']
             if errcode != 0:
@@ -388,14 +457,7 @@ def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr):
 
             df = pd.DataFrame(l['data']['items'], columns=['tickid', 'open', 'high', 'low', 'close', 'volume'])
 
-            df['date'] = df['tickid'].map(timestamp2str)
-
-            # get a list of columns
-            cols = list(df)
-            # move the column to head of list using index, pop and insert
-            cols.insert(0, cols.pop(cols.index('date')))
-            # use ix to reorder
-            df = df.ix[:, cols]
+            df = add_date(df, 'tickid', datefmt)
 
             return errcode, errmsg, df
         except Exception as e:
@@ -404,7 +466,85 @@ def get_exsymbol_kline_old(exchange, symbol, period, startstr, endstr):
     raise IOError("无法连接")
 
 
-def get_exsymbol_kline(exchange, symbol, period, startstr, endstr):
+def period_to_seconds(period):
+    """
+    时间级别转为秒数
+    :param period: string 1m,5m,15m,30m,1h,4h,1d,1w
+    :return: int
+    """
+    unit = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    try:
+        return int(period[:-1]) * unit[period[-1]]
+    except (KeyError, ValueError):
+        raise TypeError('unknow period: %s' % period)
+
+
+def _kline_pages(make_url, start, end):
+    """
+    顺序翻页下载 [start, end] 内的K线，每页以上一页最后一条的 tickid 作为下一页的起点
+    :param make_url: 函数 make_url(start, end) -> url
+    :return: errcode, errmsg, items
+    """
+    stop_flag = 0
+    data_list = []
+    errcode, errmsg = 0, ''
+    while 1:
+        ss_time = time.time()
+        url = make_url(start, end)
+        l = _get_json(url, {"Accept-encoding": "gzip"})
+        if kline_debug:
+            print(url)
+            print("url time :" + str(time.time() - ss_time))
+        errcode = l['result']
+        errmsg = l['description']
+        if errcode != 0:
+            return errcode, errmsg, None
+        items = l['data']['items']
+        if not items or stop_flag == items[-1][0]:
+            break
+        data_list.extend(items)
+        start = stop_flag = items[-1][0]
+        if start >= end:
+            break
+    return errcode, errmsg, data_list
+
+
+def _kline_items(make_url, start, end, period, workers=None):
+    """
+    下载 [start, end] 内的K线
+    workers 为空或1时顺序翻页；否则按每页能返回的时间长度把区间切成若干段，
+    在线程池中并发下载各段，再按顺序拼接
+    :return: errcode, errmsg, items
+    """
+    if not workers or workers <= 1:
+        return _kline_pages(make_url, start, end)
+
+    step = period_to_seconds(period) * kline_page_size
+    bounds = list(range(start, end, step)) + [end]
+    shards = list(zip(bounds[:-1], bounds[1:]))
+    with ThreadPoolExecutor(max_workers=min(workers, pool_size)) as pool:
+        call = api_metrics.current()
+        results = list(pool.map(lambda se: api_metrics.bind(call).run(_kline_pages, make_url, se[0], se[1]),
+                                shards))
+
+    data_list = []
+    errcode, errmsg = 0, ''
+    for errcode, errmsg, items in results:
+        if errcode != 0:
+            return errcode, errmsg, None
+        data_list.extend(items)
+    return errcode, errmsg, data_list
+
+
+def _dedup_tickid(df, subset='tickid'):
+    # 翻页和分段的边界会重复返回同一根K线
+    df = df.drop_duplicates(subset=subset, keep='first')
+    df = df.sort_values('tickid').reset_index(drop=True)
+    return df
+
+
+@api_metrics.instrument
+def get_exsymbol_kline(exchange, symbol, period, startstr, endstr, workers=None, datefmt='str'):
     """
     获取现货历史kline线
     :param exchange: string 交易所名称
@@ -412,6 +552,8 @@ def get_exsymbol_kline(exchange, symbol, period, startstr, endstr):
     :param period: string 时间级别
     :param startstr: string 起始时间
     :param endstr: string 结束时间
+    :param workers: int 并发下载的线程数，默认不并发
+    :param datefmt: string date 列的格式，'str'(默认)、'datetime' 或 None(不生成)，见 add_date
     :return:
     """
     try:
@@ -424,46 +566,14 @@ def get_exsymbol_kline(exchange, symbol, period, startstr, endstr):
         raise TypeError('ktype input error.')
 
     try:
-        stop_flag = 0
-        data_list = []
-        while 1:
-            ss_time = time.time()
-            url = exkline_url % (exchange, symbol, period, start, end)
-            print(url)  # 注释掉
-            r = requests.get(url, timeout=10, headers={"Accept-encoding": "gzip"})
-            l = r.json()
-            ee_time = time.time()
-            print("url time :" + str(ee_time - ss_time))  # test expend time
-            errcode = l['result']
-            errmsg = l['description']
-            if not l['data']['items'] and (data_list or len(data_list) == 0):
-                break
-
-            if errcode != 0:
-                return errcode, errmsg, None
-            # print(l['data']['items'][-1][0])
-            if stop_flag == l['data']['items'][-1][0]:
-                break
-            else:
-                ssss_time = time.time()
-                # data_dict = {**data_dict, **l['data']}
-                data_list.extend(l['data']['items'])
-                start = l['data']['items'][-1][0]
-                stop_flag = l['data']['items'][-1][0]
-                eeee_time = time.time()
-                # print("list:" + str(eeee_time - ssss_time))  # test expend time
-        sss_time = time.time()
+        errcode, errmsg, data_list = _kline_items(
+            lambda s, e: exkline_url % (exchange, symbol, period, s, e), start, end, period, workers)
+        if errcode != 0:
+            return errcode, errmsg, None
         df = pd.DataFrame(data_list, columns=['tickid', 'open', 'high', 'low', 'close', 'volume', 'amount'])
+        df = _dedup_tickid(df)
 
-        df['date'] = df['tickid'].map(timestamp2str)
-
-        # get a list of columns
-        cols = list(df)
-        # move the column to head of list using index, pop and insert
-        cols.insert(0, cols.pop(cols.index('date')))
-        df = df.ix[:, cols]
-        eee_time = time.time()
-        # print("df:" + str(eee_time-sss_time))  # test expend time
+        df = add_date(df, 'tickid', datefmt)
         return errcode, errmsg, df
     except Exception as e:
         print(e)
@@ -471,7 +581,68 @@ def get_exsymbol_kline(exchange, symbol, period, startstr, endstr):
     raise IOError("无法连接")
 
 
-def get_exsymbol_future_kline(exchange, symbol, period, startstr, endstr, datatype=0, symboltype=0):
+def align_kline_panel(frames, fields=None):
+    """
+    把多个币对的K线按 tickid 对齐成 时间×币对 的二维数组，一次向量化完成，不做逐个 merge
+    :param frames: list 每个币对一个 DataFrame 或 {列名: 数组}，需包含 tickid 和 fields 各列
+    :param fields: list 需要对齐的字段，默认 panel_fields
+    :return: dict
+          tickid: int64 数组 (T,)，所有币对 tickid 的并集，升序
+          fields 中每个字段: float64 二维数组 (T, N)，缺失处为 NaN
+          mask: bool 二维数组 (T, N)，该币对该时刻没有K线为 True
+    """
+    if fields is None:
+        fields = panel_fields
+    tickids = [np.asarray(f['tickid'], dtype=np.int64) for f in frames]
+    index, rows = np.unique(np.concatenate(tickids), return_inverse=True)
+    cols = np.repeat(np.arange(len(frames)), [len(t) for t in tickids])
+
+    panel = {'tickid': index}
+    mask = np.ones((len(index), len(frames)), dtype=bool)
+    mask[rows, cols] = False
+    panel['mask'] = mask
+    for field in fields:
+        values = np.full((len(index), len(frames)), np.nan)
+        values[rows, cols] = np.concatenate(
+            [pd.to_numeric(pd.Series(np.asarray(f[field])), errors='coerce').values for f in frames])
+        panel[field] = values
+    return panel
+
+
+@api_metrics.instrument
+def get_exsymbol_kline_panel(exchange, symbols, period, startstr, endstr, fields=None, workers=8):
+    """
+    并发获取多个币对的K线并对齐成 时间×币对 的二维数组
+    :param exchange: string 交易所名称
+    :param symbols: list 币对名称列表
+    :param period: string 时间级别
+    :param startstr: string 起始时间
+    :param endstr: string 结束时间
+    :param fields: list 需要的字段，默认 panel_fields
+    :param workers: int 并发下载的币对数
+    :return:
+          errcode:int
+                    错误码，0-成功  其他取值错误
+          errmsg:string
+                     错误信息
+          dict:
+              tickid, mask 及各字段的二维数组，见 align_kline_panel；symbols 为列对应的币对
+    """
+    with ThreadPoolExecutor(max_workers=min(workers, pool_size)) as pool:
+        results = list(pool.map(lambda sym: get_exsymbol_kline(exchange, sym, period, startstr, endstr, datefmt=None),
+                                symbols))
+    errcode, errmsg = 0, ''
+    for errcode, errmsg, df in results:
+        if errcode != 0:
+            return errcode, errmsg, None
+    panel = align_kline_panel([df for _, _, df in results], fields)
+    panel['symbols'] = list(symbols)
+    return errcode, errmsg, panel
+
+
+@api_metrics.instrument
+def get_exsymbol_future_kline(exchange, symbol, period, startstr, endstr, datatype=0, symboltype=0, workers=None,
+                              datefmt='str'):
     """
     获取合约Kline线
     :param symboltype: 查询用，例：0对应xrp，将取出所有符合条件的xrp数据(数据已拼接)；1对应xrph19，只取出该币对的数据
@@ -481,6 +652,8 @@ def get_exsymbol_future_kline(exchange, symbol, period, startstr, endstr, dataty
     :param startstr: string 起始时间
     :param endstr: string 结束时间
     :param datatype: 默认0：不区分合约类型：获取当前币对所有；1：当周；2：次周；3：季度；4：永续，5：半年
+    :param workers: int 并发下载的线程数，默认不并发
+    :param datefmt: string date 列的格式，'str'(默认)、'datetime' 或 None(不生成)，见 add_date
     :return:
     """
     try:
@@ -493,46 +666,16 @@ def get_exsymbol_future_kline(exchange, symbol, period, startstr, endstr, dataty
         raise TypeError('ktype input error.')
 
     try:
-        stop_flag = 0
-        data_list = []
-        while 1:
-            ss_time = time.time()
-            url = exfuture_kline_url % (exchange, symbol, period, start, end, datatype, symboltype)
-            print(url)  # 注释掉
-            r = requests.get(url, timeout=10, headers={"Accept-encoding": "gzip"})
-            l = r.json()
-            ee_time = time.time()
-            print("url time :" + str(ee_time - ss_time))  # test expend time
-            errcode = l['result']
-            errmsg = l['description']
-            if not l['data']['items'] and (data_list or len(data_list) == 0):
-                break
-
-            if errcode != 0:
-                return errcode, errmsg, None
-            # print(l['data']['items'][-1][0])
-            if stop_flag == l['data']['items'][-1][0]:
-                break
-            else:
-                ssss_time = time.time()
-                # data_dict = {**data_dict, **l['data']}
-                data_list.extend(l['data']['items'])
-                start = l['data']['items'][-1][0]
-                stop_flag = l['data']['items'][-1][0]
-                eeee_time = time.time()
-                # print("list:" + str(eeee_time - ssss_time))  # test expend time
-        sss_time = time.time()
+        errcode, errmsg, data_list = _kline_items(
+            lambda s, e: exfuture_kline_url % (exchange, symbol, period, s, e, datatype, symboltype),
+            start, end, period, workers)
+        if errcode != 0:
+            return errcode, errmsg, None
         df = pd.DataFrame(data_list, columns=['tickid', 'open', 'high', 'low', 'close', 'volume', 'amount', 'type'])
+        # datatype=0 时同一 tickid 会有多个合约类型
+        df = _dedup_tickid(df, ['tickid', 'type'])
 
-        df['date'] = df['tickid'].map(timestamp2str)
-
-        # get a list of columns
-        cols = list(df)
-        # move the column to head of list using index, pop and insert
-        cols.insert(0, cols.pop(cols.index('date')))
-        df = df.ix[:, cols]
-        eee_time = time.time()
-        # print("df:" + str(eee_time-sss_time))  # test expend time
+        df = add_date(df, 'tickid', datefmt)
         return errcode, errmsg, df
     except Exception as e:
         print(e)
@@ -540,7 +683,8 @@ def get_exsymbol_future_kline(exchange, symbol, period, startstr, endstr, dataty
     raise IOError("无法连接")
 
 
-def get_huobi_ontime_kline(symbol, period, startstr, endstr):
+@api_metrics.instrument
+def get_huobi_ontime_kline(symbol, period, startstr, endstr, datefmt='str'):
     """
         获取交易所币对K线
         Parameters
@@ -553,6 +697,8 @@ def get_huobi_ontime_kline(symbol, period, startstr, endstr):
                       开始日期 format：YYYY-MM-DD HH:MM
           endstr:string
                       结束日期 format：YYYY-MM-DD HH:MM
+          datefmt:string
+                      date 列的格式，'str'(默认)、'datetime' 或 None(不生成)，见 add_date
 
         return
         -------
@@ -577,8 +723,7 @@ def get_huobi_ontime_kline(symbol, period, startstr, endstr):
     url = huobi_kline_url % (symbol, period, start, end, 'HUOBI')
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = l['description']
             if errcode != 0:
@@ -586,14 +731,7 @@ def get_huobi_ontime_kline(symbol, period, startstr, endstr):
 
             df = pd.DataFrame(l['data']['items'], columns=['tickid', 'open', 'high', 'low', 'close', 'volume'])
 
-            df['date'] = df['tickid'].map(timestamp2str)
-
-            # get a list of columns
-            cols = list(df)
-            # move the column to head of list using index, pop and insert
-            cols.insert(0, cols.pop(cols.index('date')))
-            # use ix to reorder
-            df = df.ix[:, cols]
+            df = add_date(df, 'tickid', datefmt)
 
             return errcode, errmsg, df
         except Exception as e:
@@ -602,6 +740,7 @@ def get_huobi_ontime_kline(symbol, period, startstr, endstr):
     raise IOError("无法连接")
 
 
+@api_metrics.instrument
 def get_huobi_exchange():
     """
         获取交易所币对
@@ -611,8 +750,7 @@ def get_huobi_exchange():
     url = huobi_exchange_url
     for _ in range(retry_count):
         try:
-            r = requests.get(url, timeout=10)
-            l = r.json()
+            l = _get_json(url)
             errcode = l['result']
             errmsg = l['description']
             if errcode != 0:
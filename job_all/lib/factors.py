@@ -4,6 +4,10 @@ from numpy import abs
 from numpy import log
 from numpy import sign
 from scipy.stats import rankdata
+try:
+    from . import kernels
+except:
+    import kernels
 import attr
 import warnings
 warnings.filterwarnings("ignore")
@@ -34,7 +38,7 @@ def rolling_rank(na):
     return rankdata(na)[-1]
 
 def ts_rank(df,window=10):
-    return df.rolling(window).apply(rolling_rank)
+    return kernels.ts_rank(df, window)
 
 def rolling_prod(na):
     return na.prod(na)
@@ -59,34 +63,19 @@ def ranks(df):
     return df.rank(pct=True).values[-1]
 
 def rank(df,window=10):
-    return df.rolling(window).apply(ranks,raw=False)
+    return kernels.rank(df, window)
 
 def scale(df ,k=1):
     return df.mul(k).div(np.abs(df).sum())
 
 def ts_argmax(df ,window=10):
-    return df.rolling(window).apply(np.argmax ) +1
+    return kernels.ts_argmax(df, window)
 
 def ts_argmin(df ,window=10):
-    return df.rolling(window).apply(np.argmin ) +1
+    return kernels.ts_argmin(df, window)
 
 def decay_linear(df ,period=10):
-    if df.isnull().values.any():
-        df.fillna(method='ffill' ,inplace=True)
-        df.fillna(method='bfill' ,inplace=True)
-        df.fillna(value=0 ,inplace=True)
-
-    na_lwma=df.values
-    y = list(range(1, period+1))
-    y.reverse()
-    y=np.array(y)
-    y=y/y.sum()
-    value_list=[np.nan]*(period-1)
-    for pos in range(period,len(na_lwma)):
-        value=na_lwma[pos-period:pos]
-        value=value*y
-        value_list.append(value.sum())
-    return pd.Series(value_list,name="close")
+    return kernels.decay_linear(df, period)
 
 
 
@@ -4,6 +4,12 @@ from numpy import abs
 from numpy import log
 from numpy import sign
 from scipy.stats import rankdata
+try:
+    from . import kernels
+    from . import memo
+except:
+    import kernels
+    import memo
 from functools import reduce
 import warnings
 import copy
@@ -18,32 +24,47 @@ pd.set_option('display.max_rows', None)
 #print(data.head())
 
 
+def where(cond, x, y):
+    return kernels.where(cond, x, y)
+
+
+@memo.memoize
 def ts_sum(df ,window=10):
     return df.rolling(window).sum()
 
 
+@memo.memoize
 def max_s(x,y):
-    value_list=[a if a>b else b for a,b in zip(x,y)]
-    return pd.Series(value_list,name="max")
+    data=where(x > y, x, y)
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.Series(data, name="max")
 
 
+@memo.memoize
 def min_s(x,y):
-    value_list = [a if a < b else b for a, b in zip(x, y)]
-    return pd.Series(value_list,name="min")
+    data=where(x < y, x, y)
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.Series(data, name="min")
 
 
+@memo.memoize
 def sma(df ,window=10):
     return df.rolling(window).mean()
 
 
+@memo.memoize
 def stddev(df ,window=10):
     return df.rolling(window).std()
 
 
+@memo.memoize
 def correlation(x ,y ,window=10):
     return x.rolling(window).corr(y)
 
 
+@memo.memoize
 def covariance(x ,y ,window=10):
     return x.rolling(window).cov(y)
 
@@ -52,26 +73,31 @@ def rolling_rank(na):
     return rankdata(na)[-1]
 
 
+@memo.memoize
 def ts_rank(df,window=10):
-    return window+1-df.rolling(window).apply(rolling_rank)
+    return window+1-kernels.ts_rank(df, window)
 
 
 def rolling_prod(na):
     return na.prod(na)
 
 
+@memo.memoize
 def product(df ,window=10):
     return df.rolling(window).apply(rolling_prod)
 
 
+@memo.memoize
 def ts_min(df ,window=10):
     return df.rolling(window).min()
 
 
+@memo.memoize
 def ts_max(df ,window=10):
     return df.rolling(window).max()
 
 
+@memo.memoize
 def ts_count(x,y,window=10):
     diff=y-x
     diff[diff<0]=np.nan
@@ -80,10 +106,12 @@ def ts_count(x,y,window=10):
     return result
 
 
+@memo.memoize
 def delta(df ,period=1):
     return df.diff(period)
 
 
+@memo.memoize
 def delay(df ,period=1):
     return df.shift(period)
 
@@ -93,28 +121,34 @@ def ranks(df):
     return df.rank(pct=True).values[-1]
 
 
+@memo.memoize
 def rank(df,window=10):
-    return df.rolling(window).apply(ranks,raw=False)
+    return kernels.rank(df, window)
 
 
+@memo.memoize
 def scale(df ,k=1):
     return df.mul(k).div(np.abs(df).sum())
 
 
+@memo.memoize
 def ts_argmax(df ,window=10):
-    return df.rolling(window).apply(np.argmax) + 1
+    return kernels.ts_argmax(df, window)
 
 
+@memo.memoize
 def ts_argmin(df ,window=10):
-    return df.rolling(window).apply(np.argmin) + 1
+    return kernels.ts_argmin(df, window)
 
 
+@memo.memoize
 def ts_lowday(df,window=10):
-    return (window-1)-df.rolling(window).apply(np.argmin)
+    return kernels.ts_lowday(df, window)
 
 
+@memo.memoize
 def ts_highday(df,window=10):
-    return (window-1)-df.rolling(window).apply(np.argmax)
+    return kernels.ts_highday(df, window)
 
 
 def SMA(vals, n, m):
@@ -122,48 +156,25 @@ def SMA(vals, n, m):
     return reduce(lambda x, y: ((n - m) * x + y * m) / n, vals)
 
 
+@memo.memoize
 def sma_list(df, n, m):
-    result_list = [np.nan]
-    for x in range(1, len(df)):
-        if df.values[x-1]*0 == 0:
-            value = SMA([df.values[x - 1], df.values[x]], n, m)
-            result_list.append(value)
-        elif df.values[x-1]*0 != 0:
-            result_list.append(np.nan)
-        elif df.values[x-2]*0 != 0:
-            value = SMA([df.values[x - 1], df.values[x]], n, m)
-            result_list.append(value)
-        else:
-            value = SMA([result_list[-1], df.values[x]], n, m)
-            result_list.append(value)
-    result_series = pd.Series(result_list, name="sma")
-    return result_series
+    return kernels.sma_recursive(df, n, m)
 
 
+@memo.memoize
 def decay_linear(df, period=10):
-    if df.isnull().values.any():
-        df.fillna(method='ffill' ,inplace=True)
-        df.fillna(method='bfill' ,inplace=True)
-        df.fillna(value=0 ,inplace=True)
-
-    na_lwma=df.values
-    y = list(range(1, period+1))
-    y.reverse()
-    y=np.array(y)
-    y=y/y.sum()
-    value_list=[np.nan]*(period-1)
-    for pos in range(period,len(na_lwma)):
-        value=na_lwma[pos-period:pos]
-        value=value*y
-        value_list.append(value.sum())
-    return pd.Series(value_list,name="close")
+    return kernels.decay_linear(df, period)
 
 
+@memo.attach
 class Alphas(object):
-    def __init__(self, pn_data):
+    def __init__(self, pn_data, memo_limit=None):
         """
         :传入参数 pn_data: pandas.Panel
+        :param memo_limit: int 算子结果缓存的内存上限(字节)，默认 memo.default_limit，0 表示不缓存
         """
+        # 同一实例的各个因子共用算子结果，命中情况见 self.memo.report()
+        self.memo = memo.MemoCache(memo_limit)
         # 获取历史数据
         self.open = pn_data['open']
         self.high = pn_data['high']
@@ -173,9 +184,14 @@ class Alphas(object):
         self.amount=pn_data['amount']
         self.returns = self.close-self.close.shift(1)
 
+    def rank(self, df):
+        # 因子中的 RANK: 单个币对没有截面，用最近 10 根的时间序列名次；
+        # factors_gtja_panel.Alphas 重写为截面名次，其余算子不变
+        return rank(df)
+
     def alpha001(self):
-        data_x=rank(delta(log(self.volume),1))
-        data_y=rank(((self.close-self.open)/self.open))
+        data_x=self.rank(delta(log(self.volume),1))
+        data_y=self.rank(((self.close-self.open)/self.open))
         data=correlation(data_x,data_y,6)*-1
         return data
 
@@ -187,27 +203,25 @@ class Alphas(object):
     def alpha003(self):
         data_mid1=min_s(self.low,delay(self.close,1))
         data_mid2=max_s(self.high,delay(self.close,1))
-        data_mid3=[z if x>y else v for x,y,z,v in zip(self.close,delay(self.close,1),data_mid1,data_mid2)]
-        data_mid3=np.array(data_mid3)
+        data_mid3=where(self.close > delay(self.close, 1), data_mid1, data_mid2)
         data_mid4=self.close-data_mid3
-        data_mid5=[0 if x==y else z for x,y,z in zip(self.close,delay(self.close,1),data_mid4)]
-        data_mid5=np.array(data_mid5)
-        df=pd.Series(data_mid5,name="value")
+        data_mid5=where(self.close == delay(self.close, 1), 0, data_mid4)
+        df=data_mid5
         return ts_sum(df,6)
 
     def alpha004(self):
         data_mid1=self.volume/(sma(self.volume,20))
-        data_mid2=[1 if x>=1 else -1 for x in data_mid1]
-        data_mid3=[1 if x<y else z for x,y,z in zip((ts_sum(self.close,2)/2),((ts_sum(self.close,8)/8)-(stddev(self.close,8))),data_mid2)]
-        data_mid4=[-1 if x<y else z for x,y,z in zip((ts_sum(self.close,8)/8+stddev(self.close,8)),(ts_sum(self.close,2)/2),(data_mid3))]
-        return pd.Series(data_mid4,name="value")
+        data_mid2=where(data_mid1 >= 1, 1, -1)
+        data_mid3=where(ts_sum(self.close, 2) / 2 < ts_sum(self.close, 8) / 8 - stddev(self.close, 8), 1, data_mid2)
+        data_mid4=where(ts_sum(self.close, 8) / 8 + stddev(self.close, 8) < ts_sum(self.close, 2) / 2, -1, data_mid3)
+        return data_mid4
 
     def alpha005(self):
         data_mid1=correlation(ts_rank(self.volume,5),ts_rank(self.high,5),5)
         return -1*ts_max(data_mid1)
 
     def alpha006(self):
-        return -1*(rank(sign(delta((self.open*0.85+self.high*0.15),4))))
+        return -1*(self.rank(sign(delta((self.open*0.85+self.high*0.15),4))))
 
     def alpha009(self):
         data_mid1=((self.high+self.low)/2-(delay(self.high)+delay(self.low))/2)*(self.high-self.low)/self.volume
@@ -227,9 +241,9 @@ class Alphas(object):
         return self.close/delay(self.close,5)
 
     def alpha019(self):
-        data_mid1=[0 if x==y else z for x,y,z in zip((self.close),(delay(self.close,5)),(self.close-delay(self.close,5))/self.close)]
-        data_mid2=[z if x<y else v for x,y,z,v in zip(self.close,delay(self.close,5),(self.close-delay(self.close,5))/delay(self.close,5),data_mid1)]
-        return pd.Series(data_mid2,name="value")
+        data_mid1=where(self.close == delay(self.close, 5), 0, (self.close - delay(self.close, 5)) / self.close)
+        data_mid2=where(self.close < delay(self.close, 5), (self.close - delay(self.close, 5)) / delay(self.close, 5), data_mid1)
+        return data_mid2
 
     def alpha020(self):
         return (self.close-delay(self.close,6))/delay(self.close,6)*100
@@ -253,41 +267,39 @@ class Alphas(object):
         return (self.close-sma(self.close,12))/sma(self.close,12)*100
 
     def alpha032(self):
-        return -1*ts_sum((rank(correlation(rank(self.high),rank(self.volume),3))),3)
+        return -1*ts_sum((self.rank(correlation(self.rank(self.high),self.rank(self.volume),3))),3)
 
     def alpha033(self):
         data_mid1=-1*ts_min(self.low,5)+delay(ts_min(self.low,5),5)
-        data_mid2=rank((ts_sum(self.returns,240)-ts_sum(self.returns,20))/220)
+        data_mid2=self.rank((ts_sum(self.returns,240)-ts_sum(self.returns,20))/220)
         return data_mid1*data_mid2*ts_rank(self.volume,5)
 
     def alpha034(self):
         return sma(self.close,12)/self.close
 
     def alpha035(self):
-        data_mid1=rank(decay_linear(delta(self.open),15))
-        data_mid2=rank(decay_linear(correlation(self.volume,self.open,17),7))
+        data_mid1=self.rank(decay_linear(delta(self.open),15))
+        data_mid2=self.rank(decay_linear(correlation(self.volume,self.open,17),7))
         return min_s(data_mid1,data_mid2)*-1
 
     def alpha037(self):
         data_mid1=ts_sum(self.open,5)*ts_sum(self.returns,5)
         data_mid2=delay((ts_sum(self.open,5)*ts_sum(self.returns,5)),10)
-        return rank(data_mid1-data_mid2)*-1
+        return self.rank(data_mid1-data_mid2)*-1
 
     def alpha038(self):
-        data=[z if x<y else 0 for x,y,z in zip(ts_sum(self.high,20)/20,self.high,(-1*delta(self.high,2)))]
-        return pd.Series(data,name="value")
+        data=where(ts_sum(self.high, 20) / 20 < self.high, -1 * delta(self.high, 2), 0)
+        return data
 
     def alpha040(self):
         data_mid1=copy.deepcopy(self.volume)
-        data_mid1=[0.001 if x<=y else z for x,y,z in zip(self.close,delay(self.close),data_mid1)]
-        data_mid1=pd.Series(data_mid1,name="value")
+        data_mid1=where(self.close <= delay(self.close), 0.001, data_mid1)
         data_mid2=copy.deepcopy(self.volume)
-        data_mid2=[0.001 if x>y else z for x,y,z in zip(self.close,delay(self.close),data_mid2)]
-        data_mid2=pd.Series(data_mid2,name="value")
+        data_mid2=where(self.close > delay(self.close), 0.001, data_mid2)
         return ts_sum(data_mid1,26)/ts_sum(data_mid2,26)
 
     def alpha042(self):
-        return -1*rank(stddev(self.high,10))*correlation(self.high,self.volume,10)
+        return -1*self.rank(stddev(self.high,10))*correlation(self.high,self.volume,10)
 
     def alpha043(self):
         data_mid1=-1*copy.deepcopy(self.volume)
@@ -307,33 +319,27 @@ class Alphas(object):
         return 100*data_mid3
 
     def alpha049(self):
-        data_mid1=[0 if x>=y else z for x,y,z in zip((self.high+self.low),(delay(self.high)+delay(self.low)),(max_s((self.high-delay(self.high)).abs(),(self.low-delay(self.low)).abs())))]
-        data_mid1=pd.Series(data_mid1,name="values")
+        data_mid1=where(self.high + self.low >= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid1=ts_sum(data_mid1,12)
 
-        data_mid2=[0 if x<=y else z for x,y,z in zip((self.high+self.low),(delay(self.high)+delay(self.low)),(max_s((self.high-delay(self.high)).abs(),(self.low-delay(self.low)).abs())))]
-        data_mid2 = pd.Series(data_mid2, name="values")
+        data_mid2=where(self.high + self.low <= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid2 = ts_sum(data_mid2, 12)
 
         return data_mid1/(data_mid1+data_mid2)
 
     def alpha050(self):
-        data_mid1 = [0 if x >= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid1 = pd.Series(data_mid1, name="values")
+        data_mid1 = where(self.high + self.low >= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid1 = ts_sum(data_mid1, 12)
 
-        data_mid2 = [0 if x <= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid2 = pd.Series(data_mid2, name="values")
+        data_mid2 = where(self.high + self.low <= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid2 = ts_sum(data_mid2, 12)
 
         data_mid3=data_mid1/(data_mid1+data_mid2)
 
-        data_mid4 = [0 if x <= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid4 = pd.Series(data_mid4, name="values")
+        data_mid4 = where(self.high + self.low <= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid4 = ts_sum(data_mid4, 12)
 
-        data_mid5 = [0 if x >= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid5 = pd.Series(data_mid5, name="values")
+        data_mid5 = where(self.high + self.low >= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid5 = ts_sum(data_mid5, 12)
 
         data_mid6=data_mid4/(data_mid4+data_mid5)
@@ -341,12 +347,10 @@ class Alphas(object):
         return data_mid6-data_mid3
 
     def alpha051(self):
-        data_mid4 = [0 if x <= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid4 = pd.Series(data_mid4, name="values")
+        data_mid4 = where(self.high + self.low <= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid4 = ts_sum(data_mid4, 12)
 
-        data_mid5 = [0 if x >= y else z for x, y, z in zip((self.high + self.low), (delay(self.high) + delay(self.low)),(max_s((self.high - delay(self.high)).abs(),(self.low - delay(self.low)).abs())))]
-        data_mid5 = pd.Series(data_mid5, name="values")
+        data_mid5 = where(self.high + self.low >= delay(self.high) + delay(self.low), 0, max_s((self.high - delay(self.high)).abs(), (self.low - delay(self.low)).abs()))
         data_mid5 = ts_sum(data_mid5, 12)
 
         data_mid6 = data_mid4 / (data_mid4 + data_mid5)
@@ -371,8 +375,8 @@ class Alphas(object):
         data_mid_vz=(self.low-delay(self.close)).abs()+(self.high-delay(self.close)).abs()/2+(delay(self.close)-delay(self.open)).abs()/4
         data_mid_vv=(self.high-delay(self.low)).abs()+(delay(self.close)-delay(self.open))/4
 
-        data_mid_v=[vz if x1>y1 and x2>y2 else vv for x1,y1,x2,y2,vz,vv in zip((self.low-delay(self.close)).abs(),(self.high-delay(self.low)).abs(),(self.low-delay(self.close)).abs(),(self.high-delay(self.close)).abs(),data_mid_vz,data_mid_vv)]
-        data_mid2=[z if x1>y1 and x2>y2 else v for x1,y1,x2,y2,z,v in zip((self.high-delay(self.close)).abs(),(self.low-delay(self.close)).abs(),(self.high-delay(self.close)).abs(),(self.high-delay(self.low)).abs(),data_mid_z,data_mid_v)]
+        data_mid_v=where(((self.low - delay(self.close)).abs() > (self.high - delay(self.low)).abs()) & ((self.low - delay(self.close)).abs() > (self.high - delay(self.close)).abs()), data_mid_vz, data_mid_vv)
+        data_mid2=where(((self.high - delay(self.close)).abs() > (self.low - delay(self.close)).abs()) & ((self.high - delay(self.close)).abs() > (self.high - delay(self.low)).abs()), data_mid_z, data_mid_v)
 
         data_mid3=max_s((self.high-delay(self.close)).abs(),(self.low-delay(self.close)).abs())
 
@@ -389,11 +393,9 @@ class Alphas(object):
         return (data_mid1/20)*100
 
     def alpha059(self):
-        data_mid1=[z if x>y else v for x,y,z,v in zip(self.close,delay(self.close),min_s(self.low,delay(self.close)),max_s(self.high,delay(self.close)))]
-        data_mid1=np.array(data_mid1)
-        data_mid1=self.close.values-data_mid1
-        data_mid2=[0 if x==y else z for x,y,z in zip(self.close,delay(self.close),data_mid1)]
-        data_mid2=pd.Series(data_mid2,name="values")
+        data_mid1=where(self.close > delay(self.close), min_s(self.low, delay(self.close)), max_s(self.high, delay(self.close)))
+        data_mid1=self.close-data_mid1
+        data_mid2=where(self.close == delay(self.close), 0, data_mid1)
         return ts_sum(data_mid2,20)
 
     def alpha060(self):
@@ -401,8 +403,7 @@ class Alphas(object):
         return ts_sum(data_mid1,20)
 
     def alpha063(self):
-        data_mid1=[0 if x<=0 else x for x in (self.close-delay(self.close))]
-        data_mid1=pd.Series(data_mid1,name="values")
+        data_mid1=where(self.close - delay(self.close) <= 0, 0, self.close - delay(self.close))
         data_mid2=(self.close-delay(self.close)).abs()
         return ((sma_list(data_mid1, 6, 1))/(sma_list(data_mid2, 6, 1)))*100
 
@@ -413,8 +414,7 @@ class Alphas(object):
         return (self.close-sma(self.close,6))/sma(self.close,6)*100
 
     def alpha067(self):
-        data_mid1 = [0 if x <= 0 else x for x in (self.close - delay(self.close))]
-        data_mid1 = pd.Series(data_mid1, name="values")
+        data_mid1 = where(self.close - delay(self.close) <= 0, 0, self.close - delay(self.close))
         data_mid2 = (self.close - delay(self.close)).abs()
         return ((sma_list(data_mid1, 24, 1)) / (sma_list(data_mid2, 24, 1))) * 100
 
@@ -423,17 +423,15 @@ class Alphas(object):
         return sma_list(data_mid1, 15, 2)
 
     def alpha069(self):
-        dtm=[0 if x<=y else z for x,y,z in zip(self.open,delay(self.open),max_s((self.high-self.open),(self.open-delay(self.open))))]
-        dbm=[0 if x>=y else z for x,y,z in zip(self.open,delay(self.open),max_s((self.open-self.low),(self.open-delay(self.open))))]
-        dtm=pd.Series(dtm,name="dtm")
-        dbm=pd.Series(dbm,name="dbm")
+        dtm=where(self.open <= delay(self.open), 0, max_s(self.high - self.open, self.open - delay(self.open)))
+        dbm=where(self.open >= delay(self.open), 0, max_s(self.open - self.low, self.open - delay(self.open)))
         data_mid_z=(ts_sum(dtm,20)-ts_sum(dbm,20))/ts_sum(dtm,20)
         data_mid_vz=(ts_sum(dtm,20)-ts_sum(dbm,20))/ts_sum(dbm,20)
 
-        data_mid_v=[0 if x==y else z for x,y,z in zip(ts_sum(dtm,20),ts_sum(dbm,20),data_mid_vz)]
-        data_mid=[z if x>y else v for x,y,z,v in zip(ts_sum(dtm,20),ts_sum(dbm,20),data_mid_z,data_mid_v)]
+        data_mid_v=where(ts_sum(dtm, 20) == ts_sum(dbm, 20), 0, data_mid_vz)
+        data_mid=where(ts_sum(dtm, 20) > ts_sum(dbm, 20), data_mid_z, data_mid_v)
 
-        return pd.Series(data_mid,name="values")
+        return data_mid
 
     def alpha070(self):
         return stddev(self.amount,6)
@@ -474,9 +472,8 @@ class Alphas(object):
         return sma_list(data_mid1/data_mid2*100, 20, 1)
 
     def alpha084(self):
-        data_mid_v=[-z if x<y else 0 for x,y,z in zip(self.close,delay(self.close),self.volume)]
-        data_mid2=[z if x>y else v for x,y,z,v in zip(self.close,delay(self.close),self.volume,data_mid_v)]
-        data_mid2=pd.Series(data_mid2,name="values")
+        data_mid_v=where(self.close < delay(self.close), -self.volume, 0)
+        data_mid2=where(self.close > delay(self.close), self.volume, data_mid_v)
         return ts_sum(data_mid2,20)
 
     def alpha085(self):
@@ -486,9 +483,8 @@ class Alphas(object):
 
     def alpha086(self):
         data_yx=(delay(self.close,20)-delay(self.close,10))/10-(delay(self.close,10)-self.close)/10
-        data_y=[1 if x<0 else y for x,y in zip(data_yx,-1*(self.close-delay(self.close)))]
-        data=[-1 if x>0.25 else y for x,y in zip(data_yx,data_y)]
-        data=pd.Series(data,name="values")
+        data_y=where(data_yx < 0, 1, -1 * (self.close - delay(self.close)))
+        data=where(data_yx > 0.25, -1, data_y)
         return data
 
     def alpha088(self):
@@ -499,14 +495,12 @@ class Alphas(object):
         return data_mid1*2
 
     def alpha093(self):
-        data_mid1=[0 if x>=y else z for x,y,z in zip(self.open,delay(self.open),max_s((self.open-self.low),(self.open-delay(self.open))))]
-        data_mid1=pd.Series(data_mid1,name="values")
+        data_mid1=where(self.open >= delay(self.open), 0, max_s(self.open - self.low, self.open - delay(self.open)))
         return ts_sum(data_mid1,20)
 
     def alpha094(self):
-        data_mid_v=[-z if x<y else 0 for x,y,z in zip(self.close,delay(self.close),self.volume)]
-        data=[z if x>y else v for x,y,z,v in zip(self.close,delay(self.close),self.volume,data_mid_v)]
-        data=pd.Series(data,name="values")
+        data_mid_v=where(self.close < delay(self.close), -self.volume, 0)
+        data=where(self.close > delay(self.close), self.volume, data_mid_v)
         return ts_sum(data,30)/self.volume
 
     def alpha095(self):
@@ -519,8 +513,8 @@ class Alphas(object):
         return stddev(self.volume,10)
 
     def alpha098(self):
-        data_mid=[y if x<=0.05 else z for x,y,z in zip((delta((ts_sum(self.close,100)/100),100)/delay((self.close),100)),(-1*(self.close-ts_min(self.close,100))),(-1*(delta(self.close,3))))]
-        return pd.Series(data_mid,name="values")
+        data_mid=where(delta(ts_sum(self.close, 100) / 100, 100) / delay(self.close, 100) <= 0.05, -1 * (self.close - ts_min(self.close, 100)), -1 * delta(self.close, 3))
+        return data_mid
 
     def alpha100(self):
         return stddev(self.volume,20)
@@ -567,7 +561,7 @@ class Alphas(object):
         return ts_sum((self.high-self.open),20)/ts_sum((self.open-self.low),20)*100
 
     def alpha122(self):
-        data_mid1 = sma_list((sma_list((sma_list((self.close.map(np.log)), 13, 2)), 13, 2)), 13, 2)
+        data_mid1 = sma_list((sma_list((sma_list((log(self.close)), 13, 2)), 13, 2)), 13, 2)
         return (data_mid1-delay(data_mid1))/(delay(data_mid1))
 
     def alpha126(self):
@@ -645,7 +639,7 @@ class Alphas(object):
         return (data_mid1+data_mid2+data_mid3)*100/(6*12+6*24+12*24)
 
     def alpha160(self):
-        data_mid=stddev(self.close,20)
+        data_mid=stddev(self.close,20).copy()
         data_mid[self.close>delay(self.close)]=0
         return sma_list(data_mid, 20, 1)
 
@@ -707,7 +701,7 @@ class Alphas(object):
         return sma_list(self.close, 13, 2)*3-2*sma_list((sma_list(self.close, 13, 2)), 13, 2)+sma_list((sma_list((sma_list((log(self.close)), 13, 2)), 13, 2)), 13, 2)
 
     def alpha174(self):
-        data_mid1=stddev(self.close,20)
+        data_mid1=stddev(self.close,20).copy()
         data_mid1[self.close<=delay(self.close)] = 0
         return sma_list(data_mid1, 20, 1)
 
@@ -746,8 +740,7 @@ class Alphas(object):
     def alpha187(self):
         data_mid1=max_s((self.high-self.open),(self.open-delay(self.open)))
         #data_mid1[self.open<=delay(self.open)]=0
-        data_mid1=[0 if x<=y else z  for x,y,z in zip(self.open,delay(self.open),data_mid1)]
-        data_mid1=pd.Series(data_mid1,name="value")
+        data_mid1=where(self.open <= delay(self.open), 0, data_mid1)
         return ts_sum(data_mid1,20)/self.close
 
     def alpha188(self):
@@ -772,8 +765,7 @@ class Alphas(object):
         return np.sign(delta(self.volume))*(-1)*(delta(self.close))
 
     def alpha195(self):
-        data_mid1=[z if x<y else 0 for x,y,z in zip((ts_sum(self.high,20)/20),self.high,(-1*delta(self.high,2)))]
-        data_mid1=pd.Series(data_mid1,name="values")
+        data_mid1=where(ts_sum(self.high, 20) / 20 < self.high, -1 * delta(self.high, 2), 0)
         return data_mid1
 
     def alpha196(self):
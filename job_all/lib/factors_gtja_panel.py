@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+# 国泰君安因子的面板版本: 输入为 时间×币对 的二维数组(如 dataapi.align_kline_panel / kline_store.read_panel 的返回值)，
+# 一次调用得到全部币对的 (T, N) 因子值，不再逐个币对、逐个因子循环
+# 因子就是 factors_gtja.Alphas 中的因子(继承，不另写一份)，各算子对 DataFrame 按列计算(pandas rolling 与 kernels 中的内核)；
+# 区别只在 RANK: 这里按国泰君安的定义为截面排名(同一时刻各币对之间的百分比名次)，
+# factors_gtja 中单个币对没有截面，RANK 用的是最近 10 根的时间序列名次
+import numpy as np
+import pandas as pd
+try:
+    from . import factors_gtja
+    from . import memo
+except:
+    import factors_gtja
+    import memo
+
+fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+@memo.memoize
+def cs_rank(df):
+    # 截面百分比名次，相同值取平均名次，NaN 不参与排名
+    return df.rank(axis=1, pct=True)
+
+
+class Alphas(factors_gtja.Alphas):
+    def __init__(self, panel, symbols=None, memo_limit=None):
+        """
+        :param panel: dict {字段: 时间×币对 二维数组 或 DataFrame}，需包含 fields 中各字段
+        :param symbols: list 列对应的币对，默认取 panel['symbols']，没有时用列号
+        :param memo_limit: int 算子结果缓存的内存上限(字节)，默认 memo.default_limit，0 表示不缓存
+        """
+        if symbols is None:
+            symbols = panel.get('symbols')
+        frames = {}
+        for field in fields:
+            values = np.asarray(panel[field], dtype=np.float64)
+            if values.ndim != 2:
+                raise TypeError('panel fields must be 2-D (time x symbol) arrays')
+            frames[field] = pd.DataFrame(values, columns=symbols)
+        factors_gtja.Alphas.__init__(self, frames, memo_limit)
+        self.symbols = list(self.close.columns)
+
+    def rank(self, df):
+        return cs_rank(df)
+
+    def compute(self, names=None):
+        """
+        一次计算多个因子，所有因子共用同一个算子结果缓存
+        :param names: list 因子名，如 ['alpha001', 'alpha014']，默认全部
+        :return: dict {因子名: 时间×币对 的 float64 二维数组}
+        """
+        if names is None:
+            names = sorted(name for name in dir(self) if name.startswith('alpha'))
+        result = {}
+        for name in names:
+            value = getattr(self, name)()
+            result[name] = np.broadcast_to(np.asarray(value, dtype=np.float64), self.close.shape).copy()
+        return result
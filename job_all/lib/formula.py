@@ -0,0 +1,683 @@
+# -*- coding: UTF-8 -*-
+# 因子公式引擎
+# 因子写成与 factors.py 注释中相同的公式字符串，如 "-1 * correlation(rank(open), rank(volume), 10)"；
+# 公式解析成运算节点，同一个 Engine 里所有公式共用节点(相同的子表达式只有一个节点)，
+# 计算时按节点创建顺序(即拓扑序)只扫一遍数据:
+#   滑动窗口类算子用 kernels 中的 numba 内核或 pandas 的 rolling(按列向量化)；
+#   相连的逐元素运算合并成一个 numba 生成的循环(没有 numba 时逐个用 numpy 计算)；
+#   中间结果在最后一次使用后放回缓冲池，供后面的节点写入。
+# 输入可以是一个币对的 DataFrame，也可以是 时间×币对 的二维数组(如 dataapi.align_kline_panel 的返回值)
+#
+# 语法:
+#   数字、字段(open high low close volume amount，以及 returns=close-delay(close,1)、vwap=amount/volume、advN=mean(volume,N))
+#   + - * / ^(乘方)  < > <= >= == !=  && ||  条件 ? 值1 : 值2  括号、负号
+#   函数名不区分大小写，窗口等参数必须是数字，见 functions
+# 与因子库中同名函数的含义一致: rank(x, n) 为滑动窗口内的百分比名次(默认 n=10)，ts_rank 为窗口内名次(1 ~ n)，
+#   max/min 为逐元素取大/小(国泰君安的 MAX/MIN)，窗口最大/最小用 ts_max/ts_min；截面名次用 cs_rank
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import kernels
+except:
+    import kernels
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+base_fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 派生字段，解析时展开成公式
+derived_fields = {
+    'returns': 'close - delay(close, 1)',
+    'vwap': 'amount / volume',
+}
+
+# 函数名 -> (算子, 数组参数个数, 数字参数的默认值)
+functions = {
+    'delay': ('delay', 1, (1,)),
+    'delta': ('delta', 1, (1,)),
+    'ts_sum': ('ts_sum', 1, (10,)),
+    'sum': ('ts_sum', 1, (10,)),
+    'count': ('ts_sum', 1, (10,)),
+    'mean': ('mean', 1, (10,)),
+    'stddev': ('stddev', 1, (10,)),
+    'std': ('stddev', 1, (10,)),
+    'correlation': ('correlation', 2, (10,)),
+    'corr': ('correlation', 2, (10,)),
+    'covariance': ('covariance', 2, (10,)),
+    'cov': ('covariance', 2, (10,)),
+    'ts_rank': ('ts_rank', 1, (10,)),
+    'tsrank': ('ts_rank', 1, (10,)),
+    'rank': ('rank', 1, (10,)),
+    'cs_rank': ('cs_rank', 1, ()),
+    'product': ('product', 1, (10,)),
+    'prod': ('product', 1, (10,)),
+    'ts_min': ('ts_min', 1, (10,)),
+    'tsmin': ('ts_min', 1, (10,)),
+    'ts_max': ('ts_max', 1, (10,)),
+    'tsmax': ('ts_max', 1, (10,)),
+    'ts_argmax': ('ts_argmax', 1, (10,)),
+    'ts_argmin': ('ts_argmin', 1, (10,)),
+    'ts_lowday': ('ts_lowday', 1, (10,)),
+    'lowday': ('ts_lowday', 1, (10,)),
+    'ts_highday': ('ts_highday', 1, (10,)),
+    'highday': ('ts_highday', 1, (10,)),
+    'decay_linear': ('decay_linear', 1, (10,)),
+    'decaylinear': ('decay_linear', 1, (10,)),
+    'ts_count': ('ts_count', 2, (10,)),
+    'scale': ('scale', 1, (1,)),
+    'abs': ('abs', 1, ()),
+    'log': ('log', 1, ()),
+    'sign': ('sign', 1, ()),
+    'max': ('max', 2, ()),
+    'min': ('min', 2, ()),
+    'signedpower': ('signedpower', 2, ()),
+}
+# sma(x, n) 为滑动平均(与因子库的 sma 相同)，sma(x, n, m) 为国泰君安的递推 SMA
+
+
+def _where(out, c, x, y):
+    np.copyto(out, y)
+    np.copyto(out, x, where=np.asarray(c) != 0)
+
+
+def _max(out, x, y):
+    # 与因子库 max_s 一致: x > y 时取 x，否则取 y(有 NaN 时取 y)
+    _where(out, np.greater(x, y), x, y)
+
+
+def _min(out, x, y):
+    _where(out, np.less(x, y), x, y)
+
+
+def _signedpower(out, x, a):
+    np.power(np.abs(x), a, out=out)
+    np.multiply(out, np.sign(x), out=out)
+
+
+# 逐元素算子 -> (numpy 计算 f(out, *输入)，生成 numba 循环用的表达式模板)
+elementwise = {
+    'add': (lambda out, x, y: np.add(x, y, out=out), '{0} + {1}'),
+    'sub': (lambda out, x, y: np.subtract(x, y, out=out), '{0} - {1}'),
+    'mul': (lambda out, x, y: np.multiply(x, y, out=out), '{0} * {1}'),
+    'div': (lambda out, x, y: np.true_divide(x, y, out=out), '{0} / {1}'),
+    'pow': (lambda out, x, y: np.power(x, y, out=out), 'np.power({0}, {1})'),
+    'neg': (lambda out, x: np.negative(x, out=out), '-{0}'),
+    'abs': (lambda out, x: np.abs(x, out=out), 'np.abs({0})'),
+    'log': (lambda out, x: np.log(x, out=out), 'np.log({0})'),
+    'sign': (lambda out, x: np.sign(x, out=out), 'np.sign({0})'),
+    'lt': (lambda out, x, y: np.less(x, y, out=out), '1.0 if {0} < {1} else 0.0'),
+    'gt': (lambda out, x, y: np.greater(x, y, out=out), '1.0 if {0} > {1} else 0.0'),
+    'le': (lambda out, x, y: np.less_equal(x, y, out=out), '1.0 if {0} <= {1} else 0.0'),
+    'ge': (lambda out, x, y: np.greater_equal(x, y, out=out), '1.0 if {0} >= {1} else 0.0'),
+    'eq': (lambda out, x, y: np.equal(x, y, out=out), '1.0 if {0} == {1} else 0.0'),
+    'ne': (lambda out, x, y: np.not_equal(x, y, out=out), '1.0 if {0} != {1} else 0.0'),
+    'and': (lambda out, x, y: np.logical_and(np.not_equal(x, 0), np.not_equal(y, 0), out=out),
+            '1.0 if ({0} != 0 and {1} != 0) else 0.0'),
+    'or': (lambda out, x, y: np.logical_or(np.not_equal(x, 0), np.not_equal(y, 0), out=out),
+           '1.0 if ({0} != 0 or {1} != 0) else 0.0'),
+    'where': (_where, '{1} if {0} != 0 else {2}'),
+    'max': (_max, '{0} if {0} > {1} else {1}'),
+    'min': (_min, '{0} if {0} < {1} else {1}'),
+    'signedpower': (_signedpower, 'np.sign({0}) * np.power(np.abs({0}), {1})'),
+}
+
+commutative = set(['add', 'mul', 'eq', 'ne', 'and', 'or'])
+
+
+def _rolling(method):
+    def f(x, window):
+        return getattr(pd.DataFrame(x).rolling(window), method)().values
+    return f
+
+
+def _rolling_pair(method):
+    def f(x, y, window):
+        return getattr(pd.DataFrame(x).rolling(window), method)(pd.DataFrame(y)).values
+    return f
+
+
+def _delay(x, period):
+    out = np.full(x.shape, np.nan)
+    if period < len(x):
+        out[period:] = x[:len(x) - period]
+    return out
+
+
+def _delta(x, period):
+    out = np.full(x.shape, np.nan)
+    if period < len(x):
+        np.subtract(x[period:], x[:len(x) - period], out=out[period:])
+    return out
+
+
+def _product(x, window):
+    out = np.full(x.shape, np.nan)
+    if window <= len(x):
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=0).prod(axis=-1)
+    return out
+
+
+def _ts_count(x, y, window):
+    # 与因子库 ts_count 一致: 窗口内 y >= x 的个数，前 window-1 根为 NaN
+    diff = pd.DataFrame(y - x)
+    diff[diff < 0] = np.nan
+    out = diff.rolling(window).count().values.copy()
+    out[:window - 1] = np.nan
+    return out
+
+
+def _scale(x, k):
+    return x * k / np.nansum(np.abs(x), axis=0)
+
+
+def _cs_rank(x):
+    return pd.DataFrame(x).rank(axis=1, pct=True).values
+
+
+# 滑动窗口等非逐元素算子 -> f(*输入, *数字参数)，返回新数组
+window_ops = {
+    'delay': _delay,
+    'delta': _delta,
+    'ts_sum': _rolling('sum'),
+    'mean': _rolling('mean'),
+    'stddev': _rolling('std'),
+    'ts_min': _rolling('min'),
+    'ts_max': _rolling('max'),
+    'correlation': _rolling_pair('corr'),
+    'covariance': _rolling_pair('cov'),
+    'product': _product,
+    'ts_rank': kernels.ts_rank,
+    'rank': kernels.rank,
+    'ts_argmax': kernels.ts_argmax,
+    'ts_argmin': kernels.ts_argmin,
+    'ts_lowday': kernels.ts_lowday,
+    'ts_highday': kernels.ts_highday,
+    'decay_linear': kernels.decay_linear,
+    'sma': kernels.sma_recursive,
+    'ts_count': _ts_count,
+    'scale': _scale,
+    'cs_rank': _cs_rank,
+}
+
+# 窗口类参数取整
+integer_params = set(['delay', 'delta', 'ts_sum', 'mean', 'stddev', 'ts_min', 'ts_max', 'correlation', 'covariance',
+                      'product', 'ts_rank', 'rank', 'ts_argmax', 'ts_argmin', 'ts_lowday', 'ts_highday',
+                      'decay_linear', 'ts_count'])
+
+_token = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|'
+                    r'(\|\||&&|<=|>=|==|!=|[-+*/^()<>?:,]))')
+_compare = {'<': 'lt', '>': 'gt', '<=': 'le', '>=': 'ge', '==': 'eq', '!=': 'ne'}
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _token.match(text, pos)
+        if m is None:
+            raise TypeError('formula syntax error at %d: %s' % (pos, text))
+        number, name, op = m.groups()
+        if number is not None:
+            tokens.append(('num', float(number)))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('op', op))
+        pos = m.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser(object):
+    # 递归下降，优先级从低到高: ?:  ||  &&  比较  + -  * /  负号  ^
+    def __init__(self, engine, text):
+        self.engine = engine
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def error(self, msg):
+        raise TypeError('%s: %s' % (msg, self.text))
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def take(self, op=None):
+        token = self.tokens[self.pos]
+        if op is not None and token != ('op', op):
+            self.error('expected %s' % op)
+        self.pos += 1
+        return token
+
+    def accept(self, *ops):
+        token = self.peek()
+        if token[0] == 'op' and token[1] in ops:
+            self.pos += 1
+            return token[1]
+        return None
+
+    def parse(self):
+        node = self.ternary()
+        if self.peek()[0] != 'end':
+            self.error('unexpected %s' % (self.peek()[1],))
+        return node
+
+    def ternary(self):
+        cond = self.logical_or()
+        if self.accept('?'):
+            x = self.ternary()
+            self.take(':')
+            y = self.ternary()
+            return self.engine._node('where', (cond, x, y))
+        return cond
+
+    def logical_or(self):
+        node = self.logical_and()
+        while self.accept('||'):
+            node = self.engine._node('or', (node, self.logical_and()))
+        return node
+
+    def logical_and(self):
+        node = self.comparison()
+        while self.accept('&&'):
+            node = self.engine._node('and', (node, self.comparison()))
+        return node
+
+    def comparison(self):
+        node = self.additive()
+        while True:
+            op = self.accept('<', '>', '<=', '>=', '==', '!=')
+            if op is None:
+                return node
+            node = self.engine._node(_compare[op], (node, self.additive()))
+
+    def additive(self):
+        node = self.term()
+        while True:
+            op = self.accept('+', '-')
+            if op is None:
+                return node
+            node = self.engine._node('add' if op == '+' else 'sub', (node, self.term()))
+
+    def term(self):
+        node = self.unary()
+        while True:
+            op = self.accept('*', '/')
+            if op is None:
+                return node
+            node = self.engine._node('mul' if op == '*' else 'div', (node, self.unary()))
+
+    def unary(self):
+        op = self.accept('-', '+')
+        if op == '-':
+            return self.engine._node('neg', (self.unary(),))
+        if op == '+':
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        node = self.primary()
+        if self.accept('^'):
+            node = self.engine._node('pow', (node, self.unary()))
+        return node
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == 'num':
+            return self.engine._const(value)
+        if kind == 'op' and value == '(':
+            node = self.ternary()
+            self.take(')')
+            return node
+        if kind != 'name':
+            self.error('unexpected %s' % ('end' if kind == 'end' else value))
+        name = value.lower()
+        if self.accept('('):
+            args = []
+            if not self.accept(')'):
+                args.append(self.ternary())
+                while self.accept(','):
+                    args.append(self.ternary())
+                self.take(')')
+            return self.call(name, args)
+        return self.engine._field(name)
+
+    def call(self, name, args):
+        if name == 'sma':
+            if len(args) == 3:
+                op, count, defaults = 'sma', 1, ()
+                params = tuple(self.number(a) for a in args[1:])
+                return self.engine._node(op, (args[0],), params)
+            name = 'mean'
+        if name not in functions:
+            self.error('unknown function %s' % name)
+        op, count, defaults = functions[name]
+        if not count <= len(args) <= count + len(defaults):
+            self.error('wrong number of arguments for %s' % name)
+        params = tuple(self.number(a) for a in args[count:]) + defaults[len(args) - count:]
+        if op in integer_params:
+            params = tuple(int(p) for p in params)
+        return self.engine._node(op, tuple(args[:count]), params)
+
+    def number(self, node):
+        if self.engine.ops[node] != 'const':
+            self.error('parameters must be numbers')
+        return self.engine.params[node][0]
+
+
+def _literal(value):
+    if np.isnan(value):
+        return 'np.nan'
+    if np.isinf(value):
+        return 'np.inf' if value > 0 else '(-np.inf)'
+    return repr(float(value))
+
+
+# 生成的循环按源码缓存，结构相同的逐元素表达式只编译一次
+_fused_kernels = {}
+
+
+def _compile(source):
+    kernel = _fused_kernels.get(source)
+    if kernel is None:
+        namespace = {'np': np}
+        exec(source, namespace)
+        kernel = numba.njit(error_model='numpy')(namespace['fused'])
+        _fused_kernels[source] = kernel
+    return kernel
+
+
+class Engine(object):
+    """
+    因子公式集合，计算时所有公式共用节点
+    :param formulas: dict {因子名: 公式}
+    :param fuse: bool 是否把相连的逐元素运算合并成 numba 循环，默认安装了 numba 时合并
+    """
+
+    def __init__(self, formulas=None, fuse=None):
+        # 节点按创建顺序保存，输入总是先于使用它的节点创建
+        self.ops = []
+        self.inputs = []
+        self.params = []
+        self.index = {}
+        self.outputs = {}
+        self.fuse = numba is not None if fuse is None else fuse
+        self.plans = {}
+        if formulas:
+            for name, text in formulas.items():
+                self.add(name, text)
+
+    def _node(self, op, inputs, params=()):
+        inputs = tuple(inputs)
+        if op in elementwise and all(self.ops[i] == 'const' for i in inputs):
+            # 常数运算在解析时算出
+            out = np.empty(())
+            elementwise[op][0](out, *[np.float64(self.params[i][0]) for i in inputs])
+            return self._const(float(out))
+        if op in commutative:
+            inputs = tuple(sorted(inputs))
+        key = (op, inputs, tuple(params))
+        node = self.index.get(key)
+        if node is None:
+            node = len(self.ops)
+            self.ops.append(op)
+            self.inputs.append(inputs)
+            self.params.append(tuple(params))
+            self.index[key] = node
+        return node
+
+    def _const(self, value):
+        return self._node('const', (), (float(value),))
+
+    def _field(self, name):
+        if name in base_fields:
+            return self._node('field', (), (name,))
+        if name in derived_fields:
+            return _Parser(self, derived_fields[name]).parse()
+        m = re.match(r'adv(\d+)$', name)
+        if m:
+            return self._node('mean', (self._field('volume'),), (int(m.group(1)),))
+        raise TypeError('unknown field %s' % name)
+
+    def add(self, name, text):
+        """
+        添加一个因子
+        :param name: string 因子名
+        :param text: string 公式
+        :return: int 公式结果的节点编号
+        """
+        node = _Parser(self, text).parse()
+        self.outputs[name] = node
+        self.plans = {}
+        return node
+
+    def describe(self):
+        """
+        :return: dict 因子数、去重后的节点数、其中滑动窗口类节点数、已编译的合并循环数
+        """
+        return {'formulas': len(self.outputs), 'nodes': len(self.ops),
+                'window_nodes': sum(op in window_ops for op in self.ops),
+                'fused_kernels': len(_fused_kernels)}
+
+    def _plan(self, names):
+        targets = set(self.outputs[name] for name in names)
+        needed = set(targets)
+        for node in range(len(self.ops) - 1, -1, -1):
+            if node in needed:
+                needed.update(self.inputs[node])
+        consumers = {}
+        for node in needed:
+            for i in self.inputs[node]:
+                consumers[i] = consumers.get(i, 0) + 1
+        # 只被一个逐元素节点使用的逐元素中间结果并入使用它的循环，不单独分配数组
+        inline = set()
+        if self.fuse:
+            for node in needed:
+                for i in self.inputs[node]:
+                    if (self.ops[node] in elementwise and self.ops[i] in elementwise
+                            and consumers[i] == 1 and i not in targets):
+                        inline.add(i)
+        steps = []
+        for node in sorted(needed):
+            op = self.ops[node]
+            if op in ('const', 'field') or node in inline:
+                continue
+            if op in window_ops:
+                steps.append(('window', node, self.inputs[node], None))
+            elif self.fuse and any(i in inline for i in self.inputs[node]):
+                leaves, source = self._fused_source(node, inline)
+                steps.append(('fused', node, leaves, source))
+            else:
+                steps.append(('elementwise', node, self.inputs[node], None))
+        # 每一步之后可以释放的中间结果
+        last = {}
+        for k, (_, _, reads, _) in enumerate(steps):
+            for i in reads:
+                last[i] = k
+        release = [[] for _ in steps]
+        for i, k in last.items():
+            if self.ops[i] not in ('const', 'field') and i not in targets:
+                release[k].append(i)
+        fields = sorted(node for node in needed if self.ops[node] == 'field')
+        return steps, release, fields
+
+    def _fused_source(self, root, inline):
+        leaves = []
+        lines = []
+        names = {}
+
+        def visit(node):
+            if node in names:
+                return names[node]
+            if self.ops[node] == 'const':
+                return _literal(self.params[node][0])
+            if node != root and node not in inline:
+                names[node] = 'x%d' % len(leaves)
+                lines.append('            %s = a%d[i, j]' % (names[node], len(leaves)))
+                leaves.append(node)
+                return names[node]
+            args = [visit(i) for i in self.inputs[node]]
+            names[node] = 't%d' % len(lines)
+            lines.append('            %s = %s' % (names[node], elementwise[self.ops[node]][1].format(*args)))
+            return names[node]
+
+        result = visit(root)
+        source = 'def fused(%s, out):\n' % ', '.join('a%d' % k for k in range(len(leaves)))
+        source += '    for i in range(out.shape[0]):\n        for j in range(out.shape[1]):\n'
+        source += '\n'.join(lines) + '\n            out[i, j] = %s\n' % result
+        return tuple(leaves), source
+
+    def compute(self, data, names=None):
+        """
+        一次计算多个因子
+        :param data: DataFrame(一个币对，列为字段) 或 dict {字段: 一维或 时间×币对 二维数组}
+        :param names: list 因子名，默认全部
+        :return: DataFrame 输入时返回 DataFrame(每列一个因子，索引同 data)，否则返回 {因子名: 与字段同形状的数组}
+        """
+        if names is None:
+            names = list(self.outputs)
+        key = tuple(names)
+        if key not in self.plans:
+            self.plans[key] = self._plan(names)
+        steps, release, fields = self.plans[key]
+        if not fields:
+            raise TypeError('formulas use no fields')
+
+        values = dict((node, self.params[node][0]) for node, op in enumerate(self.ops) if op == 'const')
+        for node in fields:
+            name = self.params[node][0]
+            if name not in data:
+                raise TypeError('missing field %s' % name)
+            arr = np.asarray(data[name], dtype=np.float64)
+            one_dim = arr.ndim == 1
+            if one_dim:
+                arr = arr.reshape(-1, 1)
+            values[node] = arr
+            shape = arr.shape
+
+        pool = []
+        for k, (kind, node, reads, source) in enumerate(steps):
+            args = [values[i] for i in reads]
+            if kind == 'window':
+                args = [np.full(shape, a) if np.ndim(a) == 0 else a for a in args]
+                values[node] = np.asarray(window_ops[self.ops[node]](*(args + list(self.params[node]))),
+                                          dtype=np.float64)
+            else:
+                out = pool.pop() if pool else np.empty(shape)
+                if kind == 'fused':
+                    _compile(source)(*(args + [out]))
+                else:
+                    elementwise[self.ops[node]][0](out, *args)
+                values[node] = out
+            for i in release[k]:
+                arr = values.pop(i)
+                if arr.flags.writeable and arr.shape == shape:
+                    pool.append(arr)
+
+        result = {}
+        for name in names:
+            value = values[self.outputs[name]]
+            if np.ndim(value) == 0:
+                value = np.full(shape, value)
+            elif self.ops[self.outputs[name]] == 'field':
+                value = value.copy()
+            result[name] = value
+        if isinstance(data, pd.DataFrame):
+            return pd.DataFrame({name: value[:, 0] for name, value in result.items()}, index=data.index)
+        if one_dim:
+            result = dict((name, value[:, 0]) for name, value in result.items())
+        return result
+
+
+def compute(formulas, data):
+    """
+    计算一组公式，见 Engine.compute
+    :param formulas: dict {因子名: 公式}
+    """
+    return Engine(formulas).compute(data)
+
+
+# WorldQuant Alpha101 中的公式，取自 factors.py 各因子上方的注释(按论文原式，结果与 factors.py 的实现不完全相同，见 alpha101_divergence)
+# 没有国泰君安的公式集: factors_gtja.py 中的因子没有公式注释，其 ts_rank 为倒序名次、RANK 为时间序列名次，
+# 需要时按本模块的语法逐条写成公式再加入 Engine
+alpha101 = {
+    'alpha001': '(rank(Ts_ArgMax(SignedPower(((returns < 0) ? stddev(returns, 20) : close), 2.), 5)) -0.5)',
+    'alpha002': '(-1 * correlation(rank(delta(log(volume), 2)), rank(((close - open) / open)), 6))',
+    'alpha003': '(-1 * correlation(rank(open), rank(volume), 10))',
+    'alpha004': '(-1 * Ts_Rank(rank(low), 9))',
+    'alpha006': '(-1 * correlation(open, volume, 10))',
+    'alpha007': '((adv20 < volume) ? ((-1 * ts_rank(abs(delta(close, 7)), 60)) * sign(delta(close, 7))) : (-1 * 1))',
+    'alpha008': '(-1 * rank(((sum(open, 5) * sum(returns, 5)) - delay((sum(open, 5) * sum(returns, 5)),10))))',
+    'alpha009': '((0 < ts_min(delta(close, 1), 5)) ? delta(close, 1) : ((ts_max(delta(close, 1), 5) < 0) ?delta(close, 1) : (-1 * delta(close, 1))))',
+    'alpha010': 'rank(((0 < ts_min(delta(close, 1), 4)) ? delta(close, 1) : ((ts_max(delta(close, 1), 4) < 0)? delta(close, 1) : (-1 * delta(close, 1)))))',
+    'alpha012': '(sign(delta(volume, 1)) * (-1 * delta(close, 1)))',
+    'alpha013': '(-1 * rank(covariance(rank(close), rank(volume), 5)))',
+    'alpha014': '((-1 * rank(delta(returns, 3))) * correlation(open, volume, 10))',
+    'alpha015': '(-1 * sum(rank(correlation(rank(high), rank(volume), 3)), 3))',
+    'alpha016': '(-1 * rank(covariance(rank(high), rank(volume), 5)))',
+    'alpha017': '(((-1 * rank(ts_rank(close, 10))) * rank(delta(delta(close, 1), 1))) *rank(ts_rank((volume / adv20), 5)))',
+    'alpha018': '(-1 * rank(((stddev(abs((close - open)), 5) + (close - open)) + correlation(close, open,10))))',
+    'alpha019': '((-1 * sign(((close - delay(close, 7)) + delta(close, 7)))) * (1 + rank((1 + sum(returns,250)))))',
+    'alpha020': '(((-1 * rank((open - delay(high, 1)))) * rank((open - delay(close, 1)))) * rank((open -delay(low, 1))))',
+    'alpha021': '((((sum(close, 8) / 8) + stddev(close, 8)) < (sum(close, 2) / 2)) ? (-1 * 1) : (((sum(close,2) / 2) < ((sum(close, 8) / 8) - stddev(close, 8))) ? 1 : (((1 < (volume / adv20)) || ((volume /adv20) == 1)) ? 1 : (-1 * 1))))',
+    'alpha022': '(-1 * (delta(correlation(high, volume, 5), 5) * rank(stddev(close, 20))))',
+    'alpha023': '(((sum(high, 20) / 20) < high) ? (-1 * delta(high, 2)) : 0)',
+    'alpha024': '((((delta((sum(close, 100) / 100), 100) / delay(close, 100)) < 0.05) ||((delta((sum(close, 100) / 100), 100) / delay(close, 100)) == 0.05)) ? (-1 * (close - ts_min(close,100))) : (-1 * delta(close, 3)))',
+    'alpha026': '(-1 * ts_max(correlation(ts_rank(volume, 5), ts_rank(high, 5), 5), 3))',
+    'alpha028': 'scale(((correlation(adv20, low, 5) + ((high + low) / 2)) - close))',
+    'alpha029': '(ts_min(product(rank(rank(scale(log(sum(ts_min(rank(rank((-1 * rank(delta((close - 1),5))))), 2), 1))))), 1), 5) + ts_rank(delay((-1 * returns), 6), 5))',
+    'alpha030': '(((1.0 - rank(((sign((close - delay(close, 1))) + sign((delay(close, 1) - delay(close, 2)))) +sign((delay(close, 2) - delay(close, 3)))))) * sum(volume, 5)) / sum(volume, 20))',
+    'alpha031': '((rank(rank(rank(decay_linear((-1 * rank(rank(delta(close, 10)))), 10)))) + rank((-1 *delta(close, 3)))) + sign(scale(correlation(adv20, low, 12))))',
+    'alpha033': 'rank((-1 * ((1 - (open / close))^1)))',
+    'alpha034': 'rank(((1 - rank((stddev(returns, 2) / stddev(returns, 5)))) + (1 - rank(delta(close, 1)))))',
+    'alpha035': '((Ts_Rank(volume, 32) * (1 - Ts_Rank(((close + high) - low), 16))) * (1 -Ts_Rank(returns, 32)))',
+    'alpha037': '(rank(correlation(delay((open - close), 1), close, 200)) + rank((open - close)))',
+    'alpha038': '((-1 * rank(Ts_Rank(close, 10))) * rank((close / open)))',
+    'alpha039': '((-1 * rank((delta(close, 7) * (1 - rank(decay_linear((volume / adv20), 9)))))) * (1 +rank(sum(returns, 250))))',
+    'alpha040': '((-1 * rank(stddev(high, 10))) * correlation(high, volume, 10))',
+    'alpha043': '(ts_rank((volume / adv20), 20) * ts_rank((-1 * delta(close, 7)), 8))',
+    'alpha044': '(-1 * correlation(high, rank(volume), 5))',
+    'alpha045': '(-1 * ((rank((sum(delay(close, 5), 20) / 20)) * correlation(close, volume, 2)) *rank(correlation(sum(close, 5), sum(close, 20), 2))))',
+    'alpha046': '((0.25 < (((delay(close, 20) - delay(close, 10)) / 10) - ((delay(close, 10) - close) / 10))) ?(-1 * 1) : (((((delay(close, 20) - delay(close, 10)) / 10) - ((delay(close, 10) - close) / 10)) < 0) ? 1 :((-1 * 1) * (close - delay(close, 1)))))',
+    'alpha049': '(((((delay(close, 20) - delay(close, 10)) / 10) - ((delay(close, 10) - close) / 10)) < (-1 *0.1)) ? 1 : ((-1 * 1) * (close - delay(close, 1))))',
+    'alpha051': '(((((delay(close, 20) - delay(close, 10)) / 10) - ((delay(close, 10) - close) / 10)) < (-1 *0.05)) ? 1 : ((-1 * 1) * (close - delay(close, 1))))',
+    'alpha052': '((((-1 * ts_min(low, 5)) + delay(ts_min(low, 5), 5)) * rank(((sum(returns, 240) -sum(returns, 20)) / 220))) * ts_rank(volume, 5))',
+    'alpha053': '(-1 * delta((((close - low) - (high - close)) / (close - low)), 9))',
+    'alpha054': '((-1 * ((low - close) * (open^5))) / ((low - high) * (close^5)))',
+    'alpha055': '(-1 * correlation(rank(((close - ts_min(low, 12)) / (ts_max(high, 12) - ts_min(low,12)))), rank(volume), 6))',
+    'alpha060': '(0 - (1 * ((2 * scale(rank(((((close - low) - (high - close)) / (high - low)) * volume)))) -scale(rank(ts_argmax(close, 10))))))',
+}
+
+# alpha101 与 factors.Alphas 同名因子的差异(两者不是同一个因子值，不能混用)；未列出的因子结果一致
+alpha101_divergence = {
+    'alpha001': 'factors.py 没有减 0.5；且 inner = self.close 后原地修改，同一实例之后计算的因子用的是改过的 close',
+    'alpha002': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha003': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha006': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha007': 'adv20 为 NaN 的前 19 根: factors.py 保留 ts_rank 部分，公式取 -1',
+    'alpha014': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha015': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha018': 'factors.py 把相关系数的 ±inf 和 NaN 替换为 0',
+    'alpha021': 'factors.py 的实现对单个币对的 Series 报错(用到 .columns)，没有可对照的结果',
+    'alpha022': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha023': 'factors.py 的实现对单个币对的 Series 报错(用到 .columns)，没有可对照的结果',
+    'alpha026': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha028': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha029': 'factors.py 用 ts_sum(..., 2) 代替 ts_min(..., 2)，并省略了 sum(..., 1)、product(..., 1)',
+    'alpha031': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha034': 'factors.py 把 stddev(returns, 2) / stddev(returns, 5) 的 ±inf 替换为 1',
+    'alpha038': 'factors.py 用 Ts_Rank(open, 10) 代替 Ts_Rank(close, 10)，且 close / open 的 ±inf 替换为 1',
+    'alpha044': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha045': 'factors.py 把相关系数的 ±inf 替换为 0',
+    'alpha053': 'factors.py 在 close - low 为 0 时把分母替换为 0.0001',
+    'alpha054': 'factors.py 在 low - high 为 0 时把分母中的该项替换为 -0.0001',
+    'alpha055': 'factors.py 在 ts_max(high, 12) - ts_min(low, 12) 为 0 时把分母替换为 0.0001，结果的 ±inf 替换为 0',
+    'alpha060': 'factors.py 在 high - low 为 0 时把分母替换为 0.0001',
+}
@@ -0,0 +1,263 @@
+# -*- coding: UTF-8 -*-
+# 资金费率、持仓量本地存储及按K线时间的 as-of 对齐
+# 目录结构: store_root/交易所/币对/数据源/
+#   funding              dataapi.get_funding_data
+#   position_周期         dataapi.get_position_data
+#   ts.bin               int64 秒级时间戳(升序)
+#   字段名.bin            float64，字段见 sources
+#   meta.json            行数
+# 下载时逐页追加，读取时 memmap；对齐到K线用 searchsorted 一次完成，不做逐行 merge
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import dataapi
+except:
+    import dataapi
+
+store_root = os.path.join(os.path.expanduser('~'), 'alldata', 'funding_store')
+
+ts_dtype = np.dtype('<i8')
+value_dtype = np.dtype('<f8')
+
+# 数据源: 需要保存的数值字段
+sources = {
+    'funding': ['fundingRate', 'fundingRateDaily'],
+    'position': ['openinterest', 'fundingrate', 'predictedrate', 'dayturnover', 'totalvolume'],
+}
+
+
+def _source_name(source, period=None):
+    if source not in sources:
+        raise TypeError('unknow source: %s' % source)
+    if source == 'position':
+        if period is None:
+            raise TypeError('position data needs period')
+        return 'position_' + period
+    return source
+
+
+def series_dir(exchange, symbol, source, period=None, root=None):
+    if root is None:
+        root = store_root
+    return os.path.join(root, exchange, symbol, _source_name(source, period))
+
+
+def read_meta(path):
+    fpath = os.path.join(path, 'meta.json')
+    if not os.path.exists(fpath):
+        return {'rows': 0}
+    with open(fpath, 'r') as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    fpath = os.path.join(path, 'meta.json')
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, fpath)
+
+
+def to_seconds(values):
+    """
+    接口返回的时间转为10位时间戳，兼容10位、13位数字和 '2018-08-02T04:00:00.000Z' 之类的字符串(按UTC)
+    :return: np.ndarray int64
+    """
+    values = pd.Series(values)
+    num = pd.to_numeric(values, errors='coerce')
+    if num.notnull().all():
+        num = num.values.astype(np.int64)
+        return np.where(num > 10 ** 11, num // 1000, num)
+    dt = pd.to_datetime(values, utc=True)
+    return (dt - pd.Timestamp('1970-01-01', tz='UTC')).dt.total_seconds().values.astype(np.int64)
+
+
+def _frame_to_columns(df, fields):
+    cols = {'ts': to_seconds(df['timestamp'])}
+    for name in fields:
+        cols[name] = pd.to_numeric(df[name], errors='coerce').values.astype(value_dtype)
+    order = np.argsort(cols['ts'], kind='mergesort')
+    return {name: arr[order] for name, arr in cols.items()}
+
+
+def _column_path(path, name):
+    return os.path.join(path, name + '.bin')
+
+
+def open_columns(path, fields, meta=None):
+    """
+    以只读 memmap 打开全部列
+    :return: dict {列名: np.ndarray}，ts 为时间戳列
+    """
+    if meta is None:
+        meta = read_meta(path)
+    rows = meta['rows']
+    cols = {}
+    for name in ['ts'] + fields:
+        dtype = ts_dtype if name == 'ts' else value_dtype
+        if rows == 0:
+            cols[name] = np.empty(0, dtype=dtype)
+        else:
+            cols[name] = np.memmap(_column_path(path, name), dtype=dtype, mode='r', shape=(rows,))
+    return cols
+
+
+def append_columns(path, cols, fields):
+    """
+    追加到存储末尾，先截断到已提交的行数，落盘后再更新 meta.json
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = read_meta(path)
+    rows = meta['rows']
+    for name in ['ts'] + fields:
+        dtype = ts_dtype if name == 'ts' else value_dtype
+        fpath = _column_path(path, name)
+        with open(fpath, 'ab') as f:
+            pass
+        with open(fpath, 'r+b') as f:
+            f.truncate(rows * dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(cols[name], dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    write_meta(path, {'rows': rows + int(len(cols['ts']))})
+
+
+def _fetch_page(exchange, symbol, source, period, start):
+    if source == 'funding':
+        return dataapi.get_funding_data(exchange, symbol, start)
+    return dataapi.get_position_data(exchange, symbol, period, start)
+
+
+def collect(exchange, symbol, source, start_day, end_day=None, period=None, root=None, max_pages=None):
+    """
+    逐页下载并追加到本地存储，已有数据时从最后一条之后继续
+    :param exchange: string 交易所名称(大写)，如 BITMEX
+    :param symbol: string 币对名称(小写)，如 xbtusd
+    :param source: string 'funding' 或 'position'
+    :param start_day: string 本地无数据时的起始时间 '2018-08-02' 或 '2018-08-02 16:26'
+    :param end_day: string 结束时间，默认下载到最新
+    :param period: string position 数据的周期，如 '1h'
+    :param max_pages: int 最多下载的页数，默认不限
+    :return: int 本次写入的行数
+    """
+    fields = sources[source]
+    path = series_dir(exchange, symbol, source, period, root)
+    meta = read_meta(path)
+    if meta['rows'] > 0:
+        last = int(open_columns(path, fields, meta)['ts'][-1])
+    else:
+        last = dataapi.str_time_to_timestamp(start_day, 10) - 1
+    end = int(time.time()) if end_day is None else dataapi.str_time_to_timestamp(end_day, 10)
+
+    written = 0
+    pages = 0
+    while last < end and (max_pages is None or pages < max_pages):
+        errcode, errmsg, df = _fetch_page(exchange, symbol, source, period, last + 1)
+        if errcode != 0:
+            raise IOError(errmsg)
+        pages += 1
+        if df is None or df.empty:
+            break
+        cols = _frame_to_columns(df, fields)
+        keep = (cols['ts'] > last) & (cols['ts'] <= end)
+        # 同一时间戳只保留一条
+        keep[1:] &= np.diff(cols['ts']) > 0
+        cols = {name: arr[keep] for name, arr in cols.items()}
+        if len(cols['ts']) == 0:
+            break
+        append_columns(path, cols, fields)
+        written += len(cols['ts'])
+        last = int(cols['ts'][-1])
+    return written
+
+
+def load(exchange, symbol, source, period=None, start=None, end=None, root=None):
+    """
+    从本地存储读取 [start, end] 内的数据，不访问网络
+    :param start: int 10位时间戳
+    :param end: int 10位时间戳
+    :return: dict {列名: memmap 视图}
+    """
+    fields = sources[source]
+    cols = open_columns(series_dir(exchange, symbol, source, period, root), fields)
+    lo = 0 if start is None else int(np.searchsorted(cols['ts'], start, side='left'))
+    hi = len(cols['ts']) if end is None else int(np.searchsorted(cols['ts'], end, side='right'))
+    return {name: arr[lo:hi] for name, arr in cols.items()}
+
+
+def asof_index(ts, tickid, tolerance=None):
+    """
+    每个 tickid 对应的 ts 中最近一条不晚于它的数据的位置
+    :param ts: np.ndarray 升序时间戳
+    :param tickid: np.ndarray K线时间戳
+    :param tolerance: int 最大允许的时间差(秒)，超过视为无数据
+    :return: np.ndarray int64，无数据处为 -1
+    """
+    tickid = np.asarray(tickid, dtype=np.int64)
+    pos = np.searchsorted(ts, tickid, side='right') - 1
+    if tolerance is not None and len(ts):
+        stale = tickid - np.asarray(ts)[np.clip(pos, 0, None)] > tolerance
+        pos = np.where(stale, -1, pos)
+    return pos
+
+
+def asof_join(cols, tickid, fields=None, tolerance=None, lag=0):
+    """
+    把资金费率/持仓量按时间 as-of 对齐到K线上: 每根K线取 tickid + lag 时刻之前(含)最近的一条
+    :param cols: dict load 返回的列数据
+    :param tickid: np.ndarray K线时间戳(K线开始时间)
+    :param fields: list 需要的字段，默认全部
+    :param tolerance: int 最大允许的时间差(秒)
+    :param lag: int 对齐时间相对 tickid 的偏移(秒)，如传入K线周期则按K线结束时间对齐
+    :return: dict {字段: np.ndarray}，无数据处为 NaN
+    """
+    if fields is None:
+        fields = [name for name in cols if name != 'ts']
+    tickid = np.asarray(tickid, dtype=np.int64)
+    pos = asof_index(cols['ts'], tickid + lag, tolerance)
+    missing = pos < 0
+    out = {}
+    for name in fields:
+        values = np.asarray(cols[name])
+        if len(values) == 0:
+            out[name] = np.full(len(tickid), np.nan)
+            continue
+        joined = values[np.clip(pos, 0, None)]
+        joined[missing] = np.nan
+        out[name] = joined
+    return out
+
+
+def join_kline(df, exchange, symbol, source, period=None, fields=None, tolerance=None, lag=0, root=None):
+    """
+    给K线 DataFrame 加上资金费率/持仓量列(原地添加并返回)
+    :param df: DataFrame 含 tickid 列
+    :return: DataFrame
+    """
+    tickid = df['tickid'].values.astype(np.int64)
+    start = None
+    if len(tickid) and tolerance is not None:
+        start = int(tickid.min()) + lag - tolerance
+    cols = load(exchange, symbol, source, period, start, None, root)
+    for name, values in asof_join(cols, tickid, fields, tolerance, lag).items():
+        df[name] = values
+    return df
+
+
+def join_panel(panel, exchange, source, field, period=None, tolerance=None, lag=0, root=None):
+    """
+    把一个字段对齐到多币对面板(kline_store.read_panel / dataapi.align_kline_panel 的返回值)上
+    :return: np.ndarray (T, N)，列与 panel['symbols'] 对应
+    """
+    tickid = panel['tickid']
+    out = np.full((len(tickid), len(panel['symbols'])), np.nan)
+    for j, symbol in enumerate(panel['symbols']):
+        cols = load(exchange, symbol, source, period, root=root)
+        out[:, j] = asof_join(cols, tickid, [field], tolerance, lag)[field]
+    return out
@@ -0,0 +1,205 @@
+# -*- coding: UTF-8 -*-
+# 合约连续序列
+# 各个交割合约的K线只下载一次，存在 kline_store 中(交易所/合约/周期)
+# 拼接后的连续序列(未复权价格)也存在 kline_store 中(交易所/连续序列名/周期)，同目录下 roll.json 记录换月日历:
+#   segments: [{'contract': 合约, 'start': 该段第一根K线的 tickid, 'gap': 换月时 新合约close - 旧合约close}]
+# 读取时按换月日历把每一段加上其后所有换月价差之和(后复权)，新K线或新换月只需追加，不用整体重建
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from . import dataapi
+    from . import kline_store
+except:
+    import dataapi
+    import kline_store
+
+price_columns = ['open', 'high', 'low', 'close']
+
+
+def future_fetch(exchange, symbol, period, start_day, end_day):
+    # symboltype=1: 只取该合约自身的数据；长区间按段并发下载
+    return dataapi.get_exsymbol_future_kline(exchange, symbol, period, start_day, end_day, 0, 1,
+                                             workers=dataapi.pool_size, datefmt=None)
+
+
+def read_calendar(path):
+    fpath = os.path.join(path, 'roll.json')
+    if not os.path.exists(fpath):
+        return None
+    with open(fpath, 'r') as f:
+        return json.load(f)
+
+
+def write_calendar(path, cal):
+    os.makedirs(path, exist_ok=True)
+    fpath = os.path.join(path, 'roll.json')
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cal, f)
+    os.replace(tmp, fpath)
+
+
+def _day_str(tickid):
+    return time.strftime('%Y-%m-%d', time.localtime(tickid))
+
+
+def find_roll(cal, cur, nxt, after):
+    """
+    在 tickid > after 的范围内找换月时点
+    :param cal: dict 换月日历，roll 为 'volume' 时取新合约成交量首次超过旧合约的K线，
+                roll 为 'days' 时取旧合约到期前 days 天之后的第一根共同K线
+    :param cur: dict 当前合约的列数据
+    :param nxt: dict 下一合约的列数据
+    :return: int 换月K线在 cur/nxt 中共同的 tickid，没有换月返回 None
+    """
+    common, ic, jn = np.intersect1d(cur['tickid'], nxt['tickid'], assume_unique=True, return_indices=True)
+    sel = common > after
+    common, ic, jn = common[sel], ic[sel], jn[sel]
+    if len(common) == 0:
+        return None
+    if cal['roll'] == 'volume':
+        hit = np.flatnonzero(np.asarray(nxt['volume'])[jn] > np.asarray(cur['volume'])[ic])
+    else:
+        expiry = cal['expiries'].get(cur['contract'])
+        if expiry is None:
+            # 未给到期日时，下一合约在旧合约最后一根K线之后仍有数据才视为旧合约已到期
+            if nxt['tickid'][-1] <= cur['tickid'][-1]:
+                return None
+            expiry = int(cur['tickid'][-1])
+        hit = np.flatnonzero(common >= expiry - cal['days'] * 86400)
+    if len(hit) == 0:
+        return None
+    return int(common[hit[0]])
+
+
+def _read_contract(exchange, contract, period, start, end_day, root):
+    cols = kline_store.read_kline(exchange, contract, period, _day_str(start), end_day, root,
+                                  fetch=future_fetch, as_frame=False)
+    cols['contract'] = contract
+    return cols
+
+
+def _tail(cols, after, before=None):
+    tickid = cols['tickid']
+    lo = int(np.searchsorted(tickid, after, side='right'))
+    hi = len(tickid) if before is None else int(np.searchsorted(tickid, before, side='left'))
+    return {name: np.asarray(cols[name][lo:hi]) for name in kline_store.columns}
+
+
+def _extend(exchange, name, period, cal, end_day, root):
+    # 把当前合约在已拼接部分之后的K线追加进去，遇到换月就记录价差并切换到下一合约
+    path = kline_store.series_dir(exchange, name, period, root)
+    meta = kline_store.read_meta(path)
+    if meta['rows'] > 0:
+        last = int(kline_store.open_columns(path, meta)['tickid'][-1])
+    else:
+        last = cal['segments'][-1]['start'] - 1
+    added = 0
+    while True:
+        seg = cal['segments'][-1]
+        k = cal['contracts'].index(seg['contract'])
+        cur = _read_contract(exchange, seg['contract'], period, seg['start'], end_day, root)
+        roll_at = None
+        if k + 1 < len(cal['contracts']):
+            nxt = _read_contract(exchange, cal['contracts'][k + 1], period, seg['start'], end_day, root)
+            roll_at = find_roll(cal, cur, nxt, last)
+        part = _tail(cur, last, roll_at)
+        if len(part['tickid']):
+            kline_store.append_columns(path, part, [[cal['segments'][0]['start'], int(part['tickid'][-1])]])
+            last = int(part['tickid'][-1])
+            added += len(part['tickid'])
+        if roll_at is None:
+            break
+        i = int(np.searchsorted(cur['tickid'], roll_at))
+        j = int(np.searchsorted(nxt['tickid'], roll_at))
+        gap = float(nxt['close'][j]) - float(cur['close'][i])
+        cal['segments'].append({'contract': nxt['contract'], 'start': roll_at, 'gap': gap})
+        write_calendar(path, cal)
+        last = roll_at - 1
+    write_calendar(path, cal)
+    return added
+
+
+def build_continuous(exchange, name, contracts, period, start_day, end_day, roll='volume', days=3,
+                     expiries=None, root=None):
+    """
+    由交割合约拼接连续序列，已存在时先删除重建
+    :param exchange: string 交易所名称
+    :param name: string 连续序列名，如 'xbt_cont'
+    :param contracts: list 按到期先后排列的合约，如 ['xbtm18', 'xbtu18', 'xbtz18']
+    :param period: string 时间级别
+    :param start_day: string 起始日期 YYYY-MM-DD
+    :param end_day: string 结束日期 YYYY-MM-DD
+    :param roll: string 'volume': 新合约成交量超过旧合约时换月；'days': 旧合约到期前 days 天换月
+    :param days: int roll 为 'days' 时提前的天数
+    :param expiries: dict {合约: 到期时间戳}，roll 为 'days' 时使用，缺省时以合约最后一根K线为到期
+    :return: dict 换月日历
+    """
+    path = kline_store.series_dir(exchange, name, period, root)
+    empty = {col: np.empty(0, dtype=kline_store.tickid_dtype if col == 'tickid' else kline_store.value_dtype)
+             for col in kline_store.columns}
+    kline_store.write_columns(path, empty, [])
+    start = kline_store.to_tickid(start_day)
+    first = _read_contract(exchange, contracts[0], period, start, end_day, root)
+    if len(first['tickid']):
+        start = max(start, int(first['tickid'][0]))
+    cal = {'contracts': list(contracts), 'roll': roll, 'days': days, 'expiries': expiries or {},
+           'segments': [{'contract': contracts[0], 'start': start, 'gap': 0.0}]}
+    write_calendar(path, cal)
+    _extend(exchange, name, period, cal, end_day, root)
+    return cal
+
+
+def update_continuous(exchange, name, period, end_day=None, contracts=None, root=None):
+    """
+    增量更新连续序列：只追加已拼接部分之后的新K线，发生换月时追加一条换月记录
+    :param end_day: string 结束日期，默认明天(即更新到最新)
+    :param contracts: list 新上市的合约，追加到合约列表末尾
+    :return: int 新追加的K线数
+    """
+    path = kline_store.series_dir(exchange, name, period, root)
+    cal = read_calendar(path)
+    if cal is None:
+        raise IOError('no continuous series: %s' % path)
+    for c in contracts or []:
+        if c not in cal['contracts']:
+            cal['contracts'].append(c)
+    if end_day is None:
+        end_day = _day_str(int(time.time()) + 86400)
+    return _extend(exchange, name, period, cal, end_day, root)
+
+
+def roll_offsets(cal):
+    """
+    每一段的后复权偏移量：该段之后所有换月价差之和，最后一段为0
+    :return: (starts, offsets) 两个数组
+    """
+    starts = np.array([seg['start'] for seg in cal['segments']], dtype=np.int64)
+    gaps = np.array([seg['gap'] for seg in cal['segments']], dtype=np.float64)
+    offsets = np.concatenate([np.cumsum(gaps[::-1])[::-1][1:], [0.0]])
+    return starts, offsets
+
+
+def load_continuous(exchange, name, period, start=None, end=None, adjust=True, root=None):
+    """
+    读取连续序列
+    :param adjust: bool True 返回后复权价格，False 返回未复权的拼接价格
+    :return: DataFrame，另有 contract 列为每根K线所属合约
+    """
+    path = kline_store.series_dir(exchange, name, period, root)
+    cal = read_calendar(path)
+    if cal is None:
+        raise IOError('no continuous series: %s' % path)
+    df = kline_store.load_kline(exchange, name, period, start, end, root)
+    starts, offsets = roll_offsets(cal)
+    seg = np.searchsorted(starts, df['tickid'].values, side='right') - 1
+    seg = np.clip(seg, 0, len(starts) - 1)
+    if adjust:
+        for col in price_columns:
+            df[col] = df[col].values + offsets[seg]
+    df['contract'] = np.array([s['contract'] for s in cal['segments']])[seg]
+    return df
@@ -0,0 +1,262 @@
+# -*- coding: UTF-8 -*-
+# 因子库(factors / factors_gtja / factors_gtja_two)用的滑动窗口计算内核，numba 编译
+# 输入为 1 维(时间)或 2 维(时间 x 币对)数组，也可以直接传 Series / DataFrame，返回同样类型
+# NaN 的处理与 df.rolling(window).apply(...) 一致: 不足 window 根或窗口内有 NaN 时结果为 NaN
+# 没有安装 numba 时退化为普通 python 循环，结果相同但很慢
+# 不使用 numba 的磁盘缓存(cache=True): 本模块会以 lib.kernels 和 kernels 两个名字被导入，
+# 以一个名字写入的缓存在另一个名字下加载时会找不到模块；每个进程首次调用时编译
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+def _to_array(df):
+    arr = np.asarray(df, dtype=np.float64)
+    if arr.ndim not in (1, 2):
+        raise TypeError('kernels only support 1-D or 2-D input')
+    return arr
+
+
+def _like(df, out):
+    # 按输入的类型包装结果
+    if isinstance(df, pd.DataFrame):
+        return pd.DataFrame(out, index=df.index, columns=df.columns)
+    if isinstance(df, pd.Series):
+        return pd.Series(out, index=df.index, name=df.name)
+    return out
+
+
+def _apply_columns(kernel, df, *args):
+    # kernel(x, *args, out) 对 1 维数组计算，2 维输入逐列调用
+    arr = _to_array(df)
+    out = np.empty_like(arr)
+    if arr.ndim == 1:
+        kernel(arr, *args, out)
+    else:
+        for j in range(arr.shape[1]):
+            col = np.empty(arr.shape[0])
+            kernel(np.ascontiguousarray(arr[:, j]), *args, col)
+            out[:, j] = col
+    return _like(df, out)
+
+
+def _apply(kernel, df, window, *args):
+    window = int(window)
+    if window < 1:
+        raise TypeError('window must be >= 1')
+    return _apply_columns(kernel, df, window, *args)
+
+
+@njit
+def _rolling_rank_1d(x, window, pct, out):
+    # 窗口内最后一个值的平均名次: 比它小的个数 + (与它相等的个数 + 1) / 2，与 rankdata / rank(pct=True) 一致
+    n = len(x)
+    nan_count = 0
+    for i in range(n):
+        if np.isnan(x[i]):
+            nan_count += 1
+        if i >= window and np.isnan(x[i - window]):
+            nan_count -= 1
+        if i < window - 1 or nan_count > 0:
+            out[i] = np.nan
+            continue
+        v = x[i]
+        less = 0
+        equal = 0
+        for j in range(i - window + 1, i + 1):
+            if x[j] < v:
+                less += 1
+            elif x[j] == v:
+                equal += 1
+        r = less + (equal + 1) / 2.0
+        if pct:
+            out[i] = r / window
+        else:
+            out[i] = r
+
+
+def ts_rank(df, window=10):
+    """
+    滑动窗口内最后一个值的名次(1 ~ window，相同值取平均名次)
+    等价于 df.rolling(window).apply(lambda na: rankdata(na)[-1])
+    :param df: np.ndarray / Series / DataFrame，1 维或 2 维(时间 x 币对)
+    :param window: int 窗口长度
+    :return: 与 df 同类型
+    """
+    return _apply(_rolling_rank_1d, df, window, False)
+
+
+def rank(df, window=10):
+    """
+    滑动窗口内最后一个值的百分比名次(名次 / window)
+    等价于 df.rolling(window).apply(lambda s: s.rank(pct=True).values[-1], raw=False)
+    """
+    return _apply(_rolling_rank_1d, df, window, True)
+
+
+@njit
+def _rolling_argext_1d(x, window, want_max, out):
+    # 单调队列: 队列中为窗口内可能成为极值的位置，对应的值单调(求最大时递减)，队首即窗口极值
+    # 新值只弹出严格更差的队尾，相等的保留较早的位置，与 np.argmax / np.argmin 取第一个极值一致
+    n = len(x)
+    dq = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    nan_count = 0
+    for i in range(n):
+        if i >= window and np.isnan(x[i - window]):
+            nan_count -= 1
+        while head < tail and dq[head] <= i - window:
+            head += 1
+        v = x[i]
+        if np.isnan(v):
+            nan_count += 1
+        else:
+            if want_max:
+                while head < tail and x[dq[tail - 1]] < v:
+                    tail -= 1
+            else:
+                while head < tail and x[dq[tail - 1]] > v:
+                    tail -= 1
+            dq[tail] = i
+            tail += 1
+        if i < window - 1 or nan_count > 0:
+            out[i] = np.nan
+        else:
+            # 窗口内的位置(0 ~ window-1)
+            out[i] = dq[head] - (i - window + 1)
+
+
+def rolling_argmax(df, window=10):
+    """
+    滑动窗口内最大值的位置(0 ~ window-1，有多个最大值时取最早的)
+    等价于 df.rolling(window).apply(np.argmax)
+    """
+    return _apply(_rolling_argext_1d, df, window, True)
+
+
+def rolling_argmin(df, window=10):
+    """
+    滑动窗口内最小值的位置，等价于 df.rolling(window).apply(np.argmin)
+    """
+    return _apply(_rolling_argext_1d, df, window, False)
+
+
+def ts_argmax(df, window=10):
+    return rolling_argmax(df, window) + 1
+
+
+def ts_argmin(df, window=10):
+    return rolling_argmin(df, window) + 1
+
+
+def ts_highday(df, window=10):
+    """
+    最大值距今的K线数，等价于 (window-1)-df.rolling(window).apply(np.argmax)
+    """
+    return (int(window) - 1) - rolling_argmax(df, window)
+
+
+def ts_lowday(df, window=10):
+    """
+    最小值距今的K线数，等价于 (window-1)-df.rolling(window).apply(np.argmin)
+    """
+    return (int(window) - 1) - rolling_argmin(df, window)
+
+
+def _fill_nan(arr):
+    # 在副本上按列依次向前填充、向后填充、填0
+    filled = pd.DataFrame(arr.reshape(len(arr), -1)).ffill().bfill().fillna(0).values
+    return filled.reshape(arr.shape)
+
+
+def decay_linear(df, period=10):
+    """
+    线性衰减加权移动平均: 窗口内最新一根权重为 period，往前依次减1，最早一根为1，权重和归一
+    用 sliding_window_view 与权重向量一次相乘完成，2 维输入逐列计算
+    有 NaN 时在副本上按列 ffill、bfill、填0 后计算，不修改传入的数据
+    :param df: np.ndarray / Series / DataFrame，1 维或 2 维(时间 x 币对)
+    :param period: int 窗口长度
+    :return: 与 df 同类型，前 period-1 个为 NaN
+    """
+    period = int(period)
+    if period < 1:
+        raise TypeError('period must be >= 1')
+    arr = _to_array(df)
+    if np.isnan(arr).any():
+        arr = _fill_nan(arr)
+    weights = np.arange(1, period + 1, dtype=np.float64)
+    weights /= weights.sum()
+    out = np.full(arr.shape, np.nan)
+    if len(arr) >= period:
+        if arr.ndim == 1:
+            out[period - 1:] = np.lib.stride_tricks.sliding_window_view(arr, period) @ weights
+        else:
+            # 逐列相乘，与逐个币对计算的结果逐位一致(整块相乘时求和顺序不同，相等的值可能出现末位差异)
+            for j in range(arr.shape[1]):
+                col = np.ascontiguousarray(arr[:, j])
+                out[period - 1:, j] = np.lib.stride_tricks.sliding_window_view(col, period) @ weights
+    return _like(df, out)
+
+
+@njit
+def _sma_1d(x, n, m, out):
+    # Y[t] = (m * X[t] + (n - m) * Y[t-1]) / n
+    # 遇到 NaN 时输出 NaN 并重新开始: 之后第一个有效值作为初值(该位置输出 NaN)，从下一根开始递推
+    a = (n - m) / n
+    b = m / n
+    state = np.nan
+    for i in range(len(x)):
+        v = x[i]
+        if np.isnan(v):
+            state = np.nan
+            out[i] = np.nan
+        elif np.isnan(state):
+            state = v
+            out[i] = np.nan
+        else:
+            state = a * state + b * v
+            out[i] = state
+
+
+def sma_recursive(df, n, m):
+    """
+    国泰君安因子中的 SMA(A, n, m): Y[t] = (m * A[t] + (n - m) * Y[t-1]) / n
+    以第一个有效值为初值(该位置为 NaN)，遇到 NaN 后从下一个有效值重新开始递推
+    :param df: np.ndarray / Series / DataFrame，1 维或 2 维(时间 x 币对)
+    :param n: int
+    :param m: int 0 < m <= n
+    :return: 与 df 同类型
+    """
+    if not 0 < m <= n:
+        raise TypeError('sma needs 0 < m <= n')
+    return _apply_columns(_sma_1d, df, float(n), float(m))
+
+
+def where(cond, x, y):
+    """
+    逐元素选择，等价于 [x if c else y for c, x, y in zip(cond, x, y)](按位置对应)
+    条件中与 NaN 比较得到 False 时取 y，与列表推导的结果一致
+    :param cond: bool 数组 / Series / DataFrame
+    :param x: 数组 / Series / DataFrame / 标量
+    :param y: 数组 / Series / DataFrame / 标量
+    :return: 参数中有 Series / DataFrame 时按第一个这样的参数包装(索引、列与它相同)，否则返回 np.ndarray
+    """
+    like = None
+    for v in (cond, x, y):
+        if isinstance(v, (pd.Series, pd.DataFrame)):
+            like = v
+            break
+    out = np.where(np.asarray(cond, dtype=bool), np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    if like is None:
+        return out
+    if isinstance(like, pd.DataFrame):
+        return pd.DataFrame(out, index=like.index, columns=like.columns)
+    return pd.Series(out, index=like.index)
@@ -0,0 +1,533 @@
+# -*- coding: UTF-8 -*-
+# 本地K线列式存储
+# 目录结构: store_root/交易所/币对/周期/
+#   tickid.bin  int64 秒级时间戳(升序)
+#   open.bin high.bin low.bin close.bin volume.bin amount.bin  float64
+#   meta.json   行数、已下载的时间区间
+#   gaps.json   缺口索引: K线间隔(step)及每段缺失区间，写入/追加时增量计算，见 gap_index
+# 每列是一个裸的小端二进制文件，读取时用 np.memmap 映射，任意时间段都是零拷贝切片
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import dataapi
+except:
+    import dataapi
+
+store_root = os.path.join(os.path.expanduser('~'), 'alldata', 'kline_store')
+
+tickid_dtype = np.dtype('<i8')
+value_dtype = np.dtype('<f8')
+value_columns = ['open', 'high', 'low', 'close', 'volume', 'amount']
+columns = ['tickid'] + value_columns
+
+
+def series_dir(exchange, symbol, period, root=None):
+    """
+    某个 交易所/币对/周期 的存储目录
+    :param exchange: string 交易所名称
+    :param symbol: string 币对名称
+    :param period: string 时间级别
+    :param root: string 存储根目录，默认 store_root
+    :return: string
+    """
+    if root is None:
+        root = store_root
+    symbol = symbol.replace('/', '_')
+    return os.path.join(root, exchange, symbol, period)
+
+
+def _column_path(path, name):
+    return os.path.join(path, name + '.bin')
+
+
+def _dtype(name):
+    return tickid_dtype if name == 'tickid' else value_dtype
+
+
+def read_meta(path):
+    """
+    读取存储目录的元信息，目录不存在时返回空元信息
+    :param path: string series_dir 返回的目录
+    :return: dict {'rows': int, 'covered': [[start, end], ...]}
+    """
+    fpath = os.path.join(path, 'meta.json')
+    if not os.path.exists(fpath):
+        return {'rows': 0, 'covered': []}
+    with open(fpath, 'r') as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    # 先写临时文件再 rename，保证 meta.json 要么是旧的要么是新的
+    fpath = os.path.join(path, 'meta.json')
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, fpath)
+
+
+def to_tickid(t):
+    """
+    时间转为10位时间戳(本地时间)
+    :param t: int 时间戳 或 string 'YYYY-MM-DD' / 'YYYY-MM-DD HH:MM' / 'YYYY-MM-DD HH:MM:SS'
+    :return: int
+    """
+    if isinstance(t, (int, np.integer)):
+        return int(t) // 1000 if t > 10 ** 11 else int(t)
+    for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H', '%Y-%m-%d']:
+        try:
+            return int(time.mktime(time.strptime(t, fmt)))
+        except ValueError:
+            continue
+    raise TypeError('invalid time: %s' % t)
+
+
+def tickid_to_datetime(tickid):
+    """
+    tickid 数组一次性转为本地时间 datetime64，与 dataapi.timestamp2str 的结果一致
+    :param tickid: array-like int64
+    :return: pd.DatetimeIndex
+    """
+    return dataapi.tickid2datetime(tickid)
+
+
+def default_fetch(exchange, symbol, period, start_day, end_day):
+    # 存储只需要 tickid，不生成 date 列；长区间按段并发下载
+    return dataapi.get_exsymbol_kline(exchange, symbol, period, start_day, end_day, workers=dataapi.pool_size,
+                                      datefmt=None)
+
+
+def _merge_covered(covered, start, end):
+    # 合并已下载区间，重叠或相接的区间并为一个
+    intervals = sorted(covered + [[start, end]])
+    merged = [list(intervals[0])]
+    for s, e in intervals[1:]:
+        if s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+def is_covered(meta, start, end):
+    """
+    [start, end] 是否已完整下载过
+    """
+    for s, e in meta['covered']:
+        if s <= start and end <= e:
+            return True
+    return False
+
+
+def open_columns(path, meta=None):
+    """
+    以只读 memmap 打开全部列
+    :param path: string series_dir 返回的目录
+    :param meta: dict 元信息，默认从目录读取
+    :return: dict {列名: np.ndarray}，长度均为 meta['rows']
+    """
+    if meta is None:
+        meta = read_meta(path)
+    rows = meta['rows']
+    cols = {}
+    for name in columns:
+        dtype = _dtype(name)
+        if rows == 0:
+            cols[name] = np.empty(0, dtype=dtype)
+        else:
+            cols[name] = np.memmap(_column_path(path, name), dtype=dtype, mode='r', shape=(rows,))
+    return cols
+
+
+def _frame_to_columns(df):
+    cols = {'tickid': df['tickid'].values.astype(tickid_dtype)}
+    for name in value_columns:
+        if name in df.columns:
+            cols[name] = pd.to_numeric(df[name], errors='coerce').values.astype(value_dtype)
+        else:
+            cols[name] = np.full(len(df), np.nan, dtype=value_dtype)
+    return cols
+
+
+def write_columns(path, cols, covered):
+    """
+    整体重写一个存储目录
+    :param path: string series_dir 返回的目录
+    :param cols: dict {列名: 数组}，tickid 升序且不重复
+    :param covered: list 已下载区间
+    """
+    os.makedirs(path, exist_ok=True)
+    # 先把行数置0，重写过程中断时读到的是空数据而不是错位数据
+    write_meta(path, {'rows': 0, 'covered': []})
+    for name in columns:
+        tmp = _column_path(path, name) + '.tmp'
+        np.ascontiguousarray(cols[name], dtype=_dtype(name)).tofile(tmp)
+        os.replace(tmp, _column_path(path, name))
+    write_meta(path, {'rows': int(len(cols['tickid'])), 'covered': covered})
+    write_gaps(path, int(len(cols['tickid'])), *compute_gaps(np.asarray(cols['tickid'])))
+
+
+def append_columns(path, cols, covered):
+    """
+    在存储末尾追加数据，cols 的 tickid 必须都大于已有的最后一条
+    先把各列文件截断到 meta 记录的行数(丢弃上次中断留下的残余)，追加写入并落盘，
+    最后更新 meta.json；meta 更新之前读者看到的始终是追加前的完整数据
+    :param path: string series_dir 返回的目录
+    :param cols: dict {列名: 数组}
+    :param covered: list 追加后的已下载区间
+    """
+    meta = read_meta(path)
+    rows = meta['rows']
+    prev_last = int(open_columns(path, meta)['tickid'][-1]) if rows > 0 else None
+    for name in columns:
+        dtype = _dtype(name)
+        with open(_column_path(path, name), 'r+b') as f:
+            f.truncate(rows * dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(cols[name], dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    write_meta(path, {'rows': rows + int(len(cols['tickid'])), 'covered': covered})
+    _append_gaps(path, rows, prev_last, np.asarray(cols['tickid']))
+
+
+def _infer_step(tickid):
+    # 取相邻K线间隔的众数作为周期，不依赖周期名称的写法(1h/60min/4hour...)
+    diffs = np.diff(tickid)
+    diffs = diffs[diffs > 0]
+    if len(diffs) == 0:
+        return None
+    values, counts = np.unique(diffs, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+def compute_gaps(tickid, step=None, first_row=0):
+    """
+    一次向量化扫描找出缺口
+    :param tickid: np.ndarray 升序时间戳
+    :param step: int K线间隔(秒)，默认取间隔的众数
+    :param first_row: int tickid[0] 在整个序列中的行号，增量计算时使用
+    :return: (step, gaps) gaps 为 int64 二维数组 (k, 3)，每行 [缺口之后第一根K线的行号, 缺失起点, 缺失终点(不含)]
+    """
+    tickid = np.asarray(tickid, dtype=np.int64)
+    if step is None:
+        step = _infer_step(tickid)
+    if step is None:
+        return None, np.empty((0, 3), dtype=np.int64)
+    idx = np.flatnonzero(np.diff(tickid) != step) + 1
+    gaps = np.empty((len(idx), 3), dtype=np.int64)
+    gaps[:, 0] = idx + first_row
+    gaps[:, 1] = tickid[idx - 1] + step
+    gaps[:, 2] = tickid[idx]
+    return step, gaps
+
+
+def read_gaps(path):
+    fpath = os.path.join(path, 'gaps.json')
+    if not os.path.exists(fpath):
+        return None
+    with open(fpath, 'r') as f:
+        index = json.load(f)
+    index['gaps'] = np.array(index['gaps'], dtype=np.int64).reshape(-1, 3)
+    return index
+
+
+def write_gaps(path, rows, step, gaps):
+    fpath = os.path.join(path, 'gaps.json')
+    tmp = fpath + '.tmp'
+    missing = int(((gaps[:, 2] - gaps[:, 1]) // step).clip(0).sum()) if step else 0
+    with open(tmp, 'w') as f:
+        json.dump({'rows': rows, 'step': step, 'missing': missing, 'gaps': gaps.tolist()}, f)
+    os.replace(tmp, fpath)
+
+
+def _append_gaps(path, rows, prev_last, tickid):
+    # 追加数据时只扫描新增部分(连同原来的最后一条)，把新缺口接到原索引后面
+    index = read_gaps(path)
+    if prev_last is None or index is None or index['rows'] != rows or index['step'] is None:
+        write_gaps(path, rows + len(tickid), *compute_gaps(open_columns(path)['tickid']))
+        return
+    step, gaps = compute_gaps(np.concatenate([[prev_last], tickid]), index['step'], rows - 1)
+    write_gaps(path, rows + len(tickid), step, np.concatenate([index['gaps'], gaps]))
+
+
+def gap_index(exchange, symbol, period, root=None):
+    """
+    读取缺口索引，与数据行数不符(如旧版本写入的存储)时重新计算
+    :return: dict {'rows': 行数, 'step': K线间隔(秒), 'missing': 缺失的K线总数, 'gaps': (k, 3) 数组，见 compute_gaps}
+    """
+    path = series_dir(exchange, symbol, period, root)
+    meta = read_meta(path)
+    index = read_gaps(path)
+    if index is None or index['rows'] != meta['rows']:
+        if meta['rows'] == 0:
+            return {'rows': 0, 'step': None, 'missing': 0, 'gaps': np.empty((0, 3), dtype=np.int64)}
+        write_gaps(path, meta['rows'], *compute_gaps(open_columns(path, meta)['tickid']))
+        index = read_gaps(path)
+    return index
+
+
+def check_gaps(exchange, symbol, period, start=None, end=None, root=None):
+    """
+    [start, end] 内的缺口，只在缺口索引上二分查找，不扫描K线
+    :return: (step, gaps) gaps 同 compute_gaps
+    """
+    index = gap_index(exchange, symbol, period, root)
+    gaps = index['gaps']
+    lo = 0 if start is None else int(np.searchsorted(gaps[:, 2], to_tickid(start), side='right'))
+    hi = len(gaps) if end is None else int(np.searchsorted(gaps[:, 1], to_tickid(end), side='right'))
+    return index['step'], gaps[lo:hi]
+
+
+def fill_grid(cols, step):
+    """
+    把K线重建到完整的时间网格上，缺失的K线用前一根的收盘价补齐(开高低收都等于该收盘价，成交量、成交额为0)
+    全部为数组运算，不逐行插入
+    :param cols: dict 列数据，tickid 升序
+    :param step: int K线间隔(秒)
+    :return: dict 补齐后的列数据，另有 filled 列标记补出来的K线
+    """
+    tickid = np.asarray(cols['tickid'], dtype=np.int64)
+    if len(tickid) == 0 or not step:
+        out = {name: np.asarray(arr) for name, arr in cols.items()}
+        out['filled'] = np.zeros(len(tickid), dtype=bool)
+        return out
+    grid = np.arange(tickid[0], tickid[-1] + 1, step, dtype=np.int64)
+    # 没有落在网格上的K线(时间未对齐)也保留
+    grid = np.union1d(grid, tickid)
+    pos = np.searchsorted(tickid, grid, side='right') - 1
+    filled = tickid[pos] != grid
+    out = {'tickid': grid}
+    close = np.asarray(cols['close'])[pos]
+    for name in value_columns:
+        values = np.asarray(cols[name])[pos]
+        if name in ('open', 'high', 'low'):
+            values[filled] = close[filled]
+        elif name in ('volume', 'amount'):
+            values[filled] = 0
+        out[name] = values
+    out['filled'] = filled
+    return out
+
+
+def merge_columns(old, new):
+    """
+    合并两段数据，按 tickid 去重(重复时取 new)并升序
+    """
+    tickid = np.concatenate([new['tickid'], old['tickid']])
+    # np.unique 返回每个值首次出现的位置，new 在前所以重复时保留 new
+    tickid, idx = np.unique(tickid, return_index=True)
+    merged = {'tickid': tickid}
+    for name in value_columns:
+        merged[name] = np.concatenate([new[name], old[name]])[idx]
+    return merged
+
+
+def slice_columns(cols, start=None, end=None):
+    """
+    按 [start, end] 时间戳切片，返回 memmap 视图，不复制数据
+    """
+    tickid = cols['tickid']
+    lo = 0 if start is None else int(np.searchsorted(tickid, start, side='left'))
+    hi = len(tickid) if end is None else int(np.searchsorted(tickid, end, side='right'))
+    return {name: arr[lo:hi] for name, arr in cols.items()}
+
+
+def columns_to_frame(cols):
+    """
+    列数据转为 DataFrame，date 列为 datetime64
+    """
+    names = columns + ['filled'] if 'filled' in cols else columns
+    df = pd.DataFrame({name: np.asarray(cols[name]) for name in names}, columns=names)
+    df.insert(0, 'date', tickid_to_datetime(cols['tickid']))
+    return df
+
+
+def save_kline(exchange, symbol, period, df, start=None, end=None, root=None):
+    """
+    把下载到的K线并入本地存储
+    :param df: DataFrame 至少包含 tickid 及 open/high/low/close/volume 列
+    :param start: int 本次下载请求的起始时间戳，默认取数据第一条
+    :param end: int 本次下载请求的结束时间戳，默认取数据最后一条
+    """
+    path = series_dir(exchange, symbol, period, root)
+    meta = read_meta(path)
+    new = _frame_to_columns(df)
+    if start is None:
+        start = int(new['tickid'].min())
+    if end is None:
+        end = int(new['tickid'].max())
+    if meta['rows'] > 0:
+        new = merge_columns(open_columns(path, meta), new)
+    else:
+        order = np.argsort(new['tickid'], kind='mergesort')
+        new = {name: arr[order] for name, arr in new.items()}
+    write_columns(path, new, _merge_covered(meta['covered'], start, end))
+
+
+def _cap_now(end):
+    # 已下载区间不能超过当前时间，否则之后新出的K线会被当成已下载
+    return min(end, int(time.time()))
+
+
+def _day_str(tickid):
+    return time.strftime('%Y-%m-%d', time.localtime(tickid))
+
+
+def _bar_equal(cols, i, new, j):
+    for name in ['open', 'high', 'low', 'close']:
+        a = float(cols[name][i])
+        b = float(new[name][j])
+        if not (np.isclose(a, b) or (np.isnan(a) and np.isnan(b))):
+            return False
+    return True
+
+
+def sync_kline(exchange, symbol, period, end_day=None, root=None, fetch=None):
+    """
+    增量同步：只下载本地最后一条K线之后的数据并追加到存储末尾
+    从最后一条K线所在的日期开始请求，请求结果中与最后一条 tickid 相同的那根K线用来校验，
+    不一致说明本地数据与服务端不符，抛出 IOError，需要删除该目录后重新下载
+    :param exchange: string 交易所名称
+    :param symbol: string 币对名称
+    :param period: string 时间级别
+    :param end_day: string 结束日期 YYYY-MM-DD，默认明天(即同步到最新)
+    :param root: string 存储根目录
+    :param fetch: 下载函数，同 read_kline
+    :return: int 新追加的行数
+    """
+    if fetch is None:
+        fetch = default_fetch
+    if end_day is None:
+        end_day = _day_str(int(time.time()) + 86400)
+    path = series_dir(exchange, symbol, period, root)
+    meta = read_meta(path)
+    if meta['rows'] == 0:
+        raise IOError('no local data: %s' % path)
+    cols = open_columns(path, meta)
+    last = int(cols['tickid'][-1])
+    end = to_tickid(end_day)
+    if last >= end:
+        return 0
+
+    errcode, errmsg, df = fetch(exchange, symbol, period, _day_str(last), end_day)
+    if errcode != 0:
+        raise IOError(errmsg)
+    new = _frame_to_columns(df)
+    order = np.argsort(new['tickid'], kind='mergesort')
+    new = {name: arr[order] for name, arr in new.items()}
+
+    pos = np.searchsorted(new['tickid'], last)
+    if pos < len(new['tickid']) and new['tickid'][pos] == last:
+        if not _bar_equal(cols, -1, new, pos):
+            raise IOError('overlap bar mismatch at tickid %d: %s' % (last, path))
+        pos += 1
+    tail = {name: arr[pos:] for name, arr in new.items()}
+    # 去掉请求结果内部重复的 tickid
+    keep = np.ones(len(tail['tickid']), dtype=bool)
+    keep[1:] = np.diff(tail['tickid']) > 0
+    tail = {name: arr[keep] for name, arr in tail.items()}
+
+    covered = _merge_covered(meta['covered'], last, _cap_now(end))
+    append_columns(path, tail, covered)
+    return int(len(tail['tickid']))
+
+
+def sync_all(exchange, symbols, periods, end_day=None, root=None, fetch=None):
+    """
+    批量增量同步，用于每日定时更新
+    :param symbols: list 币对列表
+    :param periods: list 时间级别列表
+    :return: dict {(symbol, period): 新追加的行数}，出错的为异常信息
+    """
+    result = {}
+    for period in periods:
+        for symbol in symbols:
+            try:
+                result[(symbol, period)] = sync_kline(exchange, symbol, period, end_day, root, fetch)
+            except IOError as e:
+                print(e)
+                result[(symbol, period)] = str(e)
+    return result
+
+
+def load_kline(exchange, symbol, period, start=None, end=None, root=None, as_frame=True, fill=False):
+    """
+    从本地存储读取K线，不访问网络
+    :param start: int或string 起始时间(包含)
+    :param end: int或string 结束时间(包含)
+    :param as_frame: bool True 返回 DataFrame；False 返回 {列名: memmap 视图}
+    :param fill: bool True 时按缺口索引的K线间隔补齐缺失的K线，见 fill_grid；没有缺口时不复制数据
+    :return: DataFrame 或 dict
+    """
+    path = series_dir(exchange, symbol, period, root)
+    cols = open_columns(path)
+    cols = slice_columns(cols, None if start is None else to_tickid(start),
+                         None if end is None else to_tickid(end))
+    if fill:
+        step, gaps = check_gaps(exchange, symbol, period, start, end, root)
+        if len(gaps):
+            cols = fill_grid(cols, step)
+    if as_frame:
+        return columns_to_frame(cols)
+    return cols
+
+
+def read_kline(exchange, symbol, period, start_day, end_day, root=None, fetch=None, as_frame=True, fill=False):
+    """
+    读取K线：本地存储已覆盖该时间段时直接读取，否则先下载该时间段并入存储
+    :param exchange: string 交易所名称
+    :param symbol: string 币对名称
+    :param period: string 时间级别
+    :param start_day: string 起始时间
+    :param end_day: string 结束时间
+    :param root: string 存储根目录
+    :param fetch: 下载函数 fetch(exchange, symbol, period, start_day, end_day) -> (errcode, errmsg, df)，
+                  默认 default_fetch
+    :param as_frame: bool 同 load_kline
+    :param fill: bool 同 load_kline
+    :return: DataFrame 或 dict
+    """
+    if fetch is None:
+        fetch = default_fetch
+    start = to_tickid(start_day)
+    end = to_tickid(end_day)
+    path = series_dir(exchange, symbol, period, root)
+    meta = read_meta(path)
+    if not is_covered(meta, start, end) and meta['rows'] > 0 \
+            and is_covered(meta, start, int(open_columns(path, meta)['tickid'][-1])):
+        # 起点已在本地，只缺尾部：增量同步
+        sync_kline(exchange, symbol, period, end_day, root, fetch)
+        meta = read_meta(path)
+    if not is_covered(meta, start, end):
+        errcode, errmsg, df = fetch(exchange, symbol, period, start_day, end_day)
+        if errcode != 0:
+            raise IOError(errmsg)
+        # 空结果也记录为已下载，避免每次都重新请求
+        if df is not None:
+            save_kline(exchange, symbol, period, df, start, _cap_now(end), root)
+    return load_kline(exchange, symbol, period, start, end, root, as_frame, fill)
+
+
+def read_panel(exchange, symbols, period, start_day, end_day, root=None, fetch=None, fields=None, workers=8):
+    """
+    读取多个币对的K线并对齐成 时间×币对 的二维数组，本地缺失的部分并发下载
+    :param symbols: list 币对名称列表
+    :param fields: list 需要的字段，默认 dataapi.panel_fields
+    :param workers: int 并发读取的币对数
+    :return: dict 见 dataapi.align_kline_panel，另有 symbols 为列对应的币对
+    """
+    def read_one(symbol):
+        return read_kline(exchange, symbol, period, start_day, end_day, root, fetch, as_frame=False)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(read_one, symbols))
+    panel = dataapi.align_kline_panel(frames, fields)
+    panel['symbols'] = list(symbols)
+    return panel
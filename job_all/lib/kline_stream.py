@@ -0,0 +1,345 @@
+# -*- coding: UTF-8 -*-
+# 实盘K线推送订阅(asyncio)
+# 对一组币对保持 websocket K线推送连接，K线走完时写入内存并立即调用注册的回调，
+# 不再按固定时间轮询 get_realtime_data
+#   BIAN   组合流 <symbol>@kline_<period>，推送中 k.x 为 true 表示该K线已走完
+#   HUOBI  订阅 market.<symbol>.kline.<period>，推送为 gzip 压缩的 json，没有走完标记，
+#          收到下一根K线的第一条推送时认为上一根已走完；服务器的 ping 需要回复 pong
+# 断线后按 reconnect_delay 退避重连并重新订阅
+# StandInServer 是本地的替身推送服务器，按交易所的推送格式回放本地存储的K线，用于离线测试
+# 依赖 websockets 包(可选依赖，只有使用本模块时才需要)
+import asyncio
+import gzip
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+try:
+    from . import bar_cache
+    from . import dataapi
+    from . import kline_store
+except:
+    import bar_cache
+    import dataapi
+    import kline_store
+
+stream_urls = {
+    'BIAN': 'wss://stream.binance.com:9443/stream?streams=%s',
+    'HUOBI': 'wss://api.huobi.pro/ws',
+}
+huobi_periods = {'1m': '1min', '5m': '5min', '15m': '15min', '30m': '30min',
+                 '1h': '60min', '4h': '4hour', '1d': '1day', '1w': '1week'}
+# 重连等待: (初始秒数, 最大秒数)，每次失败翻倍
+reconnect_delay = (1.0, 30.0)
+
+cols = ["exchange", "period", "symbol", "tickid", "open", "high", "low", "close", "volume", "amount"]
+
+
+def _require():
+    if websockets is None:
+        raise ImportError('kline_stream needs the websockets package: pip install websockets')
+
+
+def _request_path(ws):
+    # websockets 新版本为 ws.request.path，旧版本为 ws.path
+    request = getattr(ws, 'request', None)
+    if request is not None:
+        return request.path
+    return ws.path
+
+
+def binance_url(symbols, period, base=None):
+    """
+    币安组合流地址
+    :param base: string 含一个 %s 的地址模板，默认 stream_urls['BIAN']
+    """
+    streams = '/'.join('%s@kline_%s' % (symbol.lower(), period) for symbol in symbols)
+    return (base or stream_urls['BIAN']) % streams
+
+
+def parse_binance(raw):
+    """
+    :return: (symbol, tickid, values, closed) 或 None(非K线消息)
+    """
+    msg = json.loads(raw)
+    data = msg.get('data', msg)
+    if data.get('e') != 'kline':
+        return None
+    k = data['k']
+    values = [float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']), float(k['q'])]
+    return k['s'].lower(), int(k['t']) // 1000, values, bool(k['x'])
+
+
+def parse_huobi(msg):
+    """
+    :param msg: dict 解压后的推送
+    :return: (symbol, tickid, values, None) 或 None(非K线消息)，None 表示没有走完标记
+    """
+    ch = msg.get('ch', '')
+    tick = msg.get('tick')
+    if tick is None or '.kline.' not in ch:
+        return None
+    # volume 为成交量(amount)，amount 为成交额(vol)，与 data_clean_huobi 一致
+    values = [float(tick['open']), float(tick['high']), float(tick['low']), float(tick['close']),
+              float(tick['amount']), float(tick['vol'])]
+    return ch.split('.')[1], int(tick['id']), values, None
+
+
+class KlineStream(object):
+    """
+    一组币对同一周期的K线推送订阅
+    :param exchange: string BIAN 或 HUOBI
+    :param symbols: list 币对(小写)
+    :param period: string 时间级别
+    :param url: string 推送地址，默认 stream_urls，测试时指向 StandInServer
+    :param cache: bar_cache.BarCache 走完的K线同时写入该缓存，使 bar_cache.get_bars 直接取到最新K线
+    :param capacity: int 每个币对在内存中保留的K线数
+    """
+
+    def __init__(self, exchange, symbols, period, url=None, cache=None, capacity=64):
+        _require()
+        if exchange not in stream_urls:
+            raise TypeError('unknow exchange: %s' % exchange)
+        self.exchange = exchange
+        self.symbols = [symbol.lower() for symbol in symbols]
+        self.period = period
+        self.seconds = dataapi.period_to_seconds(period)
+        if exchange == 'BIAN':
+            self.url = binance_url(self.symbols, period, url)
+        else:
+            self.url = url or stream_urls[exchange]
+        self.cache = cache
+        self.buffers = dict((symbol, bar_cache.RingBuffer(capacity)) for symbol in self.symbols)
+        # 每个币对正在走的K线 (tickid, values)
+        self.pending = {}
+        self.callbacks = []
+        self.connected = asyncio.Event()
+        self.stopped = False
+        self.ws = None
+
+    def on_bar(self, callback):
+        """
+        注册K线走完时的回调，可作为装饰器使用
+        :param callback: 普通函数或 async 函数，参数为一行K线 list，列同 cols(与 get_realtime_data 的返回一致)
+        """
+        self.callbacks.append(callback)
+        return callback
+
+    def bars(self, symbol, count=None):
+        """
+        内存中已走完的最近 count 根K线
+        :return: DataFrame 列为 tickid 及 bar_cache.fields
+        """
+        tickid, values = self.buffers[symbol.lower()].tail(count)
+        df = pd.DataFrame(values, columns=bar_cache.fields)
+        df.insert(0, 'tickid', tickid)
+        return df
+
+    async def _emit(self, symbol, tickid, values):
+        buf = self.buffers[symbol]
+        last = buf.last_tickid()
+        if last is not None and tickid <= last:
+            return
+        buf.extend(np.array([tickid], dtype=np.int64), np.array([values], dtype=np.float64))
+        if self.cache is not None:
+            self.cache.push(self.exchange, symbol, self.period, tickid, values)
+        row = [self.exchange, self.period, symbol, tickid] + list(values)
+        for callback in self.callbacks:
+            try:
+                result = callback(row)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print('kline_stream callback error: %s' % e)
+
+    async def update(self, symbol, tickid, values, closed=None):
+        """
+        处理一条推送
+        :param closed: bool 推送自带的走完标记，None 表示没有(由下一根K线的到来判断)
+        """
+        if symbol not in self.buffers:
+            return
+        pending = self.pending.get(symbol)
+        if pending is not None and tickid > pending[0]:
+            # 收到了下一根，上一根已走完(币安漏掉 x=true 的推送时也由此补上)
+            await self._emit(symbol, pending[0], pending[1])
+        if closed:
+            self.pending.pop(symbol, None)
+            await self._emit(symbol, tickid, values)
+        else:
+            self.pending[symbol] = (tickid, values)
+
+    async def _subscribe(self, ws):
+        if self.exchange == 'HUOBI':
+            for i, symbol in enumerate(self.symbols):
+                await ws.send(json.dumps({'sub': 'market.%s.kline.%s' % (symbol, huobi_periods[self.period]),
+                                          'id': str(i)}))
+
+    async def _handle(self, ws, raw):
+        if self.exchange == 'BIAN':
+            parsed = parse_binance(raw)
+        else:
+            msg = json.loads(gzip.decompress(raw).decode('utf-8'))
+            if 'ping' in msg:
+                await ws.send(json.dumps({'pong': msg['ping']}))
+                return
+            parsed = parse_huobi(msg)
+        if parsed is not None:
+            await self.update(*parsed)
+
+    async def run(self):
+        """
+        保持连接直到 stop()，断线自动重连
+        """
+        delay = reconnect_delay[0]
+        while not self.stopped:
+            try:
+                async with websockets.connect(self.url, max_size=None) as ws:
+                    self.ws = ws
+                    await self._subscribe(ws)
+                    self.connected.set()
+                    delay = reconnect_delay[0]
+                    async for raw in ws:
+                        await self._handle(ws, raw)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                if self.stopped:
+                    break
+                print('kline_stream %s disconnected: %s, retry in %.1fs' % (self.exchange, e, delay))
+            finally:
+                self.ws = None
+                self.connected.clear()
+            if self.stopped:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, reconnect_delay[1])
+
+    async def stop(self):
+        self.stopped = True
+        if self.ws is not None:
+            await self.ws.close()
+
+
+def subscribe(exchange, symbols, period, callback=None, url=None, cache=None):
+    """
+    创建订阅并在当前事件循环中开始运行
+    :return: (KlineStream, asyncio.Task)
+    """
+    stream = KlineStream(exchange, symbols, period, url=url, cache=cache)
+    if callback is not None:
+        stream.on_bar(callback)
+    return stream, asyncio.ensure_future(stream.run())
+
+
+class StandInServer(object):
+    """
+    本地替身推送服务器，按 BIAN / HUOBI 的推送格式回放K线
+    每根K线先推送 updates 条未走完的推送(close 从 open 逐步变为最终值)，再推送最终值
+    (BIAN 带 x=true；HUOBI 没有走完标记，由下一根K线的推送表示)，每根K线之间等待 interval 秒
+    :param exchange: string BIAN 或 HUOBI
+    :param bars: dict {币对: 列数据 dict}，列数据含 tickid 及 open/high/low/close/volume/amount，如 kline_store.load_kline(as_frame=False)
+    :param period: string 时间级别
+    """
+
+    def __init__(self, exchange, bars, period, interval=0.0, updates=1):
+        _require()
+        self.exchange = exchange
+        self.bars = dict((symbol.lower(), cols) for symbol, cols in bars.items())
+        self.period = period
+        self.seconds = dataapi.period_to_seconds(period)
+        self.interval = interval
+        self.updates = updates
+        self.server = None
+        self.port = None
+
+    def _binance_msg(self, symbol, tickid, values, closed):
+        o, h, l, c, v, q = values
+        k = {'t': tickid * 1000, 'T': (tickid + self.seconds) * 1000 - 1, 's': symbol.upper(), 'i': self.period,
+             'o': repr(o), 'h': repr(h), 'l': repr(l), 'c': repr(c), 'v': repr(v), 'q': repr(q), 'x': closed}
+        data = {'e': 'kline', 'E': int(time.time() * 1000), 's': symbol.upper(), 'k': k}
+        return json.dumps({'stream': '%s@kline_%s' % (symbol, self.period), 'data': data})
+
+    def _huobi_msg(self, symbol, tickid, values):
+        o, h, l, c, v, q = values
+        msg = {'ch': 'market.%s.kline.%s' % (symbol, huobi_periods[self.period]), 'ts': int(time.time() * 1000),
+               'tick': {'id': tickid, 'open': o, 'high': h, 'low': l, 'close': c, 'amount': v, 'vol': q, 'count': 0}}
+        return gzip.compress(json.dumps(msg).encode('utf-8'))
+
+    def _messages(self, symbol, i):
+        cols = self.bars[symbol]
+        tickid = int(cols['tickid'][i])
+        final = [float(cols[name][i]) for name in bar_cache.fields]
+        for j in range(self.updates):
+            part = list(final)
+            w = float(j + 1) / (self.updates + 1)
+            part[3] = final[0] + (final[3] - final[0]) * w
+            part[1] = max(final[0], part[3])
+            part[2] = min(final[0], part[3])
+            part[4], part[5] = final[4] * w, final[5] * w
+            yield tickid, part, False
+        yield tickid, final, True
+
+    async def _stream_symbol(self, ws, symbol):
+        if symbol not in self.bars:
+            return
+        for i in range(len(self.bars[symbol]['tickid'])):
+            for tickid, values, closed in self._messages(symbol, i):
+                if self.exchange == 'BIAN':
+                    await ws.send(self._binance_msg(symbol, tickid, values, closed))
+                else:
+                    await ws.send(self._huobi_msg(symbol, tickid, values))
+            if self.interval > 0:
+                await asyncio.sleep(self.interval)
+
+    async def _handler(self, ws, path=None):
+        tasks = []
+        try:
+            if self.exchange == 'BIAN':
+                query = _request_path(ws).split('streams=', 1)[-1]
+                for stream in query.split('/'):
+                    tasks.append(asyncio.ensure_future(self._stream_symbol(ws, stream.split('@')[0])))
+                await ws.wait_closed()
+            else:
+                async for raw in ws:
+                    msg = json.loads(raw)
+                    if 'sub' in msg:
+                        await ws.send(gzip.compress(json.dumps(
+                            {'id': msg.get('id'), 'status': 'ok', 'subbed': msg['sub']}).encode('utf-8')))
+                        tasks.append(asyncio.ensure_future(self._stream_symbol(ws, msg['sub'].split('.')[1])))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        :param port: int 0 表示随机端口
+        :return: string 推送地址，BIAN 为含 %s 的模板(传给 KlineStream 的 url)
+        """
+        self.server = await websockets.serve(self._handler, host, port)
+        self.port = list(self.server.sockets)[0].getsockname()[1]
+        if self.exchange == 'BIAN':
+            return 'ws://%s:%d/stream?streams=%%s' % (host, self.port)
+        return 'ws://%s:%d/ws' % (host, self.port)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+def serve_store(exchange, symbols, period, start=None, end=None, root=None, interval=0.0, updates=1):
+    """
+    用 kline_store 中保存的K线创建替身服务器(未启动，需 await server.start())
+    """
+    bars = {}
+    for symbol in symbols:
+        bars[symbol] = kline_store.load_kline(exchange, symbol, period, start, end, root=root, as_frame=False)
+    return StandInServer(exchange, bars, period, interval, updates)
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+# 因子计算的公共子表达式缓存
+# 同一个 Alphas 实例的各个因子会反复计算 delay(close)、sma(volume,20)、ts_sum(returns,N) 等相同的中间结果。
+# 用 memoize 装饰算子函数，用 attach 装饰 Alphas 类: 因子方法执行期间算子的结果存入该实例的 MemoCache，
+# 键为 (算子名, 各个 Series/DataFrame/数组参数的 id, 其余参数的值)。
+# 命中时返回同一个对象，它再作为上一层算子的输入时 id 不变，所以嵌套的调用也能逐层命中。
+# 缓存项保留参数对象的引用，保证其 id 在缓存项存在期间不会被复用；超过内存上限时按最近最少使用淘汰。
+# 缓存的结果会被多个因子共用，因子中不能原地修改算子的返回值(需要修改时先 .copy())
+import collections
+import functools
+import inspect
+import threading
+
+import numpy as np
+import pandas as pd
+
+# 每个实例的缓存上限(字节)
+default_limit = 256 * 1024 * 1024
+
+_local = threading.local()
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=False))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    return 0
+
+
+class MemoCache(object):
+    """
+    算子结果缓存，按结果占用的内存做 LRU 淘汰
+    :param limit: int 内存上限(字节)，默认 default_limit；0 表示只统计不缓存
+    """
+
+    def __init__(self, limit=None):
+        self.limit = default_limit if limit is None else limit
+        # key -> (参数引用, 结果, 字节数)
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.evictions = 0
+        # 算子名 -> [调用次数, 命中次数]
+        self.stats = {}
+
+    def lookup(self, name, key):
+        stat = self.stats.setdefault(name, [0, 0])
+        stat[0] += 1
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        stat[1] += 1
+        self.entries.move_to_end(key)
+        return True, entry[1]
+
+    def store(self, key, refs, value):
+        size = _nbytes(value)
+        if size > self.limit:
+            return
+        self.entries[key] = (refs, value, size)
+        self.nbytes += size
+        while self.nbytes > self.limit:
+            _, (_, _, old) = self.entries.popitem(last=False)
+            self.nbytes -= old
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def report(self):
+        """
+        各算子的调用次数、命中次数和命中率，最后一行为合计
+        :return: DataFrame
+        """
+        rows = [[name, calls, hits] for name, (calls, hits) in self.stats.items()]
+        df = pd.DataFrame(rows, columns=['op', 'calls', 'hits'])
+        df = df.sort_values('calls', ascending=False)
+        total = pd.DataFrame([['total', df['calls'].sum(), df['hits'].sum()]], columns=['op', 'calls', 'hits'])
+        df = pd.concat([df, total], ignore_index=True)
+        df['hit_rate'] = df['hits'] / df['calls'].where(df['calls'] > 0)
+        df['cached_mb'] = np.nan
+        df.loc[df.index[-1], 'cached_mb'] = self.nbytes / 1024.0 / 1024.0
+        return df.set_index('op')
+
+
+def active():
+    return getattr(_local, 'cache', None)
+
+
+class use(object):
+    """
+    在当前线程中启用缓存: with memo.use(cache): ...
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        self.previous = active()
+        _local.cache = self.cache
+        return self.cache
+
+    def __exit__(self, *exc):
+        _local.cache = self.previous
+
+
+def _make_key(name, arguments):
+    key = [name]
+    refs = []
+    for arg, value in arguments.items():
+        if isinstance(value, (pd.Series, pd.DataFrame, np.ndarray)):
+            key.append((arg, id(value)))
+            refs.append(value)
+        else:
+            try:
+                hash(value)
+            except TypeError:
+                return None, None
+            key.append((arg, value))
+    return tuple(key), refs
+
+
+def memoize(func):
+    """
+    算子装饰器: 有启用的缓存时按参数查找/保存结果，否则直接计算
+    默认参数会补全后参与键，delay(x) 与 delay(x, 1) 命中同一项
+    """
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = active()
+        if cache is None:
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key, refs = _make_key(name, bound.arguments)
+        if key is None:
+            return func(*args, **kwargs)
+        hit, value = cache.lookup(name, key)
+        if hit:
+            return value
+        value = func(*args, **kwargs)
+        cache.store(key, refs, value)
+        return value
+    return wrapper
+
+
+def _cached_method(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'memo', None)
+        if cache is None:
+            return method(self, *args, **kwargs)
+        with use(cache):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def attach(cls, prefix='alpha'):
+    """
+    类装饰器: 名称以 prefix 开头的方法执行时启用实例的 memo 属性(MemoCache)
+    """
+    for name, value in list(vars(cls).items()):
+        if name.startswith(prefix) and callable(value):
+            setattr(cls, name, _cached_method(value))
+    return cls
@@ -5,7 +5,7 @@ import sys
 sys.path.append('..')
 from backtest import *
 import matplotlib.pyplot as plt
-from lib import dataapi
+from lib import kline_store
 import pandas as pd
 import numpy as np
 
@@ -16,28 +16,16 @@ pd.set_option('display.max_rows', None)
 
 
 def read_data(exchange, symbol, period, start_day, end_day):
-    fname = '%s_%s_%s_%s_%s' % (exchange, symbol, period, start_day, end_day)
-    fname = fname.replace('/', '_')
-    fpath = mkfpath('.\\api_data', fname + '.csv')
-
-    print('reading and writing %s...' % fname)
-
-    # 如果没有文件
-    if not os.path.exists(fpath):
-        ohlc = dataapi.get_exsymbol_kline(exchange, symbol, period, start_day, end_day)[2]
-        ohlc.reset_index(inplace=True)
-        # 节省空间写入数据
-        if not ohlc.empty:
-            ohlc.to_csv(fpath)
-    else:
-        ohlc = pd.read_csv(fpath, index_col=[0])
-    ohlc['date_time'] = pd.to_datetime(ohlc['date'])
-
-    # 观察数据缺失情况
-    count = ohlc['date_time'].diff().value_counts()
-    if len(count) > 1:
+    # 从本地列式存储读数据，存储中没有的时间段才从 api 下载
+    print('reading %s_%s_%s_%s_%s...' % (exchange, symbol, period, start_day, end_day))
+    ohlc = kline_store.read_kline(exchange, symbol, period, start_day, end_day)
+    ohlc['date_time'] = ohlc['date']
+
+    # 观察数据缺失情况，读存储中的缺口索引，不重新扫描整段K线
+    step, gaps = kline_store.check_gaps(exchange, symbol, period, start_day, end_day)
+    if len(gaps):
         print('Warning: discontinuous data')
-        print(count.head(), '\n')
+        print('%d gaps, %d bars missing' % (len(gaps), ((gaps[:, 2] - gaps[:, 1]) // step).sum()), '\n')
 
     return ohlc
 
@@ -5,8 +5,10 @@ sys.path.append(os.getcwd())
 
 try:
     from .dataapi import get_huobi_ontime_kline
+    from . import kline_store
 except:
     from dataapi import get_huobi_ontime_kline
+    import kline_store
 
 import numpy as np
 import pandas as pd
@@ -32,31 +34,33 @@ def mkfpath(folder, fname):
     return fpath
 
 
-def read_data(exchange, symbol, period, start_day, end_day):
-    # 从数据库或文件中读数据
-    fname = f'{exchange}_{symbol}_{period}_{start_day}_{end_day}'
-    fname = fname.replace('/', '_')
-    fpath = mkfpath('/Users/wuyong/alldata/original_data', fname + '.csv')
-    print(fpath)
-    print('reading and writing %s...' % fname)
-
-    # 如果没有文件，从数据库中读
-    if not os.path.exists(fpath):
-        ohlc = get_huobi_ontime_kline(symbol, period, start_day, end_day)[2]
-        # 写入数据
-        if not ohlc.empty:
-            ohlc.to_csv(fpath)
-    # 如果有文件，从文件中读
-    else:
-        ohlc = pd.read_csv(fpath, index_col=[0])
-
-    ohlc['date'] = pd.to_datetime(ohlc['date'])
-
-    # 观察数据缺失情况
-    count = ohlc['date'].diff().value_counts()
-    if len(count) > 1:
+# huobi_fetch 下载的是火币实时接口的数据，与 kline_store.default_fetch(数据库)的K线来源不同，
+# 单独存放在 huobi_store_root 下，两种来源的K线不会合并到同一个序列里
+huobi_store_root = os.path.join(os.path.expanduser('~'), 'alldata', 'kline_store_huobi')
+
+
+def _huobi_time(t):
+    # get_huobi_ontime_kline 只接受 'YYYY-MM-DD HH:MM'，而 read_data 的参数和 kline_store 增量同步
+    # 传入的起止时间是 'YYYY-MM-DD'，先统一转换
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(kline_store.to_tickid(t)))
+
+
+def huobi_fetch(exchange, symbol, period, start_day, end_day):
+    return get_huobi_ontime_kline(symbol, period, _huobi_time(start_day), _huobi_time(end_day), datefmt=None)
+
+
+def read_data(exchange, symbol, period, start_day, end_day, fill=False):
+    # 从本地列式存储读数据，存储中没有的时间段才从火币接口下载
+    # fill: bool, if True: 缺失的K线用前一根收盘价补齐，见 kline_store.fill_grid
+    print('reading %s_%s_%s_%s_%s...' % (exchange, symbol, period, start_day, end_day))
+    ohlc = kline_store.read_kline(exchange, symbol, period, start_day, end_day, root=huobi_store_root,
+                                  fetch=huobi_fetch, fill=fill)
+
+    # 观察数据缺失情况，读存储中的缺口索引，不重新扫描整段K线
+    step, gaps = kline_store.check_gaps(exchange, symbol, period, start_day, end_day, root=huobi_store_root)
+    if len(gaps):
         print('Warning: discontinuous data')
-        print(count.head(), '\n')
+        print('%d gaps, %d bars missing' % (len(gaps), ((gaps[:, 2] - gaps[:, 1]) // step).sum()), '\n')
 
     return ohlc
 
@@ -2,14 +2,24 @@
 # 接口为临时性接口，数据不保存
 import gzip
 import json
+import threading
 import time
 import traceback
 import urllib
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import requests
 from websocket import create_connection
 
+try:
+    from . import bar_synth
+    from . import replay
+except:
+    import bar_synth
+    import replay
+
 pd.set_option('display.max_columns', 20)
 pd.set_option('display.max_rows', 300)
 pd.set_option('display.width', 500)
@@ -20,46 +30,291 @@ urlfmt_binance = 'https://api.binance.com/api/v1/klines?symbol=%s&interval=%s&st
 huobi_history_kline_wss = "wss://api.huobi.pro/ws"
 # bitfinex restapi
 urlfmt_bitfinex = 'https://api.bitfinex.com/v2/candles/trade:%s:t%s/hist?limit=1000&start=%s&sort=1'
+# 各交易所的限频: (每秒补充的令牌数, 令牌桶容量)，一次请求消耗一个令牌
+# 币安 klines 接口权重为1，限额 1200/分钟，这里只用一半留给其他程序；bitfinex candles 限额 90/分钟
+rate_limits = {'BIAN': (10.0, 20), 'BITFINEX': (1.0, 5), 'HUOBI': (10.0, 10)}
+# 各交易所同时下载的币对数
+max_workers = {'BIAN': 8, 'BITFINEX': 2, 'HUOBI': 4}
+retry_count = 3
+# get_realtime_data 的输出格式，见 get_realtime_data
+outputs = ('list', 'arrays', 'struct', 'frame')
+kline_fields = ['open', 'high', 'low', 'close', 'volume', 'amount']
+# arrays 输出中交易所、周期、币对的编码类型
+code_dtypes = {'exchange': np.int8, 'period': np.int8, 'symbol': np.int16}
+# struct 输出的结构化数组类型
+kline_dtype = np.dtype([('exchange', 'U8'), ('period', 'U4'), ('symbol', 'U16'), ('tickid', 'i8')] +
+                       [(name, 'f8') for name in kline_fields])
+
+
+class TokenBucket(object):
+    """
+    令牌桶限频，多线程共享：桶内最多 capacity 个令牌，每秒补充 rate 个，
+    acquire 取不到令牌时等待到补够为止；回放模式下不限频
+    """
 
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.stamp = time.time()
+        self.lock = threading.Lock()
 
-def huobi_kline_req(fromTime, toTime, symbol_kline, period_KLine):
-    trader = """{
-                  "req": "market.""" + str(symbol_kline) + """.kline.""" + period_KLine + """",
-                  "id": "history_kline_""" + str(symbol_kline) + """",
-                  "from":""" + str(fromTime) + """,""" + """
-                  "to":""" + str(toTime) + """
-                }"""
-    while 1:
+    def acquire(self, weight=1):
+        if replay.replaying():
+            return
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(exchange):
+    # 每个交易所一个进程内共享的令牌桶
+    with _buckets_lock:
+        if exchange not in _buckets:
+            _buckets[exchange] = TokenBucket(*rate_limits[exchange])
+        return _buckets[exchange]
+
+
+def limited_get(exchange, url):
+    """
+    按交易所限频发送请求，失败(非200或超时)时退避重试
+    :return: string 返回内容
+    """
+    bucket = get_bucket(exchange)
+    for i in range(retry_count):
+        bucket.acquire()
         try:
-            ws = create_connection(huobi_history_kline_wss)
-            ws.send(trader)
-            compressData = ws.recv()
-            break
-        except:
-            # print('connect ws error,retry...')
+            res = http_get_request(url)
+        except Exception as e:
+            print(e)
+            res = None
+        if res is not None:
+            return res
+        replay.sleep(2 ** i)
+    raise IOError('request failed: %s' % url)
+
+
+def run_jobs(exchange, jobs):
+    """
+    在线程池中并发执行各币对的下载任务，结果按 jobs 的顺序拼接
+    :param jobs: list 无参函数，各返回一个 list
+    :return: list
+    """
+    lists_datas = []
+    if len(jobs) <= 1:
+        for job in jobs:
+            lists_datas.extend(job())
+        return lists_datas
+    with ThreadPoolExecutor(max_workers=min(max_workers[exchange], len(jobs))) as pool:
+        for res in pool.map(lambda job: job(), jobs):
+            lists_datas.extend(res)
+    return lists_datas
+
+
+class HuobiWsClient(object):
+    """
+    火币 websocket 长连接，进程内共享
+    多个线程的 req 请求在同一个连接上并发发送，按 id 匹配返回；后台线程负责接收、回复 ping，
+    连接断开时按退避时间重连，并重发尚未收到返回的请求
+    """
+
+    def __init__(self, url=huobi_history_kline_wss, timeout=30, max_backoff=30):
+        self.url = url
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.ws = None
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.pending = {}
+        self.seq = 0
+        self.closed = False
+        self.reader = None
+
+    def _start(self):
+        with self.lock:
+            if self.reader is None or not self.reader.is_alive():
+                self.closed = False
+                self.reader = threading.Thread(target=self._run, name='huobi-ws')
+                self.reader.daemon = True
+                self.reader.start()
+
+    def _send(self, ws, text):
+        with self.send_lock:
+            ws.send(text)
+
+    def _connect(self):
+        backoff = 1
+        while not self.closed:
+            try:
+                ws = create_connection(self.url, timeout=self.timeout)
+            except Exception as e:
+                print('huobi ws connect error: %s, retry in %ds' % (e, backoff))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            with self.lock:
+                self.ws = ws
+                resend = [item['text'] for item in self.pending.values()]
+            for text in resend:
+                try:
+                    self._send(ws, text)
+                except Exception:
+                    break
+            return ws
+        return None
+
+    def _drop(self, ws):
+        with self.lock:
+            if self.ws is ws:
+                self.ws = None
+        try:
+            ws.close()
+        except Exception:
             pass
-    # print(trader)
-    # print(trader)
-
-    # print("websocket success connect")
-    result = gzip.decompress(compressData).decode('utf-8')
-    while 1:
-        if result[:7] == '{"ping"':
-            ts = result[8:21]
-            pong = '{"pong":' + ts + '}'
-            ws.send(pong)
-            # print("rev ping ,again req")
-            # print(trader)
-            ws.send(trader)
-            # time.sleep(1)
-            compressData = ws.recv()
-            result = gzip.decompress(compressData).decode('utf-8')
-        else:
-            # print(result)
-            return result
-    compressData = ws.recv()
-    result = gzip.decompress(compressData).decode('utf-8')
-    return result
+
+    def _run(self):
+        ws = None
+        while not self.closed:
+            if ws is None:
+                ws = self._connect()
+                if ws is None:
+                    break
+            try:
+                data = ws.recv()
+            except Exception:
+                # 超时(火币每5秒发一次 ping，超时说明连接已失效)或断开：重连
+                self._drop(ws)
+                ws = None
+                continue
+            if not data:
+                continue
+            result = gzip.decompress(data).decode('utf-8') if isinstance(data, bytes) else data
+            msg = json.loads(result)
+            if 'ping' in msg:
+                try:
+                    self._send(ws, json.dumps({'pong': msg['ping']}))
+                except Exception:
+                    self._drop(ws)
+                    ws = None
+                continue
+            with self.lock:
+                item = self.pending.pop(msg.get('id'), None)
+            if item is not None:
+                item['result'] = result
+                item['event'].set()
+
+    def submit(self, msg):
+        """
+        发送一个请求，不等待返回
+        :param msg: dict 请求内容(不含 id)
+        :return: 请求 id，用 wait 取结果
+        """
+        self._start()
+        with self.lock:
+            self.seq += 1
+            req_id = 'req_%d' % self.seq
+            text = json.dumps(dict(msg, id=req_id))
+            self.pending[req_id] = {'text': text, 'event': threading.Event(), 'result': None}
+            item = self.pending[req_id]
+            ws = self.ws
+        if ws is not None:
+            try:
+                self._send(ws, text)
+            except Exception:
+                # 后台线程重连后会重发
+                pass
+        return req_id, item
+
+    def wait(self, req_id, item):
+        """
+        :return: string 解压后的返回内容
+        """
+        if not item['event'].wait(self.timeout):
+            with self.lock:
+                self.pending.pop(req_id, None)
+            raise IOError('huobi ws request timeout: %s' % item['text'])
+        return item['result']
+
+    def request(self, msg):
+        req_id, item = self.submit(msg)
+        return self.wait(req_id, item)
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            ws = self.ws
+        if ws is not None:
+            self._drop(ws)
+
+
+_huobi_client = None
+_huobi_client_lock = threading.Lock()
+
+
+def get_huobi_client():
+    global _huobi_client
+    with _huobi_client_lock:
+        if _huobi_client is None:
+            _huobi_client = HuobiWsClient()
+        return _huobi_client
+
+
+def _huobi_msg(fromTime, toTime, symbol_kline, period_KLine):
+    return {"req": "market.%s.kline.%s" % (symbol_kline, period_KLine), "from": int(fromTime), "to": int(toTime)}
+
+
+def huobi_kline_req(fromTime, toTime, symbol_kline, period_KLine):
+    """
+    火币 websocket 历史K线请求，走进程内共享的长连接，支持录制/回放(见 replay)
+    :return: string 解压后的返回内容
+    """
+    return huobi_kline_reqs([(fromTime, toTime)], symbol_kline, period_KLine)[0]
+
+
+def _huobi_live(msg):
+    for _ in range(retry_count):
+        get_bucket('HUOBI').acquire()
+        try:
+            return get_huobi_client().request(msg)
+        except IOError as e:
+            print(e)
+    raise IOError('huobi ws request failed: %s' % json.dumps(msg))
+
+
+def huobi_kline_reqs(windows, symbol_kline, period_KLine):
+    """
+    一次发出多个时间窗口的请求，在同一个连接上并发等待返回
+    :param windows: list [(fromTime, toTime), ...]
+    :return: list 每个窗口解压后的返回内容，顺序与 windows 相同
+    """
+    msgs = [_huobi_msg(f, t, symbol_kline, period_KLine) for f, t in windows]
+    if replay.mode != 'off':
+        return [replay.fetch(replay.normalize_msg(huobi_history_kline_wss, msg), lambda m=msg: _huobi_live(m))
+                for msg in msgs]
+    client = get_huobi_client()
+    submitted = []
+    for msg in msgs:
+        get_bucket('HUOBI').acquire()
+        submitted.append(client.submit(msg))
+    results = []
+    for msg, (req_id, item) in zip(msgs, submitted):
+        try:
+            results.append(client.wait(req_id, item))
+        except IOError as e:
+            print(e)
+            results.append(_huobi_live(msg))
+    return results
 
 
 def http_get_request(url, params=None, add_to_headers=None):
@@ -78,8 +333,11 @@ def http_get_request(url, params=None, add_to_headers=None):
     if add_to_headers:
         headers.update(add_to_headers)
     postdata = urllib.parse.urlencode(params)
+    return replay.fetch(replay.normalize_url(url, postdata), lambda: _http_get_text(url, postdata, headers))
+
+
+def _http_get_text(url, postdata, headers):
     response = requests.get(url, postdata, headers=headers, timeout=60)
-    time.sleep(1)
     try:
 
         if response.status_code == 200:
@@ -174,53 +432,135 @@ def data_clean_bitfinex(data, period, symbole):
     return list_res
 
 
+def _empty_columns():
+    cols = {'tickid': np.empty(0, dtype=np.int64)}
+    for name in kline_fields:
+        cols[name] = np.empty(0, dtype=np.float64)
+    return cols
+
+
+def columns_binance(res_tmp):
+    """
+    币安返回内容直接解析为列数组，不生成逐行的 list
+    :return: dict {'tickid': int64, open/high/low/close/volume/amount: float64}
+    """
+    res = json.loads(res_tmp)
+    if not res:
+        return _empty_columns()
+    # 每行为 [开盘时间, 'open', 'high', 'low', 'close', 'volume', 收盘时间, '成交额', ...]，整体转为定长字符串数组后按列转换
+    arr = np.array(res)
+    cols = {'tickid': arr[:, 0].astype(np.int64) // 1000}
+    for i, name in enumerate(['open', 'high', 'low', 'close', 'volume'], 1):
+        cols[name] = arr[:, i].astype(np.float64)
+    cols['amount'] = arr[:, 7].astype(np.float64)
+    return cols
+
+
+def columns_huobi(data):
+    """
+    火币返回内容直接解析为列数组，字段对应关系同 data_clean_huobi
+    """
+    res = json.loads(data)['data']
+    n = len(res)
+    cols = {'tickid': np.fromiter((di['id'] for di in res), dtype=np.int64, count=n)}
+    for name, key in [('open', 'open'), ('high', 'high'), ('low', 'low'), ('close', 'close'),
+                      ('volume', 'amount'), ('amount', 'vol')]:
+        cols[name] = np.fromiter((di[key] for di in res), dtype=np.float64, count=n)
+    return cols
+
+
+def columns_bitfinex(data):
+    """
+    bitfinex 返回内容直接解析为列数组，没有成交额，amount 为 NaN
+    """
+    res = json.loads(data)
+    if not res:
+        return _empty_columns()
+    # 每行为 [时间, open, close, high, low, volume]
+    arr = np.asarray(res, dtype=np.float64)
+    cols = {'tickid': arr[:, 0].astype(np.int64) // 1000}
+    for i, name in enumerate(['open', 'close', 'high', 'low', 'volume'], 1):
+        cols[name] = arr[:, i]
+    cols['amount'] = np.full(len(arr), np.nan)
+    return cols
+
+
+def concat_columns(pages):
+    if not pages:
+        return _empty_columns()
+    return dict((name, np.concatenate([page[name] for page in pages])) for name in ['tickid'] + kline_fields)
+
+
+def tran_columns(cols, rule):
+    """
+    列数组版本的 data_tran，amount 全为 NaN(bitfinex)时结果也为 NaN
+    """
+    if len(cols['tickid']) == 0:
+        return _empty_columns()
+    src = dict((name, cols[name]) for name in ['tickid', 'open', 'high', 'low', 'close', 'volume'])
+    has_amount = not np.isnan(cols['amount']).all()
+    if has_amount:
+        src['amount'] = cols['amount']
+    out = bar_synth.synth_kline(src, rule, src_seconds=3600, drop_partial=True)
+    if not has_amount:
+        out['amount'] = np.full(len(out['tickid']), np.nan)
+    return dict((name, out[name]) for name in ['tickid'] + kline_fields)
+
+
+def typed_result(blocks, output):
+    """
+    把各币对的列数组拼成一个结果
+    :param blocks: list [(exchange, period, symbol, 列数组 dict)]
+    :param output: string 'arrays' / 'struct' / 'frame'，见 get_realtime_data
+    """
+    categories = {'exchange': [], 'period': [], 'symbol': []}
+    codes = {'exchange': [], 'period': [], 'symbol': []}
+    for exchange, period, symbol, cols in blocks:
+        n = len(cols['tickid'])
+        for name, value in [('exchange', exchange), ('period', period), ('symbol', symbol)]:
+            if value not in categories[name]:
+                categories[name].append(value)
+            codes[name].append(np.full(n, categories[name].index(value), dtype=code_dtypes[name]))
+    out = concat_columns([cols for _, _, _, cols in blocks])
+    for name in codes:
+        out[name] = np.concatenate(codes[name]) if codes[name] else np.empty(0, dtype=code_dtypes[name])
+
+    if output == 'arrays':
+        out['categories'] = categories
+        return out
+    if output == 'struct':
+        arr = np.empty(len(out['tickid']), dtype=kline_dtype)
+        for name in categories:
+            arr[name] = np.array(categories[name] or [''], dtype=kline_dtype[name])[out[name]]
+        for name in ['tickid'] + kline_fields:
+            arr[name] = out[name]
+        return arr
+    df = pd.DataFrame(dict((name, out[name]) for name in ['tickid'] + kline_fields))
+    for i, name in enumerate(['exchange', 'period', 'symbol']):
+        df.insert(i, name, pd.Categorical.from_codes(out[name], categories[name]))
+    return df
+
+
 def data_tran(l, rule):
     """
-    火币、bitfinex 4h数据合成
-    :param l:
-    :param rule:
-    :return:
+    火币、bitfinex 由1h数据合成N小时数据，首尾不完整的区间去掉
+    :param l: list [[exchange, period, symbol, tickid, open, high, low, close, volume, amount]]，tickid 升序
+    :param rule: string 目标周期，如 '4h'，需为1h的整数倍
+    :return: list 同 l 的格式，tickid 为区间起点
     """
-    f_data = l[0][3]
-    l_data = l[-1][3]
-    f_data_hour = time.localtime(f_data).tm_hour
-    l_data_hour = time.localtime(l_data).tm_hour
-    df = pd.DataFrame(l, columns=['exchange', 'period', 'symbol', 'tickid', 'open', 'high', 'low', 'close', 'volume',
-                                  'amount'])
-    df['date'] = df['tickid'].map(timestamp2str)
-    cols = list(df)
-    cols.insert(0, cols.pop(cols.index('date')))
-    df = df.ix[:, cols]
-    # date列变成datetime格式并用作索引
-    df['date'] = pd.to_datetime(df['date'])  # todo 将 timestamp去掉
-    df.set_index("date", inplace=True)
-    df = df.resample(rule).apply({
-                                  'exchange': 'first',
-                                  'period': 'first',
-                                  'symbol': 'first',
-                                  'tickid': 'first',
-                                  'open': 'first',
-                                  'high': 'max',
-                                  'low': 'min',
-                                  'close': 'last',
-                                  'volume': 'sum',
-                                  'amount': 'sum'})
-    df = df.reset_index()
-    df['period'] = '4h'
-    # print(len(df))
-    # print(df)
-    count = len(df)
-    # print("第一条数据小时数：" + str(f_data_hour))
-    if f_data_hour % 4 != 0:
-        df.drop(labels=[0], inplace=True)
-    # print("最后一条数据小时数：" + str(l_data_hour))
-    if l_data_hour % 4 != 3:
-        df.drop(labels=[count - 1], inplace=True)
-    del df['date']
-    # print(df)
-    train_data = pd.np.array(df)  # np.ndarray()
-    train_x_list = train_data.tolist()  # list
-    return train_x_list
+    if not l:
+        return []
+    cols = {'tickid': np.array([r[3] for r in l], dtype=np.int64)}
+    for i, name in enumerate(kline_fields, 4):
+        cols[name] = np.array([np.nan if r[i] is None else r[i] for r in l], dtype=np.float64)
+    out = tran_columns(cols, rule)
+    # bitfinex 没有成交额
+    has_amount = any(r[9] is not None for r in l)
+    amount = out['amount'].tolist() if has_amount else [None] * len(out['tickid'])
+    exchange, symbol = l[0][0], l[0][2]
+    return [[exchange, rule, symbol, t, o, h, lo, c, v, a] for t, o, h, lo, c, v, a in
+            zip(out['tickid'].tolist(), out['open'].tolist(), out['high'].tolist(), out['low'].tolist(),
+                out['close'].tolist(), out['volume'].tolist(), amount)]
 
 
 def timestamp2str(ts):
@@ -229,13 +569,39 @@ def timestamp2str(ts):
     return time.strftime("%Y-%m-%d %H:%M:%S", tmp)
 
 
-def realtime_kline_BIAN(periods, symboles, start_time, end_time=None):
+def _binance_symbol(period, symbole, start_time, end_time, internal_time, typed=False):
+    # 单个币对单个周期顺序翻页，每页从上一页最后一根K线之后开始
+    # typed 时返回 [(exchange, period, symbol, 列数组)]，见 typed_result
+    lists_datas = []
+    while start_time + internal_time < end_time:
+        url = urlfmt_binance % (str(symbole), str(period), start_time)
+        res = limited_get('BIAN', url)
+        if typed:
+            page = columns_binance(res)
+            if len(page['tickid']) == 0:
+                break
+            lists_datas.append(page)
+            start_time = int(page['tickid'][-1]) * 1000 + 1
+            continue
+        list_data = data_clean_binance(res, period, symbole)
+        if not list_data:
+            break
+        lists_datas.extend(list_data)
+        start_time = int(list_data[-1][3]) * 1000 + 1
+    if typed:
+        return [('BIAN', period, symbole.lower(), concat_columns(lists_datas))]
+    return lists_datas
+
+
+def realtime_kline_BIAN(periods, symboles, start_time, end_time=None, typed=False):
     """
     获取实时Kline： BINANCE交易所
+    各币对、各周期并发下载，请求频率由 rate_limits['BIAN'] 的令牌桶控制
     :param periods: list或str ['4h','1d']或'4h'
     :param symboles: list或str： ['EOSBTC', 'BNBBTC']或'BNBBTC'
     :param start_time: 时间戳或者时间字符串：1543593600000  1543593600  '2018-12-01 00:00:00
     :param end_time: 时间戳或者时间字符串或者不写
+    :param typed: bool True 时每个币对返回列数组，见 typed_result
     :return:list : [[exchange, period, symbole, tickid, open, high, low, close, volume, amount]]
     """
     try:
@@ -254,12 +620,11 @@ def realtime_kline_BIAN(periods, symboles, start_time, end_time=None):
             raise IOError("invalid params: symboles")
 
         start_time = time_check(start_time)
-        lists_datas = []
-        s_time_cp = start_time
         if end_time is None:
-            end_time = int(time.time()) * 1000
+            end_time = int(replay.now()) * 1000
         else:
             end_time = time_check(end_time)
+        jobs = []
         for period in periods:
             if period[-1] == 'm':
                 internal_time = int(period[0:-1]) * 60 * 1000
@@ -270,29 +635,38 @@ def realtime_kline_BIAN(periods, symboles, start_time, end_time=None):
             else:
                 raise IOError("unknow period")
             for symbole in symboles:
-                while True:
-                    # print(">>>>>>>>>period=%s,symbol=%s" % (str(period), str(symbole)))
-                    url = urlfmt_binance % (str(symbole), str(period), start_time)
-                    # print(">>>>>>>>>url=%s", str(url))
-                    # print(int(start_time) + internal_time)
-                    # print(end_time)
-                    if start_time + internal_time >= end_time:
-                        start_time = s_time_cp
-                        # print("break while")
-                        break
-                    time.sleep(0.3)
-                    res_tmp = http_get_request(url)
-                    list_data = data_clean_binance(res_tmp, period, symbole)
-                    lists_datas.extend(list_data)
-                    # print(list_data)
-                    start_time = int(list_data[-1][3]) * 1000
-        return lists_datas
+                jobs.append(lambda p=period, sy=symbole, it=internal_time:
+                            _binance_symbol(p, sy, start_time, end_time, it, typed))
+        return run_jobs('BIAN', jobs)
     except Exception as e:
         # print(traceback.format_exc())
         raise IOError('internal system error')
 
 
-def realtime_kline_HUOBI(periods, symboles, start_time, end_time=None):
+def _huobi_symbol(period, symbole, start_time, period_time, period_req, tran_flag, typed=False):
+    # 单个币对单个周期：先算出全部时间窗口，在长连接上一次性发出
+    windows = []
+    now = int(replay.now())
+    while start_time <= now:
+        to_time = min(start_time + period_time, now)
+        windows.append((start_time, to_time))
+        if to_time >= now:
+            break
+        start_time = to_time
+    if typed:
+        cols = concat_columns([columns_huobi(res) for res in huobi_kline_reqs(windows, symbole, period_req)])
+        if tran_flag:
+            return [('HUOBI', '4h', symbole, tran_columns(cols, '4h'))]
+        return [('HUOBI', period, symbole, cols)]
+    lists_datas = []
+    for res in huobi_kline_reqs(windows, symbole, period_req):
+        lists_datas.extend(data_clean_huobi(res, period, symbole))
+    if tran_flag and lists_datas:
+        return data_tran(lists_datas, '4h')
+    return lists_datas
+
+
+def realtime_kline_HUOBI(periods, symboles, start_time, end_time=None, typed=False):
     try:
         if isinstance(periods, list):
             pass
@@ -308,11 +682,9 @@ def realtime_kline_HUOBI(periods, symboles, start_time, end_time=None):
         else:
             raise IOError("invalid params: symboles")
         start_time = time_check(start_time, 10)
-        start_time_cp = start_time
-        lists_datas = []
+        jobs = []
 
         for period in periods:
-            p_period = period
             tran_flag = False
             if period in ['1m', '5m', '15m', '30m']:
                 period_time = 18000 * int(period[0:-1])
@@ -331,43 +703,42 @@ def realtime_kline_HUOBI(periods, symboles, start_time, end_time=None):
             else:
                 raise IOError("unknow period")
             for symbole in symboles:
-                lists_datas_cp = []
-                symbole = symbole.lower()
-                # print(">>>>>>>>>period=%s,symbol=%s" % (str(p_period), str(symbole)))
-                while 1:
-                    stop_flag = False
-                    to_time = start_time + period_time
-                    if start_time > time.time():
-                        # print(
-                        #     ">>>>>>>>>>>>>start time greate then currency time,break;start_time=%s,currency_time=%s" % (
-                        #         start_time, time.time()))
-                        start_time = start_time_cp
-                        break
-                    if to_time > time.time():
-                        stop_flag = True
-                        to_time = int(time.time())
-                        # print(">>>>>>>>>>>>>define to time eq currency time,to_time=%s, currency_time=%s" % (
-                        #     to_time, time.time()))
-                    res = huobi_kline_req(start_time, to_time, symbole, period_req)
-                    res_list_cp = res_list = data_clean_huobi(res, period, symbole)
-                    if tran_flag:
-                        lists_datas_cp.extend(res_list_cp)
-                    else:
-                        lists_datas.extend(res_list)
-                    start_time = to_time
-                    if stop_flag:
-                        # print("get all data and break")
-                        start_time = start_time_cp
-                        break
-                if tran_flag:
-                    list_tran_datas = data_tran(lists_datas_cp, '4h')
-                    lists_datas.extend(list_tran_datas)
-        return lists_datas
+                jobs.append(lambda p=period, sy=symbole.lower(), pt=period_time, pr=period_req, tf=tran_flag:
+                            _huobi_symbol(p, sy, start_time, pt, pr, tf, typed))
+        return run_jobs('HUOBI', jobs)
     except Exception as e:
         raise IOError('>>>>>>>>>>internal system error')
 
 
-def realtime_kline_BITFINEX(periods, symboles, start_time, end_time=None):
+def _bitfinex_symbol(period, symbole, start_time, end_time, internal_time, tran_flag, typed=False):
+    # 单个币对单个周期顺序翻页，4h 由 1h 合成
+    lists_datas = []
+    while start_time + internal_time < end_time:
+        url = urlfmt_bitfinex % (str(period), str(symbole), start_time)
+        res = limited_get('BITFINEX', url)
+        if typed:
+            page = columns_bitfinex(res)
+            if len(page['tickid']) == 0:
+                break
+            lists_datas.append(page)
+            start_time = int(page['tickid'][-1]) * 1000 + 1
+            continue
+        list_data = data_clean_bitfinex(res, period, symbole)
+        if not list_data:
+            break
+        lists_datas.extend(list_data)
+        start_time = int(list_data[-1][3]) * 1000 + 1
+    if typed:
+        cols = concat_columns(lists_datas)
+        if tran_flag:
+            return [('BITFINEX', '4h', symbole.lower(), tran_columns(cols, '4h'))]
+        return [('BITFINEX', period, symbole.lower(), cols)]
+    if tran_flag and lists_datas:
+        return data_tran(lists_datas, '4h')
+    return lists_datas
+
+
+def realtime_kline_BITFINEX(periods, symboles, start_time, end_time=None, typed=False):
     try:
         if isinstance(periods, list):
             pass
@@ -384,14 +755,12 @@ def realtime_kline_BITFINEX(periods, symboles, start_time, end_time=None):
             raise IOError("invalid params: symboles")
 
         start_time = time_check(start_time)
-        lists_datas = []
-        s_time_cp = start_time
         if end_time is None:
-            end_time = int(time.time()) * 1000
+            end_time = int(replay.now()) * 1000
         else:
             end_time = time_check(end_time)
+        jobs = []
         for period in periods:
-            p_period = period
             tran_flag = False
             if period[-1] == 'm':
                 internal_time = int(period[0:-1]) * 60 * 1000
@@ -407,37 +776,15 @@ def realtime_kline_BITFINEX(periods, symboles, start_time, end_time=None):
             else:
                 raise IOError("unknow period")
             for symbole in symboles:
-                lists_datas_cp = []
-                p_symbole = symbole.lower()
-                while True:
-                    # print(">>>>>>>>>period=%s,symbol=%s" % (str(p_period), str(p_symbole)))
-                    url = urlfmt_bitfinex % (str(period), str(symbole), start_time)
-                    # print(">>>>>>>>>url=%s", str(url))
-                    # print(int(start_time) + internal_time)
-                    # print(end_time)
-                    if start_time + internal_time >= end_time:
-                        start_time = s_time_cp
-                        # print("break while")
-                        break
-                    time.sleep(1)
-                    res_tmp = http_get_request(url)
-                    res_list_cp = list_data = data_clean_bitfinex(res_tmp, period, symbole)
-                    if tran_flag:
-                        lists_datas_cp.extend(res_list_cp)
-                    else:
-                        lists_datas.extend(list_data)
-                    # print(list_data)
-                    start_time = int(list_data[-1][3]) * 1000
-                if tran_flag:
-                    list_tran_datas = data_tran(lists_datas_cp, '4h')
-                    lists_datas.extend(list_tran_datas)
-        return lists_datas
+                jobs.append(lambda p=period, sy=symbole, it=internal_time, tf=tran_flag:
+                            _bitfinex_symbol(p, sy, start_time, end_time, it, tf, typed))
+        return run_jobs('BITFINEX', jobs)
     except Exception as e:
         print(traceback.format_exc())
         raise IOError('internal system error')
 
 
-def get_realtime_data(exchange, periods, symboles, start_time, end_time=None):
+def get_realtime_data(exchange, periods, symboles, start_time, end_time=None, output='list'):
     """
     获取实时Kline： 交易所
     :param exchange: string：BIAN,HUOBI,BITFINEX
@@ -445,18 +792,31 @@ def get_realtime_data(exchange, periods, symboles, start_time, end_time=None):
     :param symboles: list或str： ['EOSBTC', 'BNBBTC']或'BNBBTC'
     :param start_time: 时间戳或者时间字符串：1543593600000  1543593600  '2018-12-01 00:00:00
     :param end_time: 时间戳或者时间字符串或者不写
-    :return:list : [[exchange, period, symbole, tickid, open, high, low, close, volume, amount]]
+    :param output: string 返回格式
+        'list'    [[exchange, period, symbole, tickid, open, high, low, close, volume, amount]]，价格为接口返回的原始类型(币安为字符串)
+        'arrays'  dict 列数组: tickid int64，open/high/low/close/volume/amount float64(没有成交额时为 NaN)，
+                  exchange/period/symbol 为整数编码，对应的值在 ['categories'][列名] 中
+        'struct'  numpy 结构化数组，dtype 为 kline_dtype
+        'frame'   DataFrame，列同 list，数值列为 float，exchange/period/symbol 为 category
+        后三种直接由接口返回的 json 解析为数组，不生成逐行的 list
+    :return: 见 output
     """
     if not exchange or not periods or not symboles or not start_time:
         raise IOError('parameters cannot be empty ')
+    if output not in outputs:
+        raise IOError('unknow output: %s' % output)
+    typed = output != 'list'
     if exchange == 'BIAN':
-        return realtime_kline_BIAN(periods, symboles, start_time)
+        res = realtime_kline_BIAN(periods, symboles, start_time, end_time, typed)
     elif exchange == 'HUOBI':
-        return realtime_kline_HUOBI(periods, symboles, start_time)
+        res = realtime_kline_HUOBI(periods, symboles, start_time, end_time, typed)
     elif exchange == 'BITFINEX':
-        return realtime_kline_BITFINEX(periods, symboles, start_time)
+        res = realtime_kline_BITFINEX(periods, symboles, start_time, end_time, typed)
     else:
         raise IOError('not support exchange: %s' % exchange)
+    if typed:
+        return typed_result(res, output)
+    return res
 
 
 if __name__ == '__main__':
@@ -0,0 +1,154 @@
+# -*- coding: UTF-8 -*-
+# 请求录制/回放，用于离线运行和可重复的性能测试
+# dataapi 的 http 请求、realtime_kline_api_all 的 http 和火币 websocket 请求都经过 fetch:
+#   mode = 'off'     直接访问网络(默认)
+#   mode = 'record'  访问网络，并把返回内容压缩存入 archive_root
+#   mode = 'replay'  只从 archive_root 读取，不访问网络，缺失时抛出 IOError
+# 环境变量:
+#   DATA_REPLAY          off / record / replay
+#   DATA_REPLAY_PATH     存档目录，默认 ~/alldata/replay
+#   DATA_REPLAY_LATENCY  回放时每个请求额外等待的毫秒数，用于模拟真实接口的延迟
+#   DATA_REPLAY_NOW      固定的"当前时间"(10位时间戳)，录制和回放时都设置同一个值，
+#                        使依赖当前时间的请求(如 realtime_kline_api_all 请求到最新)生成相同的请求序列
+# 存档中每个请求一个文件: archive_root/key的sha1前2位/sha1.json.gz，内容为 {'key': 规范化请求, 'type', 'body'}
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit, parse_qsl, urlencode
+except ImportError:
+    from urlparse import urlsplit, parse_qsl
+    from urllib import urlencode
+
+mode = os.environ.get('DATA_REPLAY', 'off')
+archive_root = os.environ.get('DATA_REPLAY_PATH', os.path.join(os.path.expanduser('~'), 'alldata', 'replay'))
+latency = float(os.environ.get('DATA_REPLAY_LATENCY', 0)) / 1000
+fixed_now = int(os.environ['DATA_REPLAY_NOW']) if os.environ.get('DATA_REPLAY_NOW') else None
+
+
+def configure(new_mode=None, root=None, latency_ms=None, now=None):
+    """
+    在代码中切换模式，参数含义同对应的环境变量，None 表示不修改
+    """
+    global mode, archive_root, latency, fixed_now
+    if new_mode is not None:
+        if new_mode not in ('off', 'record', 'replay'):
+            raise TypeError('unknow replay mode: %s' % new_mode)
+        mode = new_mode
+    if root is not None:
+        archive_root = root
+    if latency_ms is not None:
+        latency = latency_ms / 1000.0
+    if now is not None:
+        fixed_now = int(now)
+
+
+def replaying():
+    return mode == 'replay'
+
+
+def now():
+    """
+    当前时间(10位时间戳，浮点)，设置了 DATA_REPLAY_NOW 时返回固定值
+    """
+    if fixed_now is not None:
+        return float(fixed_now)
+    return time.time()
+
+
+def sleep(seconds):
+    """
+    接口限频用的等待，回放时不访问网络，不需要等待
+    """
+    if not replaying():
+        time.sleep(seconds)
+
+
+def normalize_url(url, params=None):
+    """
+    规范化 url 作为存档的键: 去掉首尾空白，query 参数按名称排序，合并 params
+    """
+    parts = urlsplit(url.strip())
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        if isinstance(params, dict):
+            query.extend(params.items())
+        else:
+            query.extend(parse_qsl(params, keep_blank_values=True))
+    query = sorted((k.strip(), v.strip()) for k, v in query)
+    return 'GET %s://%s%s?%s' % (parts.scheme, parts.netloc, parts.path, urlencode(query))
+
+
+def normalize_msg(endpoint, msg, ignore=('id',)):
+    """
+    规范化 websocket 请求作为存档的键，ignore 中的字段(如请求 id)不参与
+    :param endpoint: string websocket 地址
+    :param msg: dict 或 json 字符串
+    """
+    if not isinstance(msg, dict):
+        msg = json.loads(msg)
+    msg = dict((k, v) for k, v in msg.items() if k not in ignore)
+    return 'WS %s %s' % (endpoint, json.dumps(msg, sort_keys=True))
+
+
+def _entry_path(key):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(archive_root, digest[:2], digest + '.json.gz')
+
+
+def _encode(key, body):
+    if body is None:
+        entry = {'key': key, 'type': 'none', 'body': None}
+    elif isinstance(body, bytes):
+        entry = {'key': key, 'type': 'bytes', 'body': base64.b64encode(body).decode('ascii')}
+    else:
+        entry = {'key': key, 'type': 'str', 'body': body}
+    return gzip.compress(json.dumps(entry).encode('utf-8'))
+
+
+def _decode(data):
+    entry = json.loads(gzip.decompress(data).decode('utf-8'))
+    if entry['type'] == 'bytes':
+        return base64.b64decode(entry['body'])
+    return entry['body']
+
+
+def save(key, body):
+    path = _entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 多线程录制时各自写临时文件再替换
+    tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+    with open(tmp, 'wb') as f:
+        f.write(_encode(key, body))
+    os.replace(tmp, path)
+
+
+def load(key):
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        raise IOError('replay miss: %s' % key)
+    with open(path, 'rb') as f:
+        return _decode(f.read())
+
+
+def fetch(key, live):
+    """
+    按当前模式取得请求的返回内容
+    :param key: string normalize_url / normalize_msg 得到的键
+    :param live: 无参函数，访问网络并返回 str、bytes 或 None
+    :return: live 的返回值(回放时为存档中的值)
+    """
+    if mode == 'replay':
+        body = load(key)
+        if latency > 0:
+            time.sleep(latency)
+        return body
+    body = live()
+    if mode == 'record':
+        save(key, body)
+    return body
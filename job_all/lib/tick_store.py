@@ -0,0 +1,196 @@
+# -*- coding: UTF-8 -*-
+# 逐笔成交本地存储
+# 目录结构: store_root/交易所/币对/
+#   YYYYMMDD.bin  当天(UTC)的逐笔成交，定长记录 (dealtime, price, amount, dir)，按 dealtime 升序
+#   meta.json     各文件已提交的记录数、最后一笔成交时间，用于断点续传
+# 下载时逐页追加写入，不在内存中拼整段 DataFrame；读取时按文件 memmap，只切出需要的时间段
+import calendar
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from . import dataapi
+except:
+    import dataapi
+
+store_root = os.path.join(os.path.expanduser('~'), 'alldata', 'tick_store')
+
+# dealtime: 13位毫秒时间戳；dir: 1 买，-1 卖，0 未知
+trade_dtype = np.dtype([('dealtime', '<i8'), ('price', '<f8'), ('amount', '<f8'), ('dir', 'i1')])
+day_ms = 86400 * 1000
+
+
+def series_dir(exchange, symbol, root=None):
+    if root is None:
+        root = store_root
+    return os.path.join(root, exchange, symbol.replace('/', '_'))
+
+
+def _chunk_name(dealtime):
+    return time.strftime('%Y%m%d', time.gmtime(dealtime // 1000)) + '.bin'
+
+
+def read_meta(path):
+    """
+    :return: dict {'chunks': {文件名: 记录数}, 'last_dealtime': int, 'last_ids': [最后一毫秒内的成交id]}
+    """
+    fpath = os.path.join(path, 'meta.json')
+    if not os.path.exists(fpath):
+        return {'chunks': {}, 'last_dealtime': None, 'last_ids': []}
+    with open(fpath, 'r') as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    fpath = os.path.join(path, 'meta.json')
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, fpath)
+
+
+def _dir_code(values):
+    # 接口返回的方向可能是 'buy'/'sell' 字符串，也可能是数字
+    codes = np.zeros(len(values), dtype=np.int8)
+    for i, v in enumerate(values):
+        if isinstance(v, str):
+            v = v.lower()
+            codes[i] = 1 if v in ('buy', 'b', 'bid', '1') else (-1 if v in ('sell', 's', 'ask', '-1', '2') else 0)
+        else:
+            codes[i] = 1 if v == 1 else (-1 if v in (-1, 2) else 0)
+    return codes
+
+
+def to_records(df):
+    """
+    dataapi.get_trades_data 返回的 DataFrame 转为按 dealtime 升序的定长记录数组
+    """
+    rec = np.empty(len(df), dtype=trade_dtype)
+    rec['dealtime'] = df['dealtime'].values.astype(np.int64)
+    rec['price'] = df['price'].values.astype(np.float64)
+    rec['amount'] = df['amount'].values.astype(np.float64)
+    rec['dir'] = _dir_code(df['dir'].values)
+    order = np.argsort(rec['dealtime'], kind='mergesort')
+    return rec[order], df['dealid'].astype(str).values[order]
+
+
+def append_records(path, rec, meta):
+    """
+    按天追加记录。先截断到 meta 中已提交的记录数，写入并落盘后再更新 meta 中的记录数，
+    中途中断不会留下重复或半条记录
+    """
+    os.makedirs(path, exist_ok=True)
+    days = rec['dealtime'] // day_ms
+    bounds = np.flatnonzero(np.diff(days)) + 1
+    for part in np.split(rec, bounds):
+        if len(part) == 0:
+            continue
+        name = _chunk_name(int(part['dealtime'][0]))
+        rows = meta['chunks'].get(name, 0)
+        fpath = os.path.join(path, name)
+        with open(fpath, 'ab') as f:
+            pass
+        with open(fpath, 'r+b') as f:
+            f.truncate(rows * trade_dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(part.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        meta['chunks'][name] = rows + len(part)
+
+
+def collect_trades(exchange, symbol, starttime, endtime=None, root=None, max_pages=None):
+    """
+    逐页下载逐笔成交并追加写入本地存储，支持断点续传(已有数据时从最后一笔继续)
+    :param exchange: string 交易所名称(大写)
+    :param symbol: string 币对名称(小写)
+    :param starttime: string '2018-08-02 16:26' 或 13位时间戳，本地无数据时的起点
+    :param endtime: string 或 13位时间戳，默认下载到最新
+    :param root: string 存储根目录
+    :param max_pages: int 最多下载的页数，默认不限
+    :return: int 本次写入的记录数
+    """
+    path = series_dir(exchange, symbol, root)
+    meta = read_meta(path)
+    if meta['last_dealtime'] is not None:
+        start = meta['last_dealtime']
+    elif isinstance(starttime, int):
+        start = starttime
+    else:
+        start = dataapi.str_time_to_timestamp(starttime, 13)
+    if endtime is None:
+        end = int(time.time() * 1000)
+    elif isinstance(endtime, int):
+        end = endtime
+    else:
+        end = dataapi.str_time_to_timestamp(endtime, 13)
+
+    last_ids = set(meta['last_ids'])
+    written = 0
+    pages = 0
+    while start < end and (max_pages is None or pages < max_pages):
+        errcode, errmsg, df = dataapi.get_trades_data(exchange, symbol, start)
+        if errcode != 0:
+            raise IOError(errmsg)
+        pages += 1
+        if df is None or df.empty:
+            break
+        rec, ids = to_records(df)
+        # 页与页之间以最后一笔的时间衔接，同一毫秒内已写入的成交按 id 去掉；早于衔接点的成交不写入，保持按时间升序
+        keep = (rec['dealtime'] > start) | ((rec['dealtime'] == start) & ~np.isin(ids, list(last_ids)))
+        keep &= rec['dealtime'] <= end
+        rec, ids = rec[keep], ids[keep]
+        if len(rec) == 0:
+            break
+        append_records(path, rec, meta)
+        last = int(rec['dealtime'][-1])
+        tail_ids = ids[rec['dealtime'] == last].tolist()
+        last_ids = (last_ids | set(tail_ids)) if last == start else set(tail_ids)
+        meta['last_dealtime'] = last
+        meta['last_ids'] = [str(i) for i in last_ids]
+        write_meta(path, meta)
+        written += len(rec)
+        start = last
+    return written
+
+
+def _open_chunk(path, name, rows):
+    if rows == 0:
+        return np.empty(0, dtype=trade_dtype)
+    return np.memmap(os.path.join(path, name), dtype=trade_dtype, mode='r', shape=(rows,))
+
+
+def iter_trades(exchange, symbol, start=None, end=None, root=None):
+    """
+    按天依次返回 [start, end) 内的逐笔成交，每次返回一个 memmap 切片(不复制数据)
+    :param start: int 13位时间戳，默认从头
+    :param end: int 13位时间戳，默认到尾
+    :return: generator of np.ndarray (dtype=trade_dtype)
+    """
+    path = series_dir(exchange, symbol, root)
+    meta = read_meta(path)
+    for name in sorted(meta['chunks']):
+        day_start = calendar.timegm(time.strptime(name[:8], '%Y%m%d')) * 1000
+        if start is not None and day_start + day_ms <= start:
+            continue
+        if end is not None and day_start >= end:
+            break
+        rec = _open_chunk(path, name, meta['chunks'][name])
+        lo = 0 if start is None else int(np.searchsorted(rec['dealtime'], start, side='left'))
+        hi = len(rec) if end is None else int(np.searchsorted(rec['dealtime'], end, side='left'))
+        if hi > lo:
+            yield rec[lo:hi]
+
+
+def read_trades(exchange, symbol, start=None, end=None, root=None):
+    """
+    读取 [start, end) 内的逐笔成交到一个数组，时间段较长时请用 iter_trades
+    :return: np.ndarray (dtype=trade_dtype)
+    """
+    parts = list(iter_trades(exchange, symbol, start, end, root))
+    if not parts:
+        return np.empty(0, dtype=trade_dtype)
+    return np.concatenate(parts)